@@ -0,0 +1,63 @@
+"""Inicia el servicio de despachos.
+
+Uso:
+    python -m msopti --params data/params.json --forecast data/test_buses.csv --start 2024-03-23 --end 2024-03-24
+
+Sólo se indexan los días del pronóstico entre `--start` y `--end`; por
+defecto, el primer día del pronóstico.
+
+Con `--events` se leen además los eventos de las unidades de un archivo o
+una tubería (`-` para la entrada estándar), ver `msopti.events`.
+"""
+
+import argparse
+import asyncio
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from msopti.events import FORMATS, EventIngestor
+from msopti.forecast import load_forecast
+from msopti.params import load_params_from_file
+from msopti.service import DispatchService, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="msopti", description="Servicio de despachos") # pylint: disable=C0301
+    parser.add_argument("--params", default="data/params.json", help="archivo JSON de parámetros") # pylint: disable=C0301
+    parser.add_argument("--params-cache", default=None, help="archivo de caché de los parámetros, ver load_params_from_file") # pylint: disable=C0301
+    parser.add_argument("--forecast", default="data/test_buses.csv", help="CSV del pronóstico o directorio de un almacén creado con convert_csv") # pylint: disable=C0301
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, default=None, help="primer día del pronóstico a cargar, por defecto el primero del pronóstico") # pylint: disable=C0301
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, default=None, help="último día del pronóstico a cargar, por defecto --start") # pylint: disable=C0301
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="ubicación de un socket Unix, en lugar de host y puerto") # pylint: disable=C0301
+    parser.add_argument("--workers", type=int, default=None, help="hilos para resolver despachos") # pylint: disable=C0301
+    parser.add_argument("--events", default=None, help="archivo o tubería de eventos de las unidades, - para la entrada estándar") # pylint: disable=C0301
+    parser.add_argument("--events-format", choices=FORMATS, default=None, help="formato de los eventos, por defecto según la extensión") # pylint: disable=C0301
+    args = parser.parse_args()
+
+    params = load_params_from_file(args.params, args.params_cache)
+    index = load_forecast(args.forecast, args.start, args.end)
+    service = DispatchService(params, index, ThreadPoolExecutor(args.workers))
+    if args.events is not None:
+        service.events = EventIngestor(service.runtime, lock=service.lock_stops)
+        threading.Thread(
+            target=service.events.run,
+            args=(args.events, args.events_format),
+            name="msopti-ingest",
+            daemon=True
+        ).start()
+
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"Escuchando en {where}", flush=True)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,229 @@
 """Resuelve el problema planteado utilizando Recocido Simulado."""
 import simanneal
+import contextlib
+import dataclasses
 import datetime
+import math
+import os
+import random
+import threading
+import time
+import weakref
+import numpy as np
 
-from msopti.algorithm.interfaces import ISolver, Scorefn, Solution, SolverParams, StopTime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator
+from msopti.algorithm.demand import SharedDemandIndex
+from msopti.algorithm.formula import FormulaArgs
+
+from msopti.algorithm.interfaces import ISolver, Scorefn, Solution, SolverParams
+from msopti.algorithm.planification import build_planification
+from msopti.algorithm.schedule_cache import ScheduleCache, schedule_key
+from msopti.algorithm.stats import SolverStats, StatsHook, begin, finish, phase
 from msopti.params import Vehicle, Stop
+from msopti.runtime import UnitTable
+
+_MINUTE = datetime.timedelta(minutes=1)
+
+
+@dataclasses.dataclass
+class EarlyStop:
+    """Criterios para detener el recocido simulado antes de completar sus
+    pasos.
+
+    Los criterios se revisan antes de cada paso, el primero que se cumpla
+    termina la resolución y se reporta en `Solution.stop`.
+
+    Attributes:
+        stall: Cantidad de pasos sin mejorar la mejor puntuación.
+        target: Puntuación que se considera suficiente.
+        budget: Tiempo máximo del recorrido. No incluye el cálculo de los
+            parámetros de enfriamiento ni la planificación.
+    """
+
+    stall: int|None = None
+    target: float|None = None
+    budget: datetime.timedelta|None = None
+
 
 class _AnnealImpl(simanneal.Annealer):
     """Implementación de `simanneal.Annealer` para el problema planteado:
     Ver más en [https://github.com/perrygeo/simanneal?tab=readme-ov-file#quickstart]
     """
     _params: SolverParams
+    _units: UnitTable
+    # el recorrido de move() se lleva en minutos enteros, y los
+    # `datetime.timedelta` que recibe la fórmula se crean una sola vez por
+    # cada tiempo de espera
+    _time: int
+    _interval: int
+    _time_max: int
+    _deltas: dict[int,datetime.timedelta]
+    _slots: int
+    _rng: random.Random|None
+    _early_stop: EarlyStop|None
+    _stopped: str|None
 
     def move(self):
         """Obtener el siguiente estado."""
         unumber = self._params.units[self._index].unit_number
-        self.state = (unumber,(self._time.seconds // 60))
+        self.state = (unumber,self._time)
 
         if self._index == len(self._params.units) - 1:
             self._index = 0
-            if self._time >= self._params.time_max:
-                self._time = datetime.timedelta(minutes=0)
+            if self._time >= self._time_max:
+                self._time = 0
             else:
-                self._time += self._params.interval
+                self._time += self._interval
         else:
             self._index += 1
 
 
+    def random_move(self):
+        """Obtener un estado vecino al azar.
+
+        Con la misma probabilidad se cambia la unidad por otra cualquiera, o
+        el tiempo de espera por el intervalo anterior o el siguiente.
+        """
+        unumber, t = self.state
+        rng = self._rng
+        assert rng is not None
+
+        if rng.random() < .5:
+            unumber = self._params.units[rng.randrange(len(self._params.units))].unit_number # pylint: disable=C0301
+        else:
+            step = rng.choice((-1, 1))
+            slot = t // self._interval + step
+            if not 0 <= slot < self._slots:
+                # en los extremos se rebota hacia el otro lado
+                slot -= 2 * step
+            t = min(max(slot, 0), self._slots - 1) * self._interval
+
+        self.state = (unumber,t)
+
+
+    def _check_stop(self):
+        """Revisa los criterios de `EarlyStop` y detiene el recorrido si se
+        cumple alguno."""
+        stop = self._early_stop
+        assert stop is not None
+        best = self.best_energy
+        if best < self._best:
+            self._best = best
+            self._stall = 0
+        else:
+            self._stall += 1
+
+        if stop.target is not None and best <= stop.target:
+            self._stopped = "target"
+        elif stop.stall is not None and self._stall >= stop.stall:
+            self._stopped = "stall"
+        elif time.perf_counter() - self._started >= self._budget:
+            self._stopped = "budget"
+        else:
+            return
+
+        self.user_exit = True
+
+
+    def anneal(self):
+        if self._early_stop is not None:
+            self._stopped = None
+            self._best = math.inf
+            self._stall = 0
+            self._started = time.perf_counter()
+            self.user_exit = False
+
+        return super().anneal()
+
+
+    def stopped(self) -> str:
+        """Obtiene el criterio que terminó el último recorrido.
+
+        Returns:
+            `steps` si se completaron los pasos, `interrupted` si se
+            interrumpió con SIGINT, o el criterio de `EarlyStop` que se
+            cumplió.
+        """
+        if self._stopped is not None:
+            return self._stopped
+        return "interrupted" if self.user_exit else "steps"
+
+
     def energy(self):
         """Calcular la puntuación del estado actual."""
-        units = self._params.units
-        unit: Vehicle = next(x for x in units if x.unit_number == self.state[0])
+        cap = self._units.capacity(self.state[0])
         start_time = self._params.start_time
-        t = datetime.timedelta(minutes=self.state[1])
+        t = self._deltas.get(self.state[1])
+        if t is None:
+            t = self._deltas[self.state[1]] = datetime.timedelta(minutes=self.state[1]) # pylint: disable=C0301
 
-        return self._params.formula(start_time,t,unit.max)
+        return self._params.formula(start_time,t,cap)
 
 
-    def __init__(self,state: tuple[str|int,int],params: SolverParams) -> None:
+    def __init__(
+            self,
+            state: tuple[str|int,int],
+            params: SolverParams,
+            schedule: dict|None = None,
+            stats: SolverStats|None = None,
+            rng: random.Random|None = None,
+            early_stop: EarlyStop|None = None
+        ) -> None:
         steps = (params.time_max // params.interval) * len(params.units)
         self._index = 0
-        self._time = datetime.timedelta(minutes=0)
+        self._time = 0
+        self._interval = params.interval // _MINUTE
+        # el menor minuto que alcanza o supera time_max
+        self._time_max = -(-params.time_max // _MINUTE)
+        # los tiempos de espera que recorre move(), del 0 a `_time_max`
+        self._slots = -(-self._time_max // self._interval) + 1
+        self._deltas = {}
+        self._rng = rng
+        self._early_stop = early_stop
+        self._stopped = None
         self._params = params
+        self._units = UnitTable(params.units)
         super(_AnnealImpl,self).__init__(state)
         self.copy_strategy = "slice"
-        self.set_schedule(self.auto(minutes=0.2,steps=steps))
+
+        if stats is not None:
+            # se reemplaza energy() sólo en esta instancia, sin
+            # instrumentación no se agrega ningún costo
+            energy = self.energy
+
+            def counted():
+                stats.evaluations += 1
+                return energy()
+
+            self.energy = counted
+
+        if rng is not None:
+            # con un generador, move() recorre el espacio de soluciones al
+            # azar en lugar de hacerlo en orden
+            self.move = self.random_move
+
+        if schedule is None:
+            with phase(stats, "calibration"):
+                schedule = self.auto(minutes=0.2,steps=steps)
+            # auto() modifica el estado y el recorrido de move()
+            self.state = self.copy_state(state)
+            self._index = 0
+            self._time = 0
+
+        self.schedule = schedule
+        self.set_schedule(schedule)
+
+        if early_stop is not None:
+            # se revisa después de auto(), el cual también usa move()
+            self._budget = early_stop.budget.total_seconds() if early_stop.budget is not None else math.inf # pylint: disable=C0301
+            move = self.move
+
+            def checked():
+                self._check_stop()
+                return move()
+
+            self.move = checked
 
 
 class AnnealSolver(ISolver):
@@ -76,51 +256,65 @@ class AnnealSolver(ISolver):
     5. El número de iteraciones será calculado en base al número de veces que
     se puede subir el intervalo (m), y la cantidad de unidades que se tiene (n)
     siguiendo la fórmula $m \\times n$
+
+    Los parámetros de enfriamiento se calculan con `simanneal.Annealer.auto()`,
+    lo cual toma un tiempo fijo antes de resolver el problema. Para evitarlo se
+    puede indicar un `schedule` explícito, o una `ScheduleCache` que guarda los
+    parámetros calculados por ruta, hora del día y tamaño del problema.
+
+    Con `early_stop` (ver `EarlyStop`) el recocido se detiene antes de
+    completar los pasos, si la mejor puntuación deja de mejorar, alcanza un
+    objetivo, o se agota el tiempo. El criterio que terminó la resolución se
+    reporta en `Solution.stop`.
+
+    Si se provee un `SolverStats` o un `StatsHook`, se miden las fases
+    `calibration`, `anneal` y `planification`, se cuentan las evaluaciones
+    de `energy()` y los aciertos de la `ScheduleCache`, y se registra la
+    puntuación de la solución.
     """
     _annealer: _AnnealImpl
     _params: SolverParams
+    _units: UnitTable
+    _stats: SolverStats|None
+    _hook: StatsHook|None
 
     def solve(self) -> Solution:
         result: tuple[int,int]
-        result, _ = self._annealer.anneal()
-        unit = next(i for i in self._params.units if i.unit_number == result[0])
+        e: float
+        stats = self._stats
+        with phase(stats, "anneal"):
+            result, e = self._annealer.anneal()
+        unit = self._units.unit(result[0])
         delay = result[1]
 
-        start = datetime.timedelta(
-            hours=self._params.start_time.hour,
-            minutes=self._params.start_time.minute
-        )
-
-        official_start_time = start + datetime.timedelta(minutes=delay)
-
-        planification = []
-        stopi = [i.id for i in self._params.stops].index(self._params.start_point)
-
-        for i in self._params.stops[stopi:]:
-            stop_time = official_start_time + i.time + i.event_delay
-            official_start_time = stop_time
-            planification.append(
-                StopTime(
-                    i,
-                    datetime.time(
-                        hour=stop_time.seconds // 3600,
-                        minute=(stop_time.seconds % 3600) // 60,
-                    )
-                )
+        with phase(stats, "planification"):
+            planification = build_planification(
+                self._params.stops,
+                self._params.start_point,
+                self._params.start_time,
+                delay,
+                self._params.positions,
+                self._params.offsets
             )
 
-        return Solution(unit,planification,delay)
+        solution = Solution(unit,planification,delay,stop=self._annealer.stopped()) # pylint: disable=C0301
+        if stats is not None:
+            stats.energy = e
+        finish([solution], stats, self._hook)
+        return solution
 
 
-    def solve_multi(self):
-        result: tuple[int,int]
-        e: float
-        result, e = self._annealer.anneal()
+    def solve_multi(self) -> list[Solution]:
+        """Resuelve el problema planteado.
+
+        El recocido simulado sólo conserva el mejor estado encontrado, por
+        lo que la lista contiene una sola solución. Su puntuación se obtiene
+        con la instrumentación, ver `SolverStats.energy`.
 
-        unit = next(i for i in self._params.units if i.unit_number == result[0])
-        print(f"Unidad: {unit}")
-        print(f"Minutos antes de salir: {result[1]}")
-        print(f"Puntuación: {e}")
+        Returns:
+            Una lista con la solución.
+        """
+        return [ self.solve() ]
 
 
     def __init__(
@@ -136,6 +330,14 @@ class AnnealSolver(ISolver):
         units: list[Vehicle],
         stops: list[Stop],
         start_point: str|int,
+        schedule: dict|None = None,
+        schedule_cache: ScheduleCache|None = None,
+        route: str|int|None = None,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None,
+        stats: SolverStats|None = None,
+        hook: StatsHook|None = None,
+        early_stop: EarlyStop|None = None,
         ) -> None:
         p = SolverParams(
             formula,
@@ -148,7 +350,9 @@ class AnnealSolver(ISolver):
             interval,
             units,
             stops,
-            start_point
+            start_point,
+            positions,
+            offsets
         )
 
         # En https://github.com/perrygeo/simanneal?tab=readme-ov-file#implementation-details
@@ -159,5 +363,439 @@ class AnnealSolver(ISolver):
         # la representación del estado lo más ligera y rápida de copiar posible,
         # razón por la cual no utilizo SolverParams como el estado
         initial_state = next((unit.unit_number,0) for unit in units)
-        self._annealer = _AnnealImpl(initial_state,p)
+
+        key = schedule_key(
+            route,
+            start_time,
+            len(units),
+            time_max // interval,
+            (time_score, cap_score, low_demand_score, zero_demand_score)
+        )
+        self._stats = begin(stats, hook)
+        self._hook = hook
+        if schedule is None and schedule_cache is not None:
+            schedule = schedule_cache.get(key)
+            if self._stats is not None:
+                self._stats.count("schedule_cache_miss" if schedule is None else "schedule_cache_hit") # pylint: disable=C0301
+
+        self._annealer = _AnnealImpl(initial_state,p,schedule,self._stats,early_stop=early_stop) # pylint: disable=C0301
         self._params = p
+        self._units = self._annealer._units # pylint: disable=W0212
+
+        if schedule_cache is not None:
+            schedule_cache.put(key,self._annealer.schedule)
+
+
+@dataclasses.dataclass
+class ChainResult:
+    """El resultado de una cadena de `MultiStartAnnealSolver`.
+
+    Attributes:
+        seed: La semilla de la cadena.
+        state: El mejor estado encontrado, una tupla con el número de la
+            unidad y los minutos de espera.
+        energy: La puntuación del mejor estado.
+        evaluations: La cantidad de evaluaciones de la fórmula en la cadena.
+        temperature: La temperatura de la réplica en el modo `tempering`, o
+            `None` en el modo `multistart`.
+        final_state: El estado en el que terminó la cadena, desde el cual
+            continúa la réplica en el modo `tempering`.
+        final_energy: La puntuación de `final_state`.
+    """
+
+    seed: int
+    state: tuple[str|int,int]
+    energy: float
+    evaluations: int
+    temperature: float|None = None
+    final_state: tuple[str|int,int]|None = None
+    final_energy: float|None = None
+
+
+def _chain(
+        params: SolverParams,
+        seed: int,
+        state: tuple[str|int,int],
+        schedule: dict
+    ) -> ChainResult:
+    """Ejecuta una cadena de recocido simulado con movimientos al azar.
+
+    `simanneal` usa el módulo `random` para aceptar los estados, por lo que
+    se inicializa con la semilla de la cadena y se restaura al terminar.
+
+    `simanneal.Annealer.anneal()` sólo devuelve el mejor estado; el estado
+    en el que termina la cadena se registra con `update()`, que se llama
+    después de cada paso con la puntuación del estado actual si `updates`
+    es mayor que `steps`.
+    """
+    saved = random.getstate()
+    random.seed(seed)
+    try:
+        stats = SolverStats()
+        annealer = _AnnealImpl(state,params,schedule,stats,random.Random(seed))
+        current: list = [state, math.nan]
+
+        def update(step, T, E, acceptance, improvement): # pylint: disable=W0613
+            current[:] = [annealer.state, E]
+
+        annealer.update = update
+        annealer.updates = annealer.steps + 1
+        best, e = annealer.anneal()
+    finally:
+        random.setstate(saved)
+
+    return ChainResult(seed, best, e, stats.evaluations, final_state=current[0], final_energy=current[1]) # pylint: disable=C0301
+
+
+_worker: SolverParams|None = None
+"""Los parámetros de cada proceso de `MultiStartAnnealSolver`."""
+
+
+_shared: dict[tuple[int,datetime.datetime|None],SharedDemandIndex] = {}
+"""El pronóstico en memoria compartida de `MultiStartAnnealSolver`, por
+pronóstico (`id`) y día, o `None` si se comparte completo."""
+_shared_lock = threading.Lock()
+
+
+def _release(key: tuple[int,datetime.datetime|None]):
+    """Libera un pronóstico de `_shared`."""
+    with _shared_lock:
+        shared = _shared.pop(key, None)
+    if shared is not None:
+        shared.unlink()
+
+
+def _share(args: FormulaArgs) -> FormulaArgs:
+    """Obtiene los argumentos de una fórmula con el pronóstico en memoria
+    compartida.
+
+    El pronóstico se copia una sola vez y los bloques se liberan cuando el
+    pronóstico original deja de existir. Si la fórmula es `per_day` sólo
+    consulta `curr_date`, por lo que sólo se copia ese día, una vez por
+    día; de lo contrario p(t) suma todos los días y se copia completo.
+    """
+    if isinstance(args.forecast, SharedDemandIndex):
+        return args
+
+    key = (id(args.forecast), args.curr_date if args.per_day else None)
+    with _shared_lock:
+        shared = _shared.get(key)
+        if shared is None:
+            index = args.index()
+            if args.per_day:
+                index = index.select([args.curr_date])
+            shared = _shared[key] = index.share()
+            weakref.finalize(args.forecast, _release, key)
+
+    return args.share(shared)
+
+
+def _init_worker(params: SolverParams, formula: FormulaArgs):
+    """Inicializa un proceso de `MultiStartAnnealSolver`."""
+    global _worker # pylint: disable=W0603
+    _worker = dataclasses.replace(params, formula=formula.build())
+
+
+def _run_chain(task: tuple[int,tuple[str|int,int],dict]) -> ChainResult:
+    """Ejecuta una cadena en un proceso de `MultiStartAnnealSolver`."""
+    assert _worker is not None
+    return _chain(_worker, *task)
+
+
+class MultiStartAnnealSolver(ISolver):
+    """Solucionador que ejecuta varias cadenas de recocido simulado en
+    paralelo.
+
+    A diferencia de `AnnealSolver`, cuyo `move()` recorre las unidades y los
+    tiempos de espera siempre en el mismo orden, cada cadena parte de un
+    estado al azar y se mueve a un vecino al azar: otra unidad, o el
+    intervalo anterior o siguiente. Cada cadena tiene su propia semilla, por
+    lo que los resultados se pueden reproducir indicando `seed`.
+
+    Existen dos modos:
+
+    - `multistart`: cada cadena ejecuta el programa de enfriamiento completo
+      de forma independiente.
+    - `tempering`: _parallel tempering_. Cada cadena (réplica) se mantiene
+      en una temperatura fija, repartidas geométricamente entre `tmin` y
+      `tmax`. Los pasos se dividen en `epochs`; al terminar cada época se
+      intercambian los estados de réplicas vecinas con el criterio de
+      Metropolis, comparando las puntuaciones de los estados en los que
+      terminaron, y cada réplica continúa desde el estado que le toca. El
+      resultado de cada réplica es el mejor estado que encontró en todas
+      las épocas.
+
+    Las fórmulas son _closures_ y no pueden enviarse a otros procesos, por lo
+    que para ejecutar las cadenas en un `ProcessPoolExecutor` se indican los
+    argumentos de la fórmula con un `FormulaArgs`; el pronóstico (sólo el
+    día de la fórmula si es `per_day`) se copia a memoria compartida una
+    sola vez, se reutiliza en las siguientes resoluciones, y cada proceso
+    genera su propia fórmula. Si se indica un `Scorefn`, o si sólo se usaría un
+    proceso (`processes=1`, una cadena o una CPU), las cadenas se ejecutan
+    en este proceso, una tras otra.
+
+    Los parámetros de enfriamiento se obtienen igual que en `AnnealSolver`
+    (`schedule`, `ScheduleCache` o `simanneal.Annealer.auto()`). El progreso
+    de las cadenas no se imprime.
+
+    Si se provee un `SolverStats` o un `StatsHook`, se miden las fases
+    `calibration`, `anneal` y `planification`, se suman las evaluaciones de
+    todas las cadenas y se registra la mejor puntuación. Las puntuaciones de
+    cada cadena se obtienen con `chains()`.
+    """
+    MODES = ("multistart", "tempering")
+
+    _annealer: _AnnealImpl
+    _params: SolverParams
+    _units: UnitTable
+    _formula_args: FormulaArgs|None
+    _schedule: dict
+    _chains: int
+    _mode: str
+    _epochs: int
+    _processes: int|None
+    _rng: random.Random
+    _results: list[ChainResult]
+    _stats: SolverStats|None
+    _hook: StatsHook|None
+
+    def chains(self) -> list[ChainResult]:
+        """Obtiene el resultado de cada cadena de la última resolución.
+
+        Returns:
+            Una lista de `ChainResult`, en el orden de las cadenas (en el
+            modo `tempering`, de la menor a la mayor temperatura).
+        """
+        return list(self._results)
+
+
+    def _initial(self) -> tuple[str|int,int]:
+        """Obtiene un estado inicial al azar."""
+        units = self._params.units
+        annealer = self._annealer
+        unit = units[self._rng.randrange(len(units))].unit_number
+        return (unit,self._rng.randrange(annealer._slots) * annealer._interval) # pylint: disable=W0212
+
+
+    @contextlib.contextmanager
+    def _executor(self) -> Iterator[Callable[[list],list[ChainResult]]]:
+        """Obtiene una función que ejecuta una lista de cadenas, en un grupo
+        de procesos si es posible."""
+        processes = self._processes or min(self._chains, os.cpu_count() or 1)
+        if self._formula_args is None or processes == 1:
+            yield lambda tasks: [ _chain(self._params, *i) for i in tasks ]
+            return
+
+        params = dataclasses.replace(self._params, formula=None)
+        with ProcessPoolExecutor(
+                processes,
+                initializer=_init_worker,
+                initargs=(params, self._formula_args)
+            ) as pool:
+            yield lambda tasks: list(pool.map(_run_chain, tasks))
+
+
+    def _multistart(self, run: Callable[[list],list[ChainResult]]) -> list[ChainResult]: # pylint: disable=C0301
+        """Ejecuta las cadenas independientes."""
+        schedule = dict(self._schedule, updates=0)
+        seeds = [ self._rng.randrange(2**32) for _ in range(self._chains) ]
+        return run([ (i, self._initial(), schedule) for i in seeds ])
+
+
+    def _tempering(self, run: Callable[[list],list[ChainResult]]) -> list[ChainResult]: # pylint: disable=C0301
+        """Ejecuta las réplicas de _parallel tempering_."""
+        schedule = self._schedule
+        n = self._chains
+        temperatures = np.geomspace(schedule["tmin"], schedule["tmax"], n)
+        epochs = max(1, min(self._epochs, schedule["steps"]))
+        steps = max(1, schedule["steps"] // epochs)
+
+        seeds = [ self._rng.randrange(2**32) for _ in range(n) ]
+        states = [ self._initial() for _ in range(n) ]
+        best: list[ChainResult|None] = [None] * n
+        evaluations = [0] * n
+
+        for epoch in range(epochs):
+            results = run([
+                (
+                    (seeds[i] + epoch) % 2**32,
+                    states[i],
+                    { "tmax": t, "tmin": t, "steps": steps, "updates": 0 },
+                )
+                for i, t in enumerate(temperatures)
+            ])
+
+            for i, result in enumerate(results):
+                evaluations[i] += result.evaluations
+                current = best[i]
+                if current is None or result.energy < current.energy:
+                    best[i] = result
+
+            # cada réplica continúa desde donde terminó, no desde su mejor
+            # estado, y el intercambio compara esas puntuaciones
+            states = [ i.final_state for i in results ]
+            energies = [ i.final_energy for i in results ]
+            # se alternan los pares (0, 1), (2, 3), ... y (1, 2), (3, 4), ...
+            for i in range(epoch % 2, n - 1, 2):
+                d = (1 / temperatures[i] - 1 / temperatures[i + 1]) * (energies[i] - energies[i + 1]) # pylint: disable=C0301
+                if d >= 0 or self._rng.random() < math.exp(d):
+                    states[i], states[i + 1] = states[i + 1], states[i]
+                    energies[i], energies[i + 1] = energies[i + 1], energies[i] # pylint: disable=C0301
+
+        result = []
+        for i, t in enumerate(temperatures):
+            chain = best[i]
+            assert chain is not None
+            result.append(ChainResult(seeds[i], chain.state, chain.energy, evaluations[i], float(t), states[i], energies[i])) # pylint: disable=C0301
+
+        return result
+
+
+    def solve(self) -> Solution:
+        """Resuelve el problema planteado.
+
+        Returns:
+            La mejor solución de todas las cadenas.
+        """
+        return self.solve_multi()[0]
+
+
+    def solve_multi(self) -> list[Solution]:
+        """Resuelve el problema planteado.
+
+        Returns:
+            Una lista con la solución de cada cadena, ordenada de la mejor a
+            la peor.
+        """
+        stats = self._stats
+        with phase(stats, "anneal"), self._executor() as run:
+            if self._mode == "tempering":
+                self._results = self._tempering(run)
+            else:
+                self._results = self._multistart(run)
+
+        ranked = sorted(self._results, key=lambda i: i.energy)
+        with phase(stats, "planification"):
+            solutions = [
+                Solution(
+                    self._units.unit(i.state[0]),
+                    build_planification(
+                        self._params.stops,
+                        self._params.start_point,
+                        self._params.start_time,
+                        i.state[1],
+                        self._params.positions,
+                        self._params.offsets
+                    ),
+                    i.state[1]
+                )
+                for i in ranked
+            ]
+
+        if stats is not None:
+            stats.evaluations += sum(i.evaluations for i in self._results)
+            stats.energy = ranked[0].energy
+        finish(solutions, stats, self._hook)
+        return solutions
+
+
+    def __init__(
+        self,
+        formula: Scorefn|FormulaArgs,
+        time_score: float,
+        cap_score: float,
+        low_demand_score: float,
+        zero_demand_score: float,
+        start_time: datetime.datetime,
+        time_max: datetime.timedelta,
+        interval: datetime.timedelta,
+        units: list[Vehicle],
+        stops: list[Stop],
+        start_point: str|int,
+        chains: int = 4,
+        mode: str = "multistart",
+        epochs: int = 10,
+        processes: int|None = None,
+        seed: int|None = None,
+        schedule: dict|None = None,
+        schedule_cache: ScheduleCache|None = None,
+        route: str|int|None = None,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None,
+        stats: SolverStats|None = None,
+        hook: StatsHook|None = None,
+        ) -> None:
+        """
+        Args:
+            formula: La fórmula, o sus argumentos para generarla en cada
+                proceso.
+            chains: La cantidad de cadenas (o réplicas).
+            mode: `multistart` o `tempering`.
+            epochs: Las épocas del modo `tempering`.
+            processes: La cantidad de procesos, por defecto la menor entre
+                `chains` y la cantidad de CPUs.
+            seed: La semilla de las cadenas.
+
+        Los demás argumentos son los de `AnnealSolver`.
+
+        Raises:
+            ValueError: Si `chains` es menor a 1 o `mode` no es válido.
+        """
+        if chains < 1:
+            raise ValueError(f"Cantidad de cadenas inválida: {chains}")
+        if mode not in self.MODES:
+            raise ValueError(f"Modo inválido: {mode}")
+
+        self._formula_args = _share(formula) if isinstance(formula, FormulaArgs) else None # pylint: disable=C0301
+        p = SolverParams(
+            self._formula_args.build() if self._formula_args is not None else formula, # pylint: disable=C0301
+            time_score,
+            cap_score,
+            low_demand_score,
+            zero_demand_score,
+            start_time,
+            time_max,
+            interval,
+            units,
+            stops,
+            start_point,
+            positions,
+            offsets
+        )
+
+        key = schedule_key(
+            route,
+            start_time,
+            len(units),
+            time_max // interval,
+            (time_score, cap_score, low_demand_score, zero_demand_score)
+        )
+        self._stats = begin(stats, hook)
+        self._hook = hook
+        if schedule is None and schedule_cache is not None:
+            schedule = schedule_cache.get(key)
+            if self._stats is not None:
+                self._stats.count("schedule_cache_miss" if schedule is None else "schedule_cache_hit") # pylint: disable=C0301
+
+        self._rng = random.Random(seed)
+        initial_state = next((unit.unit_number,0) for unit in units)
+        # el programa de enfriamiento se calibra con movimientos al azar,
+        # como los de las cadenas
+        self._annealer = _AnnealImpl(
+            initial_state,
+            p,
+            schedule,
+            self._stats,
+            random.Random(self._rng.randrange(2**32))
+        )
+        self._params = p
+        self._units = self._annealer._units # pylint: disable=W0212
+        self._schedule = self._annealer.schedule
+        self._chains = chains
+        self._mode = mode
+        self._epochs = epochs
+        self._processes = processes
+        self._results = []
+
+        if schedule_cache is not None:
+            schedule_cache.put(key,self._annealer.schedule)
@@ -0,0 +1,163 @@
+"""Resuelve el problema planteado asignando un tiempo de salida a cada
+unidad."""
+import datetime
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from msopti.algorithm.grid import GridSolver
+from msopti.algorithm.interfaces import BatchScorefn, Scorefn, Solution
+from msopti.algorithm.stats import SolverStats, StatsHook, finish, phase
+from msopti.params import Vehicle, Stop
+
+
+class AssignmentSolver(GridSolver):
+    """Solucionador que asigna un tiempo de salida distinto a cada unidad
+    disponible en una sola resolución.
+
+    Califica la misma grilla de unidades por tiempos de espera que
+    `GridSolver`, pero en lugar de elegir el mejor candidato la resuelve como
+    un problema de asignación (`scipy.optimize.linear_sum_assignment`): cada
+    unidad recibe un tiempo de espera distinto, minimizando la suma de las
+    puntuaciones. De este modo la capacidad de cada unidad se asigna a la
+    demanda de su tiempo de salida, en lugar de despachar una unidad a la vez.
+
+    Cada candidato se califica de forma independiente, con el estado de las
+    paradas al momento de resolver; es decir, no se descuentan los pasajeros
+    que recogen las unidades que salen antes.
+
+    Los tiempos de espera van desde 0 hasta `horizon`, que por defecto es
+    `time_max`, por lo que ninguna espera lo supera; si hay más unidades que
+    tiempos, las que sobran quedan sin asignar. Los candidatos que no se
+    pueden calificar tampoco se asignan.
+
+    Si se provee un `SolverStats` o un `StatsHook`, se miden las fases
+    `scores`, `assignment` y `planification`, se cuentan los candidatos
+    calificados y se registra la suma de las puntuaciones asignadas.
+    """
+
+    def _assign(self) -> list[tuple[float,int,int]]:
+        """Resuelve la asignación.
+
+        Returns:
+            Una lista con la puntuación, la posición de la unidad y el tiempo
+            de espera de cada asignación, ordenada por tiempo de espera.
+
+        Raises:
+            ValueError: Si ningún candidato pudo ser calificado.
+        """
+        stats = self._stats
+        with phase(stats, "scores"):
+            delays, scores = self._scores()
+        if stats is not None:
+            stats.evaluations += scores.size
+
+        valid = ~np.isnan(scores)
+        if not valid.any():
+            raise ValueError("Ningún candidato pudo ser calificado")
+
+        with phase(stats, "assignment"):
+            # los candidatos sin calificar se penalizan por encima de
+            # cualquier asignación válida y se descartan al final
+            cost = np.where(valid, scores, np.nanmax(np.abs(scores)) * scores.size + 1).T # pylint: disable=C0301
+            units, times = linear_sum_assignment(cost)
+
+        result = [
+            (float(scores[ti, ui]), int(ui), int(delays[ti]))
+            for ui, ti in zip(units.tolist(), times.tolist())
+            if valid[ti, ui]
+        ]
+        result.sort(key=lambda i: (i[2], i[1]))
+
+        if stats is not None:
+            stats.energy = sum(i[0] for i in result)
+        return result
+
+    def solve(self) -> Solution:
+        """Resuelve el problema planteado.
+
+        Returns:
+            La solución de la unidad asignada al menor tiempo de espera, es
+            decir, el siguiente despacho.
+
+        Raises:
+            ValueError: Si ningún candidato pudo ser calificado.
+        """
+        return self.solve_multi()[0]
+
+    def solve_multi(self) -> list[Solution]:
+        """Resuelve el problema planteado para todas las unidades.
+
+        Returns:
+            Una lista con la solución de cada unidad asignada, ordenada por
+            tiempo de espera.
+
+        Raises:
+            ValueError: Si ningún candidato pudo ser calificado.
+        """
+        assigned = self._assign()
+        with phase(self._stats, "planification"):
+            solutions = [
+                self._solution(self._params.units[ui], delay)
+                for _, ui, delay in assigned
+            ]
+
+        finish(solutions, self._stats, self._hook)
+        return solutions
+
+    def __init__(
+        self,
+        formula: Scorefn,
+        time_score: float,
+        cap_score: float,
+        low_demand_score: float,
+        zero_demand_score: float,
+        start_time: datetime.datetime,
+        time_max: datetime.timedelta,
+        interval: datetime.timedelta,
+        units: list[Vehicle],
+        stops: list[Stop],
+        start_point: str|int,
+        batch_formula: BatchScorefn|None = None,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None,
+        stats: SolverStats|None = None,
+        hook: StatsHook|None = None,
+        horizon: datetime.timedelta|None = None,
+        ) -> None:
+        """
+        Args:
+            horizon: El tiempo de espera máximo de los candidatos, como un
+                `datetime.timedelta` (se califica en minutos). Define las
+                filas de la matriz de costos: un tiempo de espera por cada
+                `interval` desde 0 hasta `horizon` (ver `candidate_delays`),
+                por lo que la matriz es de `ceil(horizon / interval) + 1`
+                tiempos por `len(units)` unidades. Si tiene menos tiempos que
+                unidades, algunas unidades quedan sin asignar. Por defecto es
+                `time_max`; un `horizon` mayor, por ejemplo
+                `interval * (len(units) - 1)` para que cada unidad pueda
+                recibir un tiempo, permite esperas que superan `time_max`.
+
+        Los demás argumentos son los de `GridSolver`; `time_max` sólo se usa
+        como `horizon` por defecto.
+        """
+        if horizon is None:
+            horizon = time_max
+
+        super().__init__(
+            formula,
+            time_score,
+            cap_score,
+            low_demand_score,
+            zero_demand_score,
+            start_time,
+            horizon,
+            interval,
+            units,
+            stops,
+            start_point,
+            batch_formula,
+            positions,
+            offsets,
+            stats,
+            hook
+        )
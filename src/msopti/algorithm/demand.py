@@ -0,0 +1,790 @@
+"""Índice precalculado de la demanda pronosticada.
+
+Filtrar el `pandas.DataFrame` del pronóstico en cada evaluación de la
+fórmula es costoso, por lo que este módulo transforma el pronóstico una
+sola vez en arreglos de NumPy indexados por parada, día e intervalo del día.
+"""
+
+import datetime
+import math
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+MINUTES_PER_DAY = 24 * 60
+MINUTE_US = 60 * 1_000_000
+DAY_US = MINUTES_PER_DAY * MINUTE_US
+_MINUTE_BITS = MINUTES_PER_DAY.bit_length()
+_MINUTE_MASK = (1 << _MINUTE_BITS) - 1
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+ARRAYS = ("counts", "prefix", "total", "sparse")
+"""Nombres de los arreglos que componen un `DemandIndex`."""
+_LOG2 = np.concatenate(([0], np.log2(np.arange(1, MINUTES_PER_DAY + 1)).astype(np.int64))) # pylint: disable=C0301
+
+
+def time_us(t: datetime.time) -> int:
+    """Convierte una hora del día en microsegundos desde las 00:00:00."""
+    return (((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000
+            + t.microsecond)
+
+
+def _int_type(array: np.ndarray) -> np.dtype:
+    """Obtiene el tipo de entero con signo más pequeño que puede representar
+    los valores de un arreglo."""
+    lo = int(array.min(initial=0))
+    hi = int(array.max(initial=0))
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return array.dtype
+
+
+def _narrow(array: np.ndarray) -> np.ndarray:
+    """Convierte un arreglo de enteros al tipo de `_int_type`."""
+    return array.astype(_int_type(array), copy=False)
+
+
+def split_peak(keys: np.ndarray) -> tuple[np.ndarray,np.ndarray]:
+    """Separa las llaves codificadas de `DemandIndex.window_peak`.
+
+    Args:
+        keys: Un arreglo de llaves codificadas.
+
+    Returns:
+        Una tupla `(pasajeros, minutos)`; los pasajeros valen -1 en donde
+        no existían filas del pronóstico.
+    """
+    return keys >> _MINUTE_BITS, keys & _MINUTE_MASK
+
+
+def _slots(step: int, offset: int) -> int:
+    """Obtiene la cantidad de intervalos de `step` minutos del día a partir
+    del minuto `offset`."""
+    return (MINUTES_PER_DAY - offset + step - 1) // step
+
+
+class DemandIndex:
+    """Índice de la demanda pronosticada por parada, día e intervalo.
+
+    Se construye a partir del mismo `pandas.DataFrame` que recibe
+    `gererate_formula`, y precalcula por cada parada y cada día un arreglo
+    de sumas acumuladas sobre los intervalos del día. De este modo, la
+    cantidad de pasajeros en cualquier ventana de tiempo se obtiene con dos
+    consultas a un arreglo, sin filtrar ni concatenar `DataFrame`s.
+
+    Para el minuto con mayor demanda de una ventana se construye además una
+    _sparse table_ por parada y día, la cual responde en O(1) cuál es el
+    último minuto con la demanda máxima dentro de cualquier rango. Cada celda
+    de la tabla codifica los pasajeros y el minuto en un solo entero
+    (`pasajeros << 11 | minuto`), así el máximo de dos celdas es a la vez
+    la mayor demanda y, en caso de empate, el minuto más tardío.
+
+    Los arreglos no guardan cada minuto del día sino la grilla del
+    pronóstico: intervalos de `step` minutos a partir del minuto `offset`
+    (por ejemplo, cada 5 minutos desde las 00:00), y cada arreglo usa el
+    tipo de entero más pequeño que puede representar sus valores. Las
+    consultas siguen recibiendo ventanas en microsegundos y dan el mismo
+    resultado que sobre la grilla de minutos.
+
+    El índice asume que las marcas de tiempo del pronóstico están en minutos
+    exactos. Si existen varias filas para una misma parada y minuto, sus
+    pasajeros se suman.
+
+    Attributes:
+        stop_ids: Los ids de las paradas (string o int) en el orden en el que
+            se almacenan en los arreglos.
+        days: Los días (`pandas.Timestamp` con la hora en 00:00:00) en el
+            orden en el que se almacenan en los arreglos.
+        step: La duración en minutos de cada intervalo.
+        offset: El minuto del día en el que inicia el primer intervalo,
+            menor a `step`.
+        counts: Arreglo de forma `(paradas, días, intervalos)` con los
+            pasajeros pronosticados en cada intervalo.
+        prefix: Arreglo de forma `(paradas, días, intervalos + 1)` con la
+            suma acumulada de `counts` en cada día.
+        total: Arreglo de forma `(paradas, intervalos + 1)` con la suma
+            acumulada de los pasajeros de todos los días.
+        sparse: Arreglo de forma `(paradas, días, niveles, intervalos)` con
+            la _sparse table_ de la demanda codificada; el nivel `k` guarda
+            el máximo de los rangos de `2 ** k` intervalos que inician en
+            cada intervalo. Los intervalos sin filas en el pronóstico valen
+            -1.
+    """
+
+    stop_ids: list[str|int]
+    days: list[pd.Timestamp]
+    step: int
+    offset: int
+    counts: np.ndarray
+    prefix: np.ndarray
+    total: np.ndarray
+    sparse: np.ndarray
+
+    def __init__(self, forecast: pd.DataFrame) -> None:
+        """Construye el índice a partir de un pronóstico.
+
+        Args:
+            forecast: pandas.DataFrame, Un dataset con `pandas.DatetimeIndex`,
+                una columna `passengers` y una columna `stop_id`.
+
+        Raises:
+            ValueError: cuando el pandas.DataFrame no contiene las llaves
+                `passengers` y `stop_id`, no tiene `pandas.DatetimeIndex`, o
+                sus marcas de tiempo no están en minutos exactos.
+        """
+        if not all(i in forecast.columns for i in ["passengers","stop_id"]):
+            raise ValueError("No se encontró las columnas 'passengers' y 'stop_id'") # pylint: disable=C0301
+
+        if not isinstance(forecast.index, pd.DatetimeIndex):
+            raise ValueError("No se tiene un `DatetimeIndex` como índice")
+
+        index = forecast.index
+        if (index != index.floor("min")).any():
+            raise ValueError("El índice contiene tiempos que no están en minutos exactos") # pylint: disable=C0301
+
+        stop_pos, stop_ids = pd.factorize(forecast["stop_id"])
+        day_pos, days = pd.factorize(index.normalize(), sort=True)
+        minutes = (index.hour * 60 + index.minute).to_numpy()
+
+        # la grilla más gruesa que contiene todos los minutos del pronóstico
+        first = int(minutes.min(initial=0))
+        step = int(np.gcd.reduce(minutes - first, initial=0)) or MINUTES_PER_DAY # pylint: disable=C0301
+        offset = first % step
+        slots = (minutes - offset) // step
+
+        shape = (len(stop_ids), len(days), _slots(step, offset))
+        counts = np.zeros(shape, dtype=np.int64)
+        np.add.at(
+            counts,
+            (stop_pos, day_pos, slots),
+            forecast["passengers"].to_numpy(dtype=np.int64)
+        )
+        present = np.zeros(shape, dtype=bool)
+        present[stop_pos, day_pos, slots] = True
+
+        self._setup(list(stop_ids.tolist()), list(days), self._build(counts, present, step, offset), step, offset) # pylint: disable=C0301
+
+    @classmethod
+    def from_counts(
+            cls,
+            stop_ids: list[str|int],
+            days: list[pd.Timestamp],
+            counts: np.ndarray,
+            present: np.ndarray,
+            step: int = 1,
+            offset: int = 0
+        ) -> "DemandIndex":
+        """Crea un índice a partir de los pasajeros por intervalo.
+
+        Args:
+            stop_ids: Los ids de las paradas en el orden de los arreglos.
+            days: Los días en el orden de los arreglos.
+            counts: Arreglo de forma `(paradas, días, intervalos)` con los
+                pasajeros pronosticados en cada intervalo.
+            present: Arreglo booleano con la forma de `counts`, indica los
+                intervalos que tienen una fila en el pronóstico.
+            step: La duración en minutos de cada intervalo, por defecto un
+                minuto.
+            offset: El minuto del día en el que inicia el primer intervalo.
+
+        Returns:
+            Un `DemandIndex`.
+
+        Raises:
+            ValueError: Si `counts` no tiene un intervalo por cada `step`
+                minutos del día a partir de `offset`.
+        """
+        if counts.shape[2:] != (_slots(step, offset),):
+            raise ValueError(f"Se esperaban {_slots(step, offset)} intervalos de {step} minutos") # pylint: disable=C0301
+
+        return cls.from_arrays(stop_ids, days, cls._build(counts, present, step, offset), step, offset) # pylint: disable=C0301
+
+    @classmethod
+    def _build(
+            cls,
+            counts: np.ndarray,
+            present: np.ndarray,
+            step: int,
+            offset: int
+        ) -> dict[str,np.ndarray]:
+        """Construye los arreglos del índice a partir de los pasajeros por
+        intervalo."""
+        counts = counts.astype(np.int64, copy=False)
+        prefix = np.zeros(counts.shape[:2] + (counts.shape[2] + 1,), dtype=np.int64) # pylint: disable=C0301
+        np.cumsum(counts, axis=2, out=prefix[:, :, 1:])
+
+        return {
+            "counts": _narrow(counts),
+            "prefix": _narrow(prefix),
+            "total": _narrow(prefix.sum(axis=1)),
+            "sparse": cls._build_sparse(counts, present, step, offset),
+        }
+
+    def _setup(
+            self,
+            stop_ids: list[str|int],
+            days: list[pd.Timestamp],
+            arrays: dict[str,np.ndarray],
+            step: int,
+            offset: int
+        ):
+        """Asigna los ids, los días, la grilla y los arreglos del índice."""
+        self.stop_ids = stop_ids
+        self.days = days
+        self.step = step
+        self.offset = offset
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self._stops = { s: i for i, s in enumerate(self.stop_ids) }
+        self._days = { d: i for i, d in enumerate(self.days) }
+
+    @classmethod
+    def from_arrays(
+            cls,
+            stop_ids: list[str|int],
+            days: list[pd.Timestamp],
+            arrays: dict[str,np.ndarray],
+            step: int = 1,
+            offset: int = 0
+        ) -> "DemandIndex":
+        """Crea un índice a partir de arreglos construidos previamente.
+
+        Los arreglos no se copian, por lo que pueden vivir, por ejemplo, en
+        memoria compartida.
+
+        Args:
+            stop_ids: Los ids de las paradas en el orden de los arreglos.
+            days: Los días en el orden de los arreglos.
+            arrays: Un diccionario con los arreglos nombrados en `ARRAYS`.
+            step: La duración en minutos de cada intervalo.
+            offset: El minuto del día en el que inicia el primer intervalo.
+
+        Returns:
+            Un `DemandIndex`.
+        """
+        index = cls.__new__(cls)
+        index._setup(stop_ids, days, arrays, step, offset) # pylint: disable=W0212
+        return index
+
+    @staticmethod
+    def _build_sparse(
+            counts: np.ndarray,
+            present: np.ndarray,
+            step: int,
+            offset: int
+        ) -> np.ndarray:
+        """Construye la _sparse table_ de la demanda codificada.
+
+        Args:
+            counts: Los pasajeros por parada, día e intervalo.
+            present: Los intervalos que tienen una fila en el pronóstico.
+            step: La duración en minutos de cada intervalo.
+            offset: El minuto del día en el que inicia el primer intervalo.
+
+        Returns:
+            Un arreglo de forma `(paradas, días, niveles, intervalos)`.
+        """
+        slots = counts.shape[2]
+        levels = slots.bit_length()
+        minute = offset + step * np.arange(slots, dtype=np.int64)
+        keys = np.where(present, (counts.astype(np.int64) << _MINUTE_BITS) | minute, -1) # pylint: disable=C0301
+        table = np.full(counts.shape[:2] + (levels, slots), -1, dtype=_int_type(keys)) # pylint: disable=C0301
+        table[:, :, 0] = keys
+        del keys
+
+        for k in range(1, levels):
+            half = 1 << (k - 1)
+            n = slots - (1 << k) + 1
+            np.maximum(
+                table[:, :, k - 1, :n],
+                table[:, :, k - 1, half:half + n],
+                out=table[:, :, k, :n]
+            )
+
+        return table
+
+    def select(self, days: list[datetime.datetime]) -> "DemandIndex":
+        """Obtiene un índice con sólo algunos días del pronóstico.
+
+        Las consultas de esos días dan el mismo resultado que en este
+        índice; las consultas sin día (`day=None`) suman sólo los días
+        seleccionados.
+
+        Args:
+            days: Los días a conservar; los que no existen en el pronóstico
+                se omiten.
+
+        Returns:
+            Un `DemandIndex` con copias de los arreglos de esos días.
+        """
+        keep = [ self._days[d] for d in dict.fromkeys(map(pd.Timestamp, days)) if d in self._days ] # pylint: disable=C0301
+        prefix = self.prefix[:, keep]
+        return DemandIndex.from_arrays(
+            self.stop_ids,
+            [ self.days[i] for i in keep ],
+            {
+                "counts": self.counts[:, keep],
+                "prefix": prefix,
+                "total": _narrow(prefix.sum(axis=1, dtype=np.int64)),
+                "sparse": self.sparse[:, keep],
+            },
+            self.step,
+            self.offset
+        )
+
+    def share(self) -> "SharedDemandIndex":
+        """Copia los arreglos del índice a memoria compartida.
+
+        Returns:
+            Un `SharedDemandIndex`, el cual puede enviarse a otros procesos
+            para que accedan al índice sin copiarlo.
+        """
+        return SharedDemandIndex(self)
+
+    def positions(self, stop_ids: list[str|int]) -> np.ndarray:
+        """Obtiene la posición de cada parada en los arreglos del índice.
+
+        Args:
+            stop_ids: Una lista de ids de paradas (string o int).
+
+        Returns:
+            Un arreglo de enteros, -1 para las paradas que no existen en
+            el pronóstico.
+        """
+        return np.array([ self._stops.get(i, -1) for i in stop_ids ], dtype=np.int64) # pylint: disable=C0301
+
+    def _slot_bounds(
+            self,
+            start: np.ndarray,
+            end: np.ndarray
+        ) -> list[tuple[np.ndarray,np.ndarray]]:
+        """Convierte ventanas de tiempo en rangos de intervalos.
+
+        Replica la semántica de `pandas.DataFrame.between_time`: ambos
+        extremos son inclusivos y, si `start` es mayor a `end`, la ventana
+        atraviesa la medianoche, por lo que se divide en dos rangos. Un
+        intervalo está en la ventana si su minuto lo está, ya que el
+        pronóstico sólo tiene filas en esos minutos.
+
+        Args:
+            start: Inicio de las ventanas en microsegundos desde las
+                00:00:00, menor a `DAY_US`.
+            end: Fin de las ventanas en microsegundos desde las 00:00:00,
+                menor a `DAY_US`.
+
+        Returns:
+            Dos tuplas `(inicio, fin)` de arreglos con posiciones de
+            intervalos, ambos inclusivos. Los rangos con `inicio > fin` están
+            vacíos.
+        """
+        # como `offset < step`, ningún extremo sale de la grilla
+        size = self.step * MINUTE_US
+        origin = self.offset * MINUTE_US
+        s0 = -(-(start - origin) // size)
+        s1 = (end - origin) // size
+        wrap = start > end
+
+        return [
+            (s0, np.where(wrap, self.counts.shape[2] - 1, s1)),
+            (np.where(wrap, 0, 1), np.where(wrap, s1, 0)),
+        ]
+
+    def window_passengers(
+            self,
+            stops: np.ndarray,
+            start: np.ndarray,
+            end: np.ndarray,
+            day: datetime.datetime|None = None
+        ) -> np.ndarray:
+        """Obtiene los pasajeros pronosticados en varias ventanas a la vez.
+
+        Los argumentos `stops`, `start` y `end` se combinan siguiendo las
+        reglas de _broadcasting_ de NumPy.
+
+        Args:
+            stops: Posiciones de las paradas, ver `DemandIndex.positions`.
+            start: Inicio de las ventanas (inclusivo) en microsegundos desde
+                las 00:00:00.
+            end: Fin de las ventanas (inclusivo) en microsegundos desde las
+                00:00:00.
+            day: El día a consultar. Si es `None` se suman todos los días
+                del pronóstico, tal como lo hace `between_time`.
+
+        Returns:
+            Un arreglo con la suma de pasajeros de cada ventana, 0 si la
+            parada o el día no existen en el pronóstico.
+        """
+        stops, start, end = np.broadcast_arrays(stops, start, end)
+        result = np.zeros(stops.shape, dtype=np.int64)
+
+        if day is None:
+            acc = self.total
+        elif (di := self._days.get(pd.Timestamp(day))) is not None:
+            acc = self.prefix[:, di]
+        else:
+            return result
+
+        known = stops >= 0
+        rows = np.where(known, stops, 0)
+        for a, b in self._slot_bounds(start, end):
+            ok = known & (a <= b)
+            lo = np.where(ok, a, 0)
+            hi = np.where(ok, b + 1, 0)
+            result += acc[rows, hi]
+            result -= acc[rows, lo]
+
+        return result
+
+    def window_peak(
+            self,
+            stops: np.ndarray,
+            start: np.ndarray,
+            end: np.ndarray,
+            day: datetime.datetime
+        ) -> np.ndarray:
+        """Obtiene la demanda máxima de varias ventanas a la vez.
+
+        Los argumentos `stops`, `start` y `end` se combinan siguiendo las
+        reglas de _broadcasting_ de NumPy.
+
+        Args:
+            stops: Posiciones de las paradas, ver `DemandIndex.positions`.
+            start: Inicio de las ventanas (inclusivo) en microsegundos desde
+                las 00:00:00.
+            end: Fin de las ventanas (inclusivo) en microsegundos desde las
+                00:00:00.
+            day: El día a consultar, con la hora en 00:00:00.
+
+        Returns:
+            Un arreglo de llaves codificadas con la demanda máxima y el último
+            minuto en el que ocurre, -1 si no existen filas del pronóstico en
+            la ventana. Se decodifican con `split_peak`.
+        """
+        stops, start, end = np.broadcast_arrays(stops, start, end)
+        result = np.full(stops.shape, -1, dtype=np.int64)
+
+        di = self._days.get(pd.Timestamp(day))
+        if di is None:
+            return result
+
+        table = self.sparse[:, di]
+        known = stops >= 0
+        rows = np.where(known, stops, 0)
+        for a, b in self._slot_bounds(start, end):
+            ok = known & (a <= b)
+            lo = np.where(ok, a, 0)
+            hi = np.where(ok, b, 0)
+            k = _LOG2[hi - lo + 1]
+            keys = np.maximum(table[rows, k, lo], table[rows, k, hi - (1 << k) + 1]) # pylint: disable=C0301
+            np.maximum(result, np.where(ok, keys, -1), out=result)
+
+        return result
+
+    def passengers(
+            self,
+            stop_id: str|int,
+            start: datetime.time,
+            end: datetime.time,
+            day: datetime.datetime|None = None
+        ) -> int:
+        """Obtiene la cantidad de pasajeros pronosticados en una ventana.
+
+        Args:
+            stop_id: El id de la parada (string o int).
+            start: Hora de inicio de la ventana (inclusiva).
+            end: Hora de fin de la ventana (inclusiva).
+            day: El día a consultar. Si es `None` se suman todos los días
+                del pronóstico, tal como lo hace `between_time`.
+
+        Returns:
+            La suma de pasajeros en la ventana, 0 si la parada o el día no
+            existen en el pronóstico.
+        """
+        return int(self.window_passengers(
+            self.positions([stop_id]),
+            np.int64(time_us(start)),
+            np.int64(time_us(end)),
+            day
+        )[0])
+
+    def peak(
+            self,
+            stop_id: str|int,
+            start: datetime.time,
+            end: datetime.time,
+            day: datetime.datetime
+        ) -> tuple[int,int]|None:
+        """Obtiene el último minuto con la mayor demanda en una ventana.
+
+        Args:
+            stop_id: El id de la parada (string o int).
+            start: Hora de inicio de la ventana (inclusiva).
+            end: Hora de fin de la ventana (inclusiva).
+            day: El día a consultar, con la hora en 00:00:00.
+
+        Returns:
+            Una tupla `(pasajeros, minuto)` con la demanda máxima y el último
+            minuto del día en el que ocurre, o `None` si no existen filas del
+            pronóstico en la ventana.
+        """
+        key = self.window_peak(
+            self.positions([stop_id]),
+            np.int64(time_us(start)),
+            np.int64(time_us(end)),
+            day
+        )[0]
+
+        if key < 0:
+            return None
+
+        value, minute = split_peak(key)
+        return (int(value), int(minute))
+
+
+class SharedDemandIndex:
+    """Un `DemandIndex` almacenado en memoria compartida.
+
+    El proceso que lo crea copia cada arreglo del índice a un bloque de
+    `multiprocessing.shared_memory`. Al serializarse (por ejemplo, al
+    enviarse a un `ProcessPoolExecutor`) sólo viajan los nombres de los
+    bloques, los ids y los días; los demás procesos usan `attach()` para
+    obtener un `DemandIndex` cuyos arreglos apuntan a los mismos bloques, sin
+    copiarlos.
+
+    El proceso que lo creó es el responsable de liberar los bloques con
+    `unlink()`, o usándolo como _context manager_.
+    """
+
+    _stop_ids: list[str|int]
+    _days: list[pd.Timestamp]
+    _grid: tuple[int,int]
+    _layout: dict[str,tuple[str,tuple[int,...],str]]
+    _blocks: list[shared_memory.SharedMemory]
+
+    def __init__(self, index: DemandIndex) -> None:
+        """Copia un índice a memoria compartida.
+
+        Args:
+            index: El índice a compartir.
+        """
+        self._stop_ids = index.stop_ids
+        self._days = index.days
+        self._grid = (index.step, index.offset)
+        self._layout = {}
+        self._blocks = []
+
+        for name in ARRAYS:
+            array = getattr(index, name)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1)) # pylint: disable=C0301
+            np.ndarray(array.shape, array.dtype, block.buf)[...] = array
+            self._blocks.append(block)
+            self._layout[name] = (block.name, array.shape, array.dtype.str)
+
+    def __getstate__(self) -> dict:
+        return {
+            "_stop_ids": self._stop_ids,
+            "_days": self._days,
+            "_grid": self._grid,
+            "_layout": self._layout,
+        }
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._blocks = []
+
+    def __enter__(self) -> "SharedDemandIndex":
+        return self
+
+    def __exit__(self, *_):
+        self.unlink()
+
+    def attach(self) -> DemandIndex:
+        """Obtiene un `DemandIndex` cuyos arreglos apuntan a la memoria
+        compartida.
+
+        Los bloques permanecen abiertos mientras este objeto exista.
+
+        Returns:
+            Un `DemandIndex` de sólo lectura.
+        """
+        self._open()
+        arrays = {}
+        for name, block in zip(ARRAYS, self._blocks):
+            _, shape, dtype = self._layout[name]
+            arrays[name] = np.ndarray(shape, np.dtype(dtype), block.buf)
+            arrays[name].flags.writeable = False
+
+        return DemandIndex.from_arrays(self._stop_ids, self._days, arrays, *self._grid) # pylint: disable=C0301
+
+    def _open(self):
+        """Abre los bloques de memoria compartida si aún no lo están."""
+        if not self._blocks:
+            self._blocks = [
+                shared_memory.SharedMemory(name=self._layout[name][0])
+                for name in ARRAYS
+            ]
+
+    def close(self):
+        """Cierra los bloques de memoria compartida en este proceso.
+
+        Los `DemandIndex` obtenidos con `attach()` no deben usarse después de
+        cerrar los bloques.
+        """
+        for block in self._blocks:
+            try:
+                block.close()
+            except BufferError:
+                # aún existen arreglos que apuntan al bloque, el mapeo se
+                # libera cuando estos sean recolectados
+                pass
+        self._blocks = []
+
+    def unlink(self):
+        """Cierra y libera los bloques de memoria compartida.
+
+        Sólo debe llamarse desde el proceso que creó el objeto.
+        """
+        self._open()
+        for block in self._blocks:
+            block.unlink()
+        self.close()
+
+
+PYRAMID_STEPS = (15, 60)
+"""Granularidades en minutos de los niveles agregados de `DemandPyramid`."""
+
+
+class DemandPyramid:
+    """Pirámide de agregación de la demanda pronosticada.
+
+    El primer nivel guarda los pasajeros de cada parada y día con la
+    granularidad original del pronóstico (por ejemplo, 5 minutos), y cada
+    nivel siguiente los suma en intervalos más largos (por defecto 15
+    minutos y 1 hora). Los niveles gruesos permiten descartar rápidamente
+    los tiempos de salida poco prometedores, ver `CoarseToFineSolver`.
+
+    Cada nivel puede convertirse en un `DemandIndex` con `index()`; los
+    pasajeros de cada intervalo agregado se asignan a su minuto central, de
+    modo que las ventanas de la fórmula no se sesgan hacia un extremo del
+    intervalo. Los índices se construyen la primera vez que se piden y se
+    reutilizan.
+
+    Attributes:
+        stop_ids: Los ids de las paradas (string o int) en el orden en el que
+            se almacenan en los arreglos.
+        days: Los días (`pandas.Timestamp` con la hora en 00:00:00) en el
+            orden en el que se almacenan en los arreglos.
+        steps: La granularidad en minutos de cada nivel, de la más fina a la
+            más gruesa.
+        counts: Un arreglo por nivel de forma `(paradas, días, intervalos)`
+            con los pasajeros de cada intervalo.
+        present: Un arreglo booleano por nivel con la forma de `counts`,
+            indica los intervalos que tienen filas en el pronóstico.
+    """
+
+    stop_ids: list[str|int]
+    days: list[pd.Timestamp]
+    steps: list[int]
+    counts: list[np.ndarray]
+    present: list[np.ndarray]
+
+    def __init__(
+            self,
+            stop_ids: list[str|int],
+            days: list[pd.Timestamp],
+            counts: np.ndarray,
+            present: np.ndarray,
+            step: int,
+            steps: tuple[int,...] = PYRAMID_STEPS
+        ) -> None:
+        """Construye la pirámide a partir de los pasajeros por intervalo.
+
+        Args:
+            stop_ids: Los ids de las paradas en el orden de los arreglos.
+            days: Los días en el orden de los arreglos.
+            counts: Arreglo de forma `(paradas, días, intervalos)` con los
+                pasajeros de cada intervalo de `step` minutos.
+            present: Arreglo booleano con la forma de `counts`, indica los
+                intervalos que tienen una fila en el pronóstico.
+            step: La granularidad en minutos de `counts`.
+            steps: Las granularidades de los niveles agregados; se ignoran
+                las que no son mayores a `step`.
+
+        Raises:
+            ValueError: Si una granularidad no divide al día o no es múltiplo
+                de la granularidad del nivel anterior.
+        """
+        self.stop_ids = stop_ids
+        self.days = days
+        self.steps = [step]
+        self.counts = [counts.astype(np.int64)]
+        self.present = [present]
+        self._indexes: dict[int,DemandIndex] = {}
+
+        for s in sorted(steps):
+            prev = self.steps[-1]
+            if s <= prev:
+                continue
+            if MINUTES_PER_DAY % s != 0 or s % prev != 0:
+                raise ValueError(f"La granularidad {s} no es compatible con {prev}") # pylint: disable=C0301
+
+            shape = counts.shape[:2] + (MINUTES_PER_DAY // s, s // prev)
+            self.counts.append(self.counts[-1].reshape(shape).sum(axis=3))
+            self.present.append(self.present[-1].reshape(shape).any(axis=3))
+            self.steps.append(s)
+
+    @classmethod
+    def from_index(
+            cls,
+            index: DemandIndex,
+            steps: tuple[int,...] = PYRAMID_STEPS
+        ) -> "DemandPyramid":
+        """Construye la pirámide de un índice.
+
+        La granularidad original es la mayor que divide al día y contiene
+        la grilla del índice, y el índice se reutiliza como el primer
+        nivel.
+
+        Args:
+            index: El índice del pronóstico.
+            steps: Ver `DemandPyramid.__init__`.
+
+        Returns:
+            Un `DemandPyramid`.
+        """
+        step = math.gcd(MINUTES_PER_DAY, index.step, index.offset)
+        shape = index.counts.shape[:2] + (MINUTES_PER_DAY // step,)
+        slots = slice(index.offset // step, None, index.step // step)
+        counts = np.zeros(shape, dtype=index.counts.dtype)
+        present = np.zeros(shape, dtype=bool)
+        counts[:, :, slots] = index.counts
+        present[:, :, slots] = index.sparse[:, :, 0] >= 0
+
+        pyramid = cls(
+            index.stop_ids,
+            index.days,
+            counts,
+            present,
+            step,
+            steps
+        )
+        pyramid._indexes[0] = index # pylint: disable=W0212
+        return pyramid
+
+    def index(self, level: int = 0) -> DemandIndex:
+        """Obtiene el `DemandIndex` de un nivel.
+
+        Args:
+            level: La posición del nivel en `steps`.
+
+        Returns:
+            Un `DemandIndex`.
+        """
+        if level not in self._indexes:
+            step = self.steps[level]
+            middle = 0 if level == 0 else step // 2
+            self._indexes[level] = DemandIndex.from_counts(self.stop_ids, self.days, self.counts[level], self.present[level], step, middle) # pylint: disable=C0301
+
+        return self._indexes[level]
@@ -0,0 +1,518 @@
+"""Resuelve la jornada completa de un grupo de unidades utilizando
+programación dinámica."""
+
+import datetime
+import numpy as np
+
+from msopti.algorithm.formula import scoped_stops
+from msopti.algorithm.interfaces import BatchScorefn, ISolver, Solution
+from msopti.algorithm.planification import build_planification, cumulative_offsets # pylint: disable=C0301
+from msopti.algorithm.stats import SolverStats, StatsHook, begin, finish, phase
+from msopti.params import Schedule, Stop, Vehicle
+
+_MINUTE = datetime.timedelta(minutes=1)
+
+class DPSolver(ISolver):
+    """Solucionador que obtiene la jornada óptima de un grupo de unidades
+    con programación dinámica.
+
+    A diferencia de los demás solucionadores, que resuelven un despacho a la
+    vez, `DPSolver` resuelve todos los despachos del día de las unidades que
+    salen desde un mismo punto, minimizando la suma de sus puntuaciones. Los
+    tiempos se toman en una grilla de `Schedule.interval` desde
+    `Schedule.start.min`.
+
+    Las reglas de la jornada son las de `msopti.planner.DayPlanner`:
+
+    - El primer despacho sale entre `start.min` y `start.max`, y el último
+      entre `end.min` y `end.max`.
+    - Entre despachos hay al menos un `interval`, y cada despacho sale a
+      más tardar `time_max` después del momento en que podía salir (un
+      `interval` después del anterior, o cuando una unidad esté disponible).
+    - Al llegar a la última parada, la unidad descansa entre `rest.min` y
+      `rest.max`. Una unidad que aún no ha salido no tiene límite de espera,
+      y una unidad cuyo límite es posterior a `end.max` termina su jornada.
+    - El almuerzo no es obligatorio: como en `DayPlanner`, una unidad sólo
+      almuerza si alguna de sus llegadas ocurre entre `lunch.start` y
+      `lunch.end` y aún no ha almorzado; en ese caso toma `lunch.time` en
+      lugar de `rest.min`, y puede esperar hasta `rest.max - rest.min`
+      adicionales. Una jornada en la que una unidad no llega dentro de esa
+      ventana, o en la que varias unidades almuerzan a la vez, es válida.
+
+    Cada despacho se califica con la fórmula por lotes como lo haría
+    `DayPlanner`: desde un `interval` después del despacho anterior, con
+    cada parada que lee la fórmula (ver `start_points`) visitada por el
+    despacho anterior, o por el de otro grupo (ver `visits`) si salió
+    después. Las paradas anteriores al punto de salida, que la fórmula del
+    último grupo lee al dar la vuelta a la ruta, sólo las visitan los
+    despachos de otros grupos.
+
+    La programación dinámica recorre los intervalos en orden; el estado en
+    cada intervalo es la disponibilidad, el límite de salida y el almuerzo
+    de cada unidad. Los estados iguales se combinan, conservando el de menor
+    costo, por lo que la solución es la óptima bajo estas reglas. Las
+    unidades con la misma capacidad máxima, la única que lee la fórmula,
+    son intercambiables, y los estados que sólo difieren en cuál de ellas
+    está en cada situación también se combinan.
+
+    Aun así, la cantidad de estados crece con las combinaciones de las
+    unidades y es mucho más lento que `msopti.planner.DayPlanner.plan_route`,
+    que resuelve un despacho a la vez: en la ruta de `data/params.json`
+    (14 paradas, dos grupos de 4 unidades de distinta capacidad, intervalos
+    de 5 minutos) el primer grupo recorre cerca de 9 millones de estados y
+    la jornada de la ruta tarda unos 16 segundos, frente a unas centésimas
+    de segundo con `plan_route`. Calificar los candidatos es barato; el
+    tiempo se va en la búsqueda, que es proporcional a los estados. Con
+    `max_states` sólo se conservan los estados de menor costo de cada
+    intervalo, lo que acota el tiempo y la memoria, pero la solución deja de
+    ser necesariamente la óptima.
+
+    Si se provee un `SolverStats` o un `StatsHook`, se miden las fases
+    `scores`, `search` y `planification`, se cuentan los candidatos
+    calificados y los estados (`states`), y se registra la puntuación total.
+    """
+    _formula: BatchScorefn
+    _date: datetime.datetime
+    _schedule: Schedule
+    _units: list[Vehicle]
+    _stops: list[Stop]
+    _start_point: str|int
+    _positions: dict[str|int,int]
+    _offsets: np.ndarray
+    _visits: list[tuple[datetime.datetime,str|int]]
+    _scope: list[Stop]
+    _scope_positions: list[int]
+    _covers: np.ndarray
+    _symmetric: list[np.ndarray]
+    _max_states: int|None
+    _departures: list[datetime.datetime]
+    _stats: SolverStats|None
+    _hook: StatsHook|None
+
+    def departures(self) -> list[datetime.datetime]:
+        """Obtiene la hora de salida de cada despacho de la última
+        resolución, en el orden de `solve_multi()`."""
+        return list(self._departures)
+
+
+    def _time(self, slot: int) -> datetime.datetime:
+        """Obtiene la fecha y hora de un intervalo de la grilla."""
+        return self._base + datetime.timedelta(minutes=slot * self._interval)
+
+
+    def _visit(self, visit: int, d: int):
+        """Asigna a las paradas que lee la fórmula su última visita.
+
+        Cada parada toma la visita del despacho más reciente que pasa por
+        ella: el despacho anterior del grupo, o el último de los despachos
+        de otros grupos hasta `visit` que pasa por ella. Los despachos del
+        grupo pasan por todas las paradas desde su punto de salida, pero no
+        por las anteriores, que la fórmula lee si su alcance da la vuelta a
+        la ruta (ver `scoped_stops`).
+
+        Args:
+            visit: La posición en `visits` del último despacho de otro grupo
+                que salió antes, -1 si ninguno.
+            d: El intervalo del despacho anterior del grupo, -1 si ninguno.
+        """
+        own = self._time(d) if d >= 0 else None
+        first = self._positions[self._start_point]
+        latest = self._covers[visit].tolist() if visit >= 0 else [-1] * len(self._scope) # pylint: disable=C0301
+        for stop, i, other in zip(self._scope, self._scope_positions, latest):
+            departure, start_point = self._visits[other] if other >= 0 else (None, None) # pylint: disable=C0301
+            if own is not None and i >= first and (departure is None or own >= departure): # pylint: disable=C0301
+                departure, start_point = own, self._start_point
+            if departure is None:
+                stop.last_visit = None
+            else:
+                stop.last_visit = departure + datetime.timedelta(minutes=int(self._offsets[i]) - self._position_offset(start_point)) # pylint: disable=C0301
+
+
+    def _position_offset(self, start_point: str|int) -> int:
+        """Obtiene los minutos acumulados hasta la parada anterior a un punto
+        de salida."""
+        i = self._positions[start_point]
+        return int(self._offsets[i - 1]) if i > 0 else 0
+
+
+    def _scores(self) -> np.ndarray:
+        """Califica todos los pares de despachos consecutivos.
+
+        Returns:
+            Un arreglo de forma `(intervalos + 1, intervalos, unidades)`; el
+            elemento `[d + 1, e, u]` es la puntuación de despachar la unidad
+            `u` en el intervalo `e` cuando el despacho anterior salió en el
+            intervalo `d` (`d = -1` para el primer despacho). Los pares que
+            no se pueden calificar valen `numpy.nan`.
+        """
+        n = self._last + 1
+        caps = np.array([ i.max for i in self._units ], dtype=np.int64)
+        result = np.full((n + 1, n, len(caps)), np.nan)
+        # la salida de cada visita de otros grupos, en minutos de la grilla
+        visits = np.array([ (i - self._base) / _MINUTE for i, _ in self._visits ]) # pylint: disable=C0301
+        span = self._reach + self._time_max
+
+        saved = [ i.last_visit for i in self._stops ]
+        try:
+            for d in range(-1, self._last + 1):
+                if d < 0:
+                    candidates = np.arange(0, min(self._time_max, self._first) + 1) # pylint: disable=C0301
+                    start = self._base
+                else:
+                    candidates = np.arange(d + 1, min(d + span, self._last) + 1) # pylint: disable=C0301
+                    start = self._time(d + 1)
+                if len(candidates) == 0:
+                    continue
+
+                # la última visita de otro grupo antes de cada candidato
+                latest = np.searchsorted(visits, candidates * self._interval, side="left") - 1 # pylint: disable=C0301
+
+                for visit in np.unique(latest).tolist():
+                    chosen = candidates[latest == visit]
+                    self._visit(visit, d)
+
+                    t = (chosen - (d + 1)) * self._interval
+                    result[d + 1, chosen] = self._formula(start, t[:, None], caps[None, :]) # pylint: disable=C0301
+                    if self._stats is not None:
+                        self._stats.evaluations += len(chosen) * len(caps)
+        finally:
+            for stop, visit in zip(self._stops, saved):
+                stop.last_visit = visit
+
+        return result
+
+
+    def _returns(self) -> tuple[np.ndarray,np.ndarray,np.ndarray]:
+        """Calcula el regreso de una unidad despachada en cada intervalo.
+
+        Returns:
+            Tres arreglos de forma `(intervalos, 2)`: el intervalo en que la
+            unidad vuelve a estar disponible, su límite de salida (-1 si es
+            posterior a `end.max`) y 1 si almuerza; la segunda columna es
+            para las unidades que ya almorzaron.
+        """
+        schedule = self._schedule
+        lunch_start = self._date + schedule.lunch.start
+        lunch_end = self._date + schedule.lunch.end
+        n = self._last + 1
+        avail = np.zeros((n, 2), dtype=np.int16)
+        limits = np.zeros((n, 2), dtype=np.int16)
+        lunch = np.zeros((n, 2), dtype=np.int64)
+
+        for slot in range(n):
+            arrival = slot * self._interval + self._travel
+            at = self._base + datetime.timedelta(minutes=arrival)
+            for done in (0, 1):
+                rest = schedule.rest.min
+                if not done and lunch_start <= at <= lunch_end:
+                    rest = schedule.lunch.time
+                    lunch[slot, done] = 1
+                ready = arrival + rest // _MINUTE
+                limit = (ready + self._wait) // self._interval
+                avail[slot, done] = -(-ready // self._interval)
+                limits[slot, done] = limit if limit <= self._last else -1
+
+        return avail, limits, lunch
+
+
+    def _keys(
+            self,
+            avail: np.ndarray,
+            limits: np.ndarray,
+            lunched: np.ndarray,
+            slot: int
+        ) -> np.ndarray:
+        """Obtiene una llave por estado, iguales sólo para estados iguales
+        salvo por el orden de las unidades intercambiables.
+
+        En un intervalo, la disponibilidad y el límite de cada unidad están
+        acotados desde el intervalo, por lo que cada unidad se codifica en un
+        entero junto con su almuerzo. Los códigos de las unidades
+        intercambiables se ordenan, y si caben en 63 bits los estados se
+        codifican en un `numpy.int64`; si no, se usa una vista de bytes de
+        cada fila.
+        """
+        n = avail.shape[1]
+        radix_avail = self._reach + 1
+        radix_limits = self._reach + self._wait // self._interval + 3
+        codes = np.empty(avail.shape, dtype=np.int64)
+        for u in range(n):
+            codes[:, u] = ((lunched >> u) & 1) * radix_avail + (avail[:, u] - slot) # pylint: disable=C0301
+            codes[:, u] = codes[:, u] * radix_limits + np.where(limits[:, u] >= 0, limits[:, u] - slot + 1, 0) # pylint: disable=C0301
+        for group in self._symmetric:
+            codes[:, group] = np.sort(codes[:, group], axis=1)
+
+        radix = 2 * radix_avail * radix_limits
+        if radix ** n < 2 ** 63:
+            keys = np.zeros(len(codes), dtype=np.int64)
+            for u in range(n):
+                keys = keys * radix + codes[:, u]
+            return keys
+
+        rows = np.ascontiguousarray(codes)
+        _, keys = np.unique(rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))), return_inverse=True) # pylint: disable=C0301
+        return keys.ravel()
+
+
+    def _search(self, scores: np.ndarray) -> tuple[float,list[tuple[int,int,int]]]: # pylint: disable=C0301
+        """Busca la jornada de menor costo.
+
+        Cada capa de la búsqueda contiene los estados que despachan en un
+        intervalo, como arreglos: la disponibilidad y el límite de cada
+        unidad, la máscara de almuerzos, el costo y el despacho anterior.
+        Las transiciones de todos los estados de una capa se calculan con
+        operaciones vectorizadas, y los estados que llegan a una misma capa
+        se combinan conservando el de menor costo. Con `max_states`, de cada
+        capa sólo se conservan esa cantidad de estados, los de menor costo.
+
+        Returns:
+            Una tupla con el costo total y la lista de despachos, cada uno
+            como `(intervalo anterior, intervalo, unidad)`.
+
+        Raises:
+            ValueError: Si no existe una jornada que cumpla las reglas.
+        """
+        n = len(self._units)
+        last = self._last
+        back_avail, back_limits, back_lunch = self._returns()
+        # por intervalo, los estados que llegan: (disponibilidad, límites,
+        # almuerzos, costo, intervalo anterior, estado anterior, unidad)
+        incoming: list[list[tuple]] = [ [] for _ in range(last + 2) ]
+        incoming[0].append((
+            np.zeros((1, n), dtype=np.int16),
+            np.full((1, n), -1, dtype=np.int16),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(1),
+            np.full(1, -2, dtype=np.int16),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(1, dtype=np.int16),
+        ))
+        layers: list[tuple|None] = [None] * (last + 2)
+        best: tuple[float,int,int]|None = None
+        states = 0
+
+        for d in range(-1, last + 1):
+            if not incoming[d + 1]:
+                continue
+            avail, limits, lunched, cost, prev, index, unit = (
+                np.concatenate(i) for i in zip(*incoming[d + 1])
+            )
+            incoming[d + 1] = []
+
+            # se combinan los estados iguales, conservando el de menor costo
+            keys = self._keys(avail, limits, lunched, d)
+            order = np.lexsort((cost, keys))
+            keep = order[np.r_[True, keys[order][1:] != keys[order][:-1]]]
+            if self._max_states is not None and len(keep) > self._max_states:
+                keep = keep[np.argpartition(cost[keep], self._max_states - 1)[:self._max_states]] # pylint: disable=C0301
+            avail, limits, lunched, cost = avail[keep], limits[keep], lunched[keep], cost[keep] # pylint: disable=C0301
+            layers[d + 1] = (prev[keep], index[keep], unit[keep])
+            states += len(keep)
+
+            ready = np.maximum(avail.min(axis=1), d + 1)
+            pending = np.where(limits >= 0, limits, np.iinfo(np.int16).max).min(axis=1) # pylint: disable=C0301
+            if d >= 0:
+                done = (pending == np.iinfo(np.int16).max) & ((d >= self._end_first) | (ready > last)) # pylint: disable=C0301
+                if done.any():
+                    i = int(np.flatnonzero(done)[np.argmin(cost[done])])
+                    if best is None or cost[i] < best[0]:
+                        best = (float(cost[i]), d, i)
+
+            final = np.minimum(np.minimum(ready + self._time_max, last), pending) # pylint: disable=C0301
+            if d < 0:
+                final = np.minimum(final, self._first)
+
+            row = scores[d + 1]
+            for slot in range(int(ready.min()), int(final.max()) + 1):
+                rows = np.flatnonzero((ready <= slot) & (slot <= final))
+                if len(rows) == 0:
+                    continue
+                free = avail[rows] <= slot
+                for u in range(n):
+                    score = row[slot, u]
+                    if score != score:
+                        continue
+                    chosen = rows[free[:, u]]
+                    if len(chosen) == 0:
+                        continue
+
+                    done = (lunched[chosen] >> u) & 1
+                    a = np.maximum(avail[chosen], slot)
+                    a[:, u] = back_avail[slot, done]
+                    l = limits[chosen]
+                    l[:, u] = back_limits[slot, done]
+                    incoming[slot + 1].append((
+                        a,
+                        l,
+                        lunched[chosen] | (back_lunch[slot, done] << u),
+                        cost[chosen] + score,
+                        np.full(len(chosen), d, dtype=np.int16),
+                        chosen,
+                        np.full(len(chosen), u, dtype=np.int16),
+                    ))
+
+        if self._stats is not None:
+            self._stats.count("states", states)
+        if best is None:
+            raise ValueError("No existe una jornada que cumpla las reglas")
+
+        total, d, i = best
+        path = []
+        while d >= 0:
+            layer = layers[d + 1]
+            assert layer is not None
+            prev, index, unit = layer
+            path.append((int(prev[i]), d, int(unit[i])))
+            d, i = int(prev[i]), int(index[i])
+        path.reverse()
+
+        return total, path
+
+
+    def solve(self) -> Solution:
+        """Resuelve la jornada.
+
+        Returns:
+            El primer despacho de la jornada óptima, ver `solve_multi()`.
+
+        Raises:
+            ValueError: Si no existe una jornada que cumpla las reglas.
+        """
+        return self.solve_multi()[0]
+
+
+    def solve_multi(self) -> list[Solution]:
+        """Resuelve la jornada.
+
+        El `Solution.delay` de cada despacho es la espera desde un
+        `interval` después del despacho anterior (desde `start.min` para el
+        primero); la hora de salida se obtiene con `departures()`.
+
+        Returns:
+            La lista de despachos de la jornada óptima, ordenada por hora de
+            salida.
+
+        Raises:
+            ValueError: Si no existe una jornada que cumpla las reglas.
+        """
+        stats = self._stats
+        with phase(stats, "scores"):
+            scores = self._scores()
+        with phase(stats, "search"):
+            cost, path = self._search(scores)
+
+        solutions = []
+        self._departures = []
+        with phase(stats, "planification"):
+            for prev, slot, u in path:
+                start = self._time(prev + 1) if prev >= 0 else self._base
+                delay = (slot - (prev + 1)) * self._interval
+                solutions.append(Solution(
+                    self._units[u],
+                    build_planification(
+                        self._stops,
+                        self._start_point,
+                        start,
+                        delay,
+                        self._positions,
+                        self._offsets
+                    ),
+                    delay
+                ))
+                self._departures.append(self._time(slot))
+
+        if stats is not None:
+            stats.energy = cost
+        finish(solutions, stats, self._hook)
+        return solutions
+
+
+    def __init__(
+        self,
+        batch_formula: BatchScorefn,
+        date: datetime.datetime,
+        schedule: Schedule,
+        units: list[Vehicle],
+        stops: list[Stop],
+        start_point: str|int,
+        time_max: datetime.timedelta|None = None,
+        visits: list[tuple[datetime.datetime,str|int]]|None = None,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None,
+        stats: SolverStats|None = None,
+        hook: StatsHook|None = None,
+        start_points: list[str|int]|None = None,
+        max_states: int|None = None,
+        ) -> None:
+        """
+        Args:
+            batch_formula: La fórmula por lotes del grupo, ver
+                `gererate_batch_formula`.
+            date: El día a planificar, con la hora en 00:00:00.
+            schedule: Las reglas de la jornada.
+            units: Las unidades del grupo.
+            stops: Las paradas de la ruta.
+            start_point: El id de la parada (string o int) desde donde salen
+                las unidades.
+            time_max: Tiempo máximo de espera de cada despacho, por defecto
+                `Schedule.rest.max`.
+            visits: La hora de salida y el punto de salida de los despachos
+                de otros grupos de la ruta que pasan por las paradas del
+                grupo.
+            positions: La posición de cada parada en `stops`, por id.
+            offsets: Los minutos acumulados de recorrido de `stops`.
+            stats: Las estadísticas de la resolución, opcional.
+            hook: La función que recibe las estadísticas, opcional.
+            start_points: Los puntos de salida con los que se generó
+                `batch_formula`, ver `scoped_stops`; por defecto
+                `[start_point]`.
+            max_states: La cantidad máxima de estados que se conservan en
+                cada intervalo, opcional; por defecto se conservan todos y
+                la solución es la óptima.
+
+        Raises:
+            ValueError: Si `max_states` no es positivo.
+        """
+        if max_states is not None and max_states < 1:
+            raise ValueError("max_states debe ser positivo")
+
+        self._formula = batch_formula
+        self._date = date
+        self._schedule = schedule
+        self._units = units
+        self._stops = stops
+        self._start_point = start_point
+        self._positions = positions if positions is not None else { s.id: i for i, s in enumerate(stops) } # pylint: disable=C0301
+        self._offsets = offsets if offsets is not None else cumulative_offsets(stops) # pylint: disable=C0301
+        self._visits = sorted(
+            i for i in visits or []
+            if self._positions[i[1]] <= self._positions[start_point]
+        )
+        self._scope = scoped_stops(stops, start_points or [start_point], self._positions) # pylint: disable=C0301
+        self._scope_positions = [ self._positions[i.id] for i in self._scope ]
+        # por cada despacho de otro grupo, el último hasta él que pasa por
+        # cada parada del alcance, -1 si ninguno
+        passes = np.array([ self._positions[sp] for _, sp in self._visits ], dtype=np.int64)[:, None] <= np.array(self._scope_positions, dtype=np.int64)[None, :] # pylint: disable=C0301
+        self._covers = np.maximum.accumulate(np.where(passes, np.arange(len(self._visits))[:, None], -1), axis=0) if len(self._visits) else passes.astype(np.int64) # pylint: disable=C0301
+        # los grupos de unidades intercambiables, de más de una unidad
+        groups: dict[int,list[int]] = {}
+        for u, unit in enumerate(units):
+            groups.setdefault(unit.max, []).append(u)
+        self._symmetric = [ np.array(i) for i in groups.values() if len(i) > 1 ]
+        self._max_states = max_states
+        self._departures = []
+        self._stats = begin(stats, hook)
+        self._hook = hook
+
+        interval = schedule.interval
+        self._interval = interval // _MINUTE
+        self._base = date + schedule.start.min
+        self._time_max = (schedule.rest.max if time_max is None else time_max) // interval # pylint: disable=C0301
+        self._first = (schedule.start.max - schedule.start.min) // interval
+        self._last = (schedule.end.max - schedule.start.min) // interval
+        self._end_first = -(-(schedule.end.min - schedule.start.min) // interval) # pylint: disable=C0301
+        self._travel = int(self._offsets[-1]) - self._position_offset(start_point) # pylint: disable=C0301
+        self._wait = (schedule.rest.max - schedule.rest.min) // _MINUTE
+        # los intervalos que una unidad puede estar fuera después de salir
+        longest = max(schedule.rest.min, schedule.lunch.time) // _MINUTE
+        self._reach = -(-(self._travel + longest) // self._interval) + 1
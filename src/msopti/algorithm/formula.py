@@ -1,14 +1,29 @@
 """Módulo de utilidad que genera la función calificadora.
 """
 
+import dataclasses
 import typing
+import math
+import time
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import datetime
 
-from msopti.algorithm.interfaces import Scorefn
+from msopti.algorithm.demand import DemandIndex, DemandPyramid, SharedDemandIndex, DAY_US, MINUTE_US, split_peak, time_us # pylint: disable=C0301
+from msopti.algorithm.formula_cache import FormulaCache
+from msopti.algorithm.interfaces import BatchScorefn, Scorefn
+from msopti.algorithm.stats import SolverStats
 from msopti.params import Scores, Stop
 
-def _limit_stops(stops: list[Stop], s: str|int,e: str|int) -> list[Stop]:
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+def _limit_stops(
+        stops: list[Stop],
+        s: str|int,
+        e: str|int,
+        positions: dict[str|int,int]|None = None
+    ) -> list[Stop]:
     """Delimita las paradas que se tomarán en cuenta para el algoritmo.
 
     No todas las paradas serán tomadas en cuenta, ya que se contempla
@@ -25,6 +40,8 @@ def _limit_stops(stops: list[Stop], s: str|int,e: str|int) -> list[Stop]:
         stops: Una lista de paradas (`Stop`).
         s: El punto de partida de la ruta para una unidad a (string o int).
         e: El punto de partida de la ruta para una unidad b (string o int).
+        positions: La posición de cada parada en `stops`, por id. Si no se
+            indica, se buscan los puntos de partida en la lista.
 
     Returns:
         Una lista ordenada de las paradas que se considerarán para la 
@@ -32,8 +49,12 @@ def _limit_stops(stops: list[Stop], s: str|int,e: str|int) -> list[Stop]:
         1, la función retorna `[1, 2, 3, 4]`, mientra que para la unidad 2,
         retorna `[5, 6, 7, 8]`
     """
-    si = [i.id for i in stops].index(s)
-    ei = [i.id for i in stops].index(e)
+    if positions is None:
+        si = [i.id for i in stops].index(s)
+        ei = [i.id for i in stops].index(e)
+    else:
+        si = positions[s]
+        ei = positions[e]
 
     if ei > si:
         return stops[si:ei]
@@ -44,26 +65,72 @@ def _limit_stops(stops: list[Stop], s: str|int,e: str|int) -> list[Stop]:
     else:
         return stops[si:]
 
+def scoped_stops(
+        stops: list[Stop],
+        start_points: list[str|int],
+        positions: dict[str|int,int]|None = None
+    ) -> list[Stop]:
+    """Obtiene las paradas que toma en cuenta la fórmula.
+
+    Son las paradas cuyo `Stop.event_delay` y `Stop.last_visit` lee la
+    fórmula generada con los mismos argumentos, ver `FormulaCache`.
+
+    Args:
+        stops: Ver `gererate_formula`.
+        start_points: Ver `gererate_formula`.
+        positions: Ver `gererate_formula`.
+
+    Returns:
+        Una lista ordenada de paradas.
+    """
+    return _limit_stops(stops,start_points[0],start_points[-1],positions)
+
+def _lap(stats: SolverStats, name: str, tick: float) -> float:
+    """Acumula el tiempo de un término de la fórmula desde `tick`.
+
+    Returns:
+        El tiempo actual, el inicio del siguiente término.
+    """
+    now = time.perf_counter()
+    stats.add_formula(name, now - tick)
+    return now
+
+def _datetime_us(d: datetime.datetime) -> int:
+    """Obtiene los microsegundos transcurridos desde las 00:00:00 del día."""
+    return time_us(d)
+
+
 # TODO: Mejorar esta api
-def gererate_formula(
-        forecast: pd.DataFrame,
+def gererate_batch_formula(
+        forecast: pd.DataFrame|DemandIndex,
         start_points: list[str|int],
         stops: list[Stop],
         scores: Scores,
-        curr_date: datetime.datetime
-    ) -> Scorefn:
-    """Genera una fórmula para ser utilizada con los algoritmos.
+        curr_date: datetime.datetime,
+        positions: dict[str|int,int]|None = None,
+        stats: SolverStats|None = None,
+        per_day: bool = False
+    ) -> BatchScorefn:
+    """Genera una fórmula que califica varios candidatos a la vez.
 
-    Se necesita tener previamente el dataset con los pronósticos
-    debido a que la función simplemente hace una consulta y una
-    sumatoria con el mismo. Realizar la lectura completa del
-    dataset es una tarea que afectaría negativamente el rendimiento
-    de la función. Razón por la cual también se recomienda
-    proveer el dataset filtrado
+    Es equivalente a `gererate_formula`, pero la función generada recibe
+    arreglos de tiempos de espera (en minutos) y de capacidades, y calcula
+    todas las puntuaciones con operaciones vectorizadas de NumPy. Los
+    términos p(t) y q(t) sólo dependen del tiempo de espera, por lo que se
+    calculan una vez por cada tiempo y se combinan con las capacidades
+    siguiendo las reglas de _broadcasting_. Por ejemplo, con tiempos de
+    forma `(1, m)` y capacidades de forma `(n, 1)` se califica la grilla
+    completa de `n` unidades por `m` tiempos en una sola llamada.
+
+    Como en `gererate_formula`, p(t) suma los pasajeros de la ventana en
+    todos los días del pronóstico y q(t) sólo busca en `curr_date`. Con
+    `per_day`, p(t) también se calcula sólo con `curr_date`, por lo que la
+    puntuación no depende de los demás días cargados.
 
     Args:
         forecast: pandas.DataFrame, Un dataset con `pandas.DatetimeIndex`,
-            una columna `passengers` y una columna `stop_id`
+            una columna `passengers` y una columna `stop_id`, o un
+            `DemandIndex` construido previamente.
         start_points: Una lista de ids de paradas (string o int) indicando los
             puntos en donde se comenzrán a despachar las unidades
         stops: Una lista ordenada de paradas (`Stop`) indicando
@@ -71,34 +138,52 @@ def gererate_formula(
         scores: Un `Scores` con las penalizaciones asignadas
         curr_date: La fecha que se tomará como inicio, debe ser de tipo
             `datetime.datetime` con la hora en 00:00:00
+        positions: La posición de cada parada en `stops`, por id (ver
+            `msopti.runtime.RouteView.positions`).
+        stats: Si se indica, cada llamada acumula en él el tiempo de cada
+            término de la fórmula.
+        per_day: Si es `True`, p(t) sólo cuenta los pasajeros de
+            `curr_date`; por defecto suma todos los días del pronóstico.
 
     Returns:
-        Un `Scorefn` adaptado para utilizarse con los algoritmos de la librería.
+        Un `BatchScorefn`. Las puntuaciones de los candidatos sin pronóstico
+        en `curr_date` son `numpy.nan`.
 
     Raise:
         ValueError: cuando el pandas.DataFrame no contiene las llaves
             `passengers` y `stop_id`, o no tiene `pandas.DatetimeIndex`
     """
 
-    if not all(i in forecast.columns for i in ["passengers","stop_id"]):
-        raise ValueError("No se encontró las columnas 'passengers' y 'stop_id'")
-
-    if not isinstance(forecast.index, pd.DatetimeIndex):
-        raise ValueError("No se tiene un `DatetimeIndex` como índice")
-
-    scoped_stops = _limit_stops(stops,start_points[0],start_points[-1])
+    index = forecast if isinstance(forecast, DemandIndex) else DemandIndex(forecast) # pylint: disable=C0301
+    scoped_stops = _limit_stops(stops,start_points[0],start_points[-1],positions) # pylint: disable=C0301
+    positions = index.positions([ i.id for i in scoped_stops ])[:, None]
+    # el tiempo de recorrido no cambia, el retraso por eventos y la última
+    # visita se leen en cada evaluación
+    travel_us = np.array([ i.time // _MICROSECOND for i in scoped_stops ], dtype=np.int64) # pylint: disable=C0301
 
     a = scores.minute_price
     b = scores.cap_cost
     c = scores.low_demand_cost
     d = scores.zero_demand_cost
     cdate = pd.Timestamp(curr_date)
+    pdate = cdate if per_day else None
 
     def formula(
             start: datetime.datetime,
-            t: datetime.timedelta,
-            x: int
-        ) -> float:
+            t: npt.ArrayLike,
+            x: npt.ArrayLike
+        ) -> np.ndarray:
+        t = np.asarray(t, dtype=np.float64)
+        x = np.asarray(x)
+        shape = t.shape
+        t_us = np.rint(t.ravel() * MINUTE_US).astype(np.int64)
+
+        if len(scoped_stops) == 0:
+            return np.full(np.broadcast_shapes(shape,x.shape),np.nan)
+
+        if stats is not None:
+            stats.formula_calls += 1
+            tick = time.perf_counter()
 
         # setup para p(t) y g(t)
         # si es el primer despacho, se lo tiene que manejar distinto
@@ -108,37 +193,59 @@ def gererate_formula(
         # pero si hubieramos despachado antes, no sería desde las 5:30
         # hasta x en ciertas paradas debido, a que posiblemente hasta
         # ese tiempo ya hayan sido visitadas
-        st = start
-        df = pd.DataFrame()
-        for stop in scoped_stops:
-            # Times (t = 5, t0 = 6:05):
-            #   6:14 - 6:19 (parada 1: tp = 9)
-            #   6:25 - 6:30 (parada 2: tp = 7)
-            #   6:34 - 6:39 (parada 3: tp = 4)
-            #   ...  - ...
-            st = stop.last_visit or st
-            st += (stop.time + stop.event_delay)
-            end = st + t
-            sf = forecast[forecast["stop_id"] == stop.id]
-
-            if stop.last_visit is None:
-                s = sf.between_time(start.time(),end.time())
-            else:
-                s = sf.between_time(st.time(),end.time())
-
-            df = pd.concat([df,s])
+        #
+        # el inicio de la ventana de cada parada no depende de t, por lo
+        # que sólo el final de la ventana es un arreglo
+        #
+        # Times (t = 5, t0 = 6:05):
+        #   6:14 - 6:19 (parada 1: tp = 9)
+        #   6:25 - 6:30 (parada 2: tp = 7)
+        #   6:34 - 6:39 (parada 3: tp = 4)
+        #   ...  - ...
+        #
+        # la llegada a cada parada se acumula desde el inicio, o desde la
+        # última visita de la parada más cercana que ya fue visitada
+        start_us = _datetime_us(start)
+        visits = [ i.last_visit for i in scoped_stops ]
+        visited = np.array([ i is not None for i in visits ])
+        step = travel_us + np.array([ i.event_delay // _MICROSECOND for i in scoped_stops ], dtype=np.int64) # pylint: disable=C0301
+        cum = np.cumsum(step)
+        base = np.array([ start_us if i is None else _datetime_us(i) for i in visits ], dtype=np.int64) - (cum - step) # pylint: disable=C0301
+        anchor = np.maximum.accumulate(np.where(visited,np.arange(len(visits)),0)) # pylint: disable=C0301
+        base = np.where(visited[anchor],base[anchor],start_us)
+        st_us = ((base + cum) % DAY_US)[:, None]
+        lo = np.where(visited[:, None],st_us,start_us)
+
+        hi = (st_us + t_us) % DAY_US
+
+        if stats is not None:
+            tick = _lap(stats,"arrivals",tick)
 
         # p(t)
-        pt = df["passengers"].sum()
+        pt = index.window_passengers(positions,lo,hi,pdate).sum(axis=0)
+
+        if stats is not None:
+            tick = _lap(stats,"passengers",tick)
+
+        # q(t), en empate se prefiere la última parada, igual que al
+        # tomar la última fila de los `DataFrame`s concatenados
+        values, minutes = split_peak(index.window_peak(positions,lo,hi,cdate))
+        best = values.max(axis=0)
+        last = len(scoped_stops) - 1 - np.argmax((values == best)[::-1],axis=0) # pylint: disable=C0301
+        minute = minutes[last,np.arange(len(t_us))]
+        offset = (start - cdate) // datetime.timedelta(microseconds=1)
+        qt = ((minute * MINUTE_US - offset) // 1_000_000 % 86400) // 60
 
-        # q(t)
-        g = df.groupby(typing.cast(pd.DatetimeIndex,df.index).floor("d")) # type: ignore pylint: disable=C0301
-        df = typing.cast(pd.DataFrame,g.get_group(cdate))
-        qt = df[df["passengers"] == df["passengers"].max()].iloc[-1].name - start # pylint: disable=C0301
+        if stats is not None:
+            tick = _lap(stats,"peak",tick)
 
         # d(t)
-        dt = ((c * (1 / pt)) if pt != 0 else d)
+        with np.errstate(divide="ignore"):
+            dt = np.where(pt != 0,c * (1 / pt),d)
 
+        pt = pt.reshape(shape)
+        qt = qt.reshape(shape)
+        dt = dt.reshape(shape)
 
         # fórmula temporal: f(t, x) = 1 * t + 10 * abs(x - p(t)) + d(t) = 180
         # result = (a * ( t.seconds // 60 )) + (b * abs( x - pt )) + dt
@@ -146,11 +253,210 @@ def gererate_formula(
         # f(t,x) = a * q(t) + b * abs(x - p(t)) + d(t)
         # p(t) == sumatoria de pasajeros en una parada (i) e tiempo (j) específico
         # q(t) == el tiempo que espera la parada con más pasajeros
-        result = (a * ( qt.seconds // 60 )) + (b * abs( x - pt )) + dt
+        result = (a * qt) + (b * np.abs(x - pt)) + dt
+        result = np.where((best >= 0).reshape(shape),result,np.nan)
+
+        if stats is not None:
+            _lap(stats,"score",tick)
+
+        return result
+
+    return typing.cast(BatchScorefn,formula)
+
+
+def gererate_pyramid_formulas(
+        pyramid: DemandPyramid,
+        start_points: list[str|int],
+        stops: list[Stop],
+        scores: Scores,
+        curr_date: datetime.datetime,
+        positions: dict[str|int,int]|None = None,
+        stats: SolverStats|None = None,
+        per_day: bool = False
+    ) -> list[tuple[int,BatchScorefn]]:
+    """Genera una `BatchScorefn` por cada nivel agregado de una pirámide.
+
+    Son las fórmulas que recibe `CoarseToFineSolver` en `levels`; la fórmula
+    del nivel original se genera con `gererate_batch_formula` sobre
+    `pyramid.index()`.
+
+    Args:
+        pyramid: La pirámide del pronóstico.
+        start_points: Ver `gererate_batch_formula`.
+        stops: Ver `gererate_batch_formula`.
+        scores: Ver `gererate_batch_formula`.
+        curr_date: Ver `gererate_batch_formula`.
+        positions: Ver `gererate_batch_formula`.
+        stats: Ver `gererate_batch_formula`.
+        per_day: Ver `gererate_batch_formula`.
+
+    Returns:
+        Una lista de tuplas con la granularidad en minutos y la fórmula de
+        cada nivel, del más grueso al más fino.
+    """
+    return [
+        (
+            pyramid.steps[level],
+            gererate_batch_formula(
+                pyramid.index(level),
+                start_points,
+                stops,
+                scores,
+                curr_date,
+                positions,
+                stats,
+                per_day
+            )
+        )
+        for level in range(len(pyramid.steps) - 1, 0, -1)
+    ]
+
+
+def gererate_formula(
+        forecast: pd.DataFrame|DemandIndex,
+        start_points: list[str|int],
+        stops: list[Stop],
+        scores: Scores,
+        curr_date: datetime.datetime,
+        positions: dict[str|int,int]|None = None,
+        stats: SolverStats|None = None,
+        per_day: bool = False
+    ) -> Scorefn:
+    """Genera una fórmula para ser utilizada con los algoritmos.
+
+    Se necesita tener previamente el dataset con los pronósticos
+    debido a que la función simplemente hace una consulta y una
+    sumatoria con el mismo. El dataset se transforma en un
+    `DemandIndex`, por lo que cada evaluación de la fórmula sólo
+    consulta arreglos precalculados. Si se van a generar varias
+    fórmulas con el mismo pronóstico, se recomienda construir el
+    `DemandIndex` una sola vez y proveerlo en lugar del dataset.
+
+    La fórmula generada envuelve a la de `gererate_batch_formula`,
+    calificando un solo candidato por llamada.
+
+    Args:
+        forecast: pandas.DataFrame, Un dataset con `pandas.DatetimeIndex`,
+            una columna `passengers` y una columna `stop_id`, o un
+            `DemandIndex` construido previamente.
+        start_points: Una lista de ids de paradas (string o int) indicando los
+            puntos en donde se comenzrán a despachar las unidades
+        stops: Una lista ordenada de paradas (`Stop`) indicando
+            todas las paradas en una ruta.
+        scores: Un `Scores` con las penalizaciones asignadas
+        curr_date: La fecha que se tomará como inicio, debe ser de tipo
+            `datetime.datetime` con la hora en 00:00:00
+        positions: La posición de cada parada en `stops`, por id (ver
+            `msopti.runtime.RouteView.positions`).
+        stats: Si se indica, cada llamada acumula en él el tiempo de cada
+            término de la fórmula.
+        per_day: Ver `gererate_batch_formula`.
+
+    Returns:
+        Un `Scorefn` adaptado para utilizarse con los algoritmos de la librería.
+
+    Raise:
+        ValueError: cuando el pandas.DataFrame no contiene las llaves
+            `passengers` y `stop_id`, o no tiene `pandas.DatetimeIndex`
+        KeyError: al evaluar la fórmula, cuando no existe pronóstico en
+            `curr_date` para las ventanas de tiempo consultadas.
+    """
+
+    batch = gererate_batch_formula(
+        forecast,
+        start_points,
+        stops,
+        scores,
+        curr_date,
+        positions,
+        stats,
+        per_day
+    )
+    cdate = pd.Timestamp(curr_date)
+
+    def formula(
+            start: datetime.datetime,
+            t: datetime.timedelta,
+            x: int
+        ) -> float:
+        result = float(batch(start,t / datetime.timedelta(minutes=1),x))
+
+        if math.isnan(result):
+            raise KeyError(cdate)
 
-        # print(f"Params: a={a}, b={b}, c={c}, d={d}, t={t} p(t)={pt}, x={x}")
-        # print(f"Params: t={t} ,a={a}, b={b}, c={c}, d={d}, t={t} p(t)={pt}, q(t)={qt.seconds // 60}, x={x}") # pylint: disable=C0301
-        # print(f"Result: {result}")
         return result
 
     return typing.cast(Scorefn,formula)
+
+
+@dataclasses.dataclass
+class FormulaArgs:
+    """Los argumentos de `gererate_formula`.
+
+    Las fórmulas generadas son _closures_, por lo que no pueden serializarse
+    para enviarse a otros procesos. En su lugar se envían sus argumentos y
+    cada proceso genera su propia fórmula con `build()`. Si `forecast` es un
+    `SharedDemandIndex`, el pronóstico no se copia al enviarse.
+
+    Attributes:
+        forecast: El pronóstico, ver `gererate_formula`.
+        start_points: Los puntos de inicio, ver `gererate_formula`.
+        stops: Las paradas de la ruta, ver `gererate_formula`.
+        scores: Las penalizaciones, ver `gererate_formula`.
+        curr_date: El día de la fórmula, ver `gererate_formula`.
+        positions: La posición de cada parada, ver `gererate_formula`.
+        cache_size: Si se indica, la fórmula se envuelve en una
+            `FormulaCache` con esa cantidad máxima de entradas.
+        per_day: Ver `gererate_formula`.
+    """
+
+    forecast: pd.DataFrame|DemandIndex|SharedDemandIndex
+    start_points: list[str|int]
+    stops: list[Stop]
+    scores: Scores
+    curr_date: datetime.datetime
+    positions: dict[str|int,int]|None = None
+    cache_size: int|None = None
+    per_day: bool = False
+
+    def index(self) -> DemandIndex:
+        """Obtiene el pronóstico como un `DemandIndex`."""
+        if isinstance(self.forecast, SharedDemandIndex):
+            return self.forecast.attach()
+        if isinstance(self.forecast, DemandIndex):
+            return self.forecast
+        return DemandIndex(self.forecast)
+
+    def share(self, shared: SharedDemandIndex) -> "FormulaArgs":
+        """Obtiene una copia de los argumentos con el pronóstico en memoria
+        compartida."""
+        return dataclasses.replace(self, forecast=shared)
+
+    def build(self, stats: SolverStats|None = None) -> Scorefn:
+        """Genera la fórmula.
+
+        Args:
+            stats: Ver `gererate_formula`.
+
+        Returns:
+            El `Scorefn` generado por `gererate_formula`, o una
+            `FormulaCache` que lo envuelve si se indicó `cache_size`.
+        """
+        formula = gererate_formula(
+            self.index(),
+            self.start_points,
+            self.stops,
+            self.scores,
+            self.curr_date,
+            self.positions,
+            stats,
+            self.per_day
+        )
+        if self.cache_size is None:
+            return formula
+
+        return FormulaCache(
+            formula,
+            scoped_stops(self.stops,self.start_points,self.positions),
+            self.cache_size
+        )
@@ -0,0 +1,131 @@
+"""Caché de las evaluaciones de la fórmula.
+
+El recocido simulado recorre repetidamente los mismos estados `(unidad,
+minutos)`, y despachos sucesivos califican los mismos candidatos mientras el
+estado de las paradas no cambie. Este módulo envuelve una `Scorefn` con una
+caché LRU acotada, que se vacía automáticamente cuando cambia el
+`Stop.event_delay` o el `Stop.last_visit` de alguna de las paradas que lee la
+fórmula.
+"""
+
+import collections
+import datetime
+
+from msopti.algorithm.interfaces import Scorefn
+from msopti.params import Stop
+
+
+class FormulaCache:
+    """Una `Scorefn` que guarda los resultados de otra.
+
+    La llave de cada entrada es `(start, t, x)`. Antes de cada evaluación se
+    compara una estampa con el `Stop.event_delay` y el `Stop.last_visit` de
+    `stops` contra la de la evaluación anterior; si es distinta, las entradas
+    se descartan, ya que fueron calculadas con otro estado. Las evaluaciones
+    que lanzan `KeyError` (sin pronóstico) también se guardan.
+
+    Attributes:
+        formula: La fórmula envuelta.
+        stops: Las paradas cuyo estado lee la fórmula, ver
+            `msopti.algorithm.formula.scoped_stops`. Puede ser un
+            superconjunto, por ejemplo todas las paradas de la ruta, a costa
+            de descartar las entradas por cambios que no afectan a la
+            fórmula.
+        maxsize: La cantidad máxima de entradas; se descarta la usada hace
+            más tiempo.
+        hits: Las evaluaciones que se encontraron en la caché.
+        misses: Las evaluaciones que se calcularon con `formula`.
+        invalidations: Las veces que se descartaron las entradas por un
+            cambio en las paradas.
+    """
+
+    formula: Scorefn
+    stops: list[Stop]
+    maxsize: int
+    hits: int
+    misses: int
+    invalidations: int
+    _entries: collections.OrderedDict
+    _stamp: tuple
+
+    def __init__(
+            self,
+            formula: Scorefn,
+            stops: list[Stop],
+            maxsize: int = 4096
+        ) -> None:
+        """Crea una caché.
+
+        Args:
+            formula: La fórmula a envolver.
+            stops: Las paradas cuyo estado lee la fórmula.
+            maxsize: La cantidad máxima de entradas.
+
+        Raises:
+            ValueError: Si `maxsize` es menor a 1.
+        """
+        if maxsize < 1:
+            raise ValueError(f"Tamaño de caché inválido: {maxsize}")
+
+        self.formula = formula
+        self.stops = stops
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()
+        self._stamp = self.stamp()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stamp(self) -> tuple:
+        """Obtiene la estampa del estado actual de las paradas."""
+        return tuple((i.event_delay, i.last_visit) for i in self.stops)
+
+    def clear(self):
+        """Descarta todas las entradas, sin reiniciar los contadores."""
+        self._entries.clear()
+
+    def info(self) -> dict[str,int]:
+        """Obtiene los contadores y el tamaño de la caché."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __call__(
+            self,
+            start: datetime.datetime,
+            t: datetime.timedelta,
+            x: int
+        ) -> float:
+        stamp = self.stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+        key = (start, t, x)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            try:
+                entry = self.formula(start, t, x)
+            except KeyError as e:
+                entry = e
+
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        if isinstance(entry, KeyError):
+            raise KeyError(*entry.args)
+        return entry
@@ -0,0 +1,322 @@
+"""Resuelve el problema planteado evaluando todos los candidatos."""
+import datetime
+import math
+import numpy as np
+
+from msopti.algorithm.interfaces import BatchScorefn, ISolver, Scorefn, Solution, SolverParams # pylint: disable=C0301
+from msopti.algorithm.planification import build_planification
+from msopti.algorithm.stats import SolverStats, StatsHook, begin, finish, phase
+from msopti.params import Vehicle, Stop
+
+
+def candidate_delays(
+        time_max: datetime.timedelta,
+        interval: datetime.timedelta
+    ) -> np.ndarray:
+    """Obtiene los tiempos de espera candidatos para un despacho.
+
+    Son los mismos tiempos que recorre `AnnealSolver`: desde 0 minutos,
+    aumentando de intervalo en intervalo, hasta alcanzar o superar
+    `time_max`.
+
+    Args:
+        time_max: Tiempo máximo que se puede aceptar antes de despachar.
+        interval: Tiempo mínimo que se espera de despacho en despacho.
+
+    Returns:
+        Un arreglo con los tiempos de espera en minutos.
+    """
+    steps = math.ceil(time_max / interval)
+    return np.arange(steps + 1, dtype=np.int64) * (interval.seconds // 60)
+
+
+class GridSolver(ISolver):
+    """Solucionador que evalúa todas las combinaciones de unidad y tiempo de
+    espera para obtener la solución óptima.
+
+    El espacio de estados que recorre `AnnealSolver` es pequeño: la cantidad
+    de unidades multiplicada por la cantidad de intervalos hasta
+    `time_max`. En lugar de muestrearlo, este solucionador califica la
+    grilla completa y retorna el mínimo exacto, por lo que su resultado es
+    determinista.
+
+    Si se provee una `BatchScorefn` (ver `gererate_batch_formula`), la
+    grilla se califica en una sola llamada; de lo contrario se llama a la
+    `Scorefn` por cada candidato.
+
+    En caso de empate se prefiere el menor tiempo de espera y, después, la
+    primera unidad en el orden en que fueron dadas.
+
+    Si se provee un `SolverStats` o un `StatsHook`, se miden las fases
+    `scores` y `planification` y se cuentan los candidatos calificados.
+    """
+    _params: SolverParams
+    _batch: BatchScorefn|None
+    _stats: SolverStats|None
+    _hook: StatsHook|None
+
+    def _scores(self) -> tuple[np.ndarray,np.ndarray]:
+        """Califica la grilla de candidatos.
+
+        Returns:
+            Una tupla con los tiempos de espera en minutos y un arreglo de
+            forma `(tiempos, unidades)` con la puntuación de cada candidato.
+            Los candidatos que no se pudieron calificar valen `numpy.nan`.
+        """
+        params = self._params
+        delays = candidate_delays(params.time_max, params.interval)
+        return delays, self._grid(delays)
+
+    def _grid(self, delays: np.ndarray) -> np.ndarray:
+        """Califica varios tiempos de espera para todas las unidades.
+
+        Args:
+            delays: Los tiempos de espera en minutos.
+
+        Returns:
+            Un arreglo de forma `(tiempos, unidades)` con la puntuación de
+            cada candidato, `numpy.nan` si no se pudo calificar.
+        """
+        params = self._params
+        caps = np.array([ i.max for i in params.units ], dtype=np.int64)
+
+        if self._batch is not None:
+            return self._batch(params.start_time,delays[:, None],caps[None, :]) # pylint: disable=C0301
+
+        scores = np.full((len(delays), len(caps)), np.nan)
+        for i, delay in enumerate(delays):
+            t = datetime.timedelta(minutes=int(delay))
+            for j, cap in enumerate(caps):
+                try:
+                    scores[i, j] = params.formula(params.start_time,t,int(cap))
+                except KeyError:
+                    pass
+
+        return scores
+
+    def _solution(self, unit: Vehicle, delay: int) -> Solution:
+        """Construye la `Solution` de una unidad y un tiempo de espera."""
+        planification = build_planification(
+            self._params.stops,
+            self._params.start_point,
+            self._params.start_time,
+            delay,
+            self._params.positions,
+            self._params.offsets
+        )
+
+        return Solution(unit,planification,delay)
+
+    def solve(self) -> Solution:
+        """Resuelve el problema planteado.
+
+        Returns:
+            La resolución del problema.
+
+        Raises:
+            ValueError: Si ningún candidato pudo ser calificado, por ejemplo
+                porque no existe pronóstico para la fecha.
+        """
+        stats = self._stats
+        with phase(stats, "scores"):
+            delays, scores = self._scores()
+        if stats is not None:
+            stats.evaluations += scores.size
+
+        if np.isnan(scores).all():
+            raise ValueError("Ningún candidato pudo ser calificado")
+
+        ti, ui = np.unravel_index(np.nanargmin(scores), scores.shape)
+        with phase(stats, "planification"):
+            solution = self._solution(self._params.units[ui], int(delays[ti]))
+
+        if stats is not None:
+            stats.energy = float(scores[ti, ui])
+        finish([solution], stats, self._hook)
+        return solution
+
+    def solve_multi(self) -> list[Solution]:
+        """Resuelve el problema planteado para cada unidad.
+
+        Returns:
+            Una lista con la mejor solución de cada unidad que pudo ser
+            calificada, ordenada de la mejor a la peor.
+        """
+        stats = self._stats
+        with phase(stats, "scores"):
+            delays, scores = self._scores()
+        if stats is not None:
+            stats.evaluations += scores.size
+
+        ranked = []
+        for ui, unit in enumerate(self._params.units):
+            column = scores[:, ui]
+            if np.isnan(column).all():
+                continue
+            ti = int(np.nanargmin(column))
+            ranked.append((column[ti], ui, unit, int(delays[ti])))
+
+        ranked.sort(key=lambda i: (i[0], i[1]))
+        with phase(stats, "planification"):
+            solutions = [ self._solution(unit,delay) for _, _, unit, delay in ranked ] # pylint: disable=C0301
+
+        if stats is not None and ranked:
+            stats.energy = float(ranked[0][0])
+        finish(solutions, stats, self._hook)
+        return solutions
+
+    def __init__(
+        self,
+        formula: Scorefn,
+        time_score: float,
+        cap_score: float,
+        low_demand_score: float,
+        zero_demand_score: float,
+        start_time: datetime.datetime,
+        time_max: datetime.timedelta,
+        interval: datetime.timedelta,
+        units: list[Vehicle],
+        stops: list[Stop],
+        start_point: str|int,
+        batch_formula: BatchScorefn|None = None,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None,
+        stats: SolverStats|None = None,
+        hook: StatsHook|None = None,
+        ) -> None:
+        self._params = SolverParams(
+            formula,
+            time_score,
+            cap_score,
+            low_demand_score,
+            zero_demand_score,
+            start_time,
+            time_max,
+            interval,
+            units,
+            stops,
+            start_point,
+            positions,
+            offsets
+        )
+        self._batch = batch_formula
+        self._stats = begin(stats, hook)
+        self._hook = hook
+
+
+class CoarseToFineSolver(GridSolver):
+    """Solucionador que busca el mejor candidato de `GridSolver` refinando
+    la grilla desde los niveles gruesos de una `DemandPyramid`.
+
+    En cada nivel se califican sólo los tiempos de espera múltiplos de su
+    granularidad, que estén dentro de las ventanas conservadas por el nivel
+    anterior, con la fórmula de ese nivel (ver `gererate_pyramid_formulas`).
+    Se conservan las `keep` ventanas con la mejor puntuación, de una
+    granularidad de ancho a cada lado, y al final se califican con la
+    fórmula original los candidatos dentro de ellas. Así, la cantidad de
+    candidatos calificados con la resolución original no crece con
+    `time_max`.
+
+    La búsqueda es una aproximación: la demanda agregada puede descartar una
+    ventana que contiene el óptimo de la grilla completa. Las ventanas se
+    eligen por la mejor puntuación entre todas las unidades, por lo que
+    `solve_multi` sólo considera, para cada unidad, los candidatos de esas
+    ventanas. Un nivel en el que ningún candidato pudo ser calificado no
+    descarta ninguna ventana.
+
+    Los candidatos de los niveles gruesos se suman a las evaluaciones del
+    `SolverStats`.
+    """
+    _levels: list[tuple[int,BatchScorefn]]
+    _keep: int
+
+    def _scores(self) -> tuple[np.ndarray,np.ndarray]:
+        """Califica los candidatos de las ventanas conservadas.
+
+        Returns:
+            Una tupla con los tiempos de espera en minutos que sobrevivieron
+            a los niveles gruesos y un arreglo de forma `(tiempos, unidades)`
+            con su puntuación.
+        """
+        params = self._params
+        delays = candidate_delays(params.time_max, params.interval)
+        caps = np.array([ i.max for i in params.units ], dtype=np.int64)
+        window = np.ones(len(delays), dtype=bool)
+
+        for step, batch in self._levels:
+            level = delays[window & (delays % step == 0)]
+            if len(level) == 0:
+                continue
+
+            scores = batch(params.start_time,level[:, None],caps[None, :])
+            if self._stats is not None:
+                self._stats.evaluations += scores.size
+
+            best = np.min(np.where(np.isnan(scores), np.inf, scores), axis=1)
+            order = np.argsort(best, kind="stable")[:self._keep]
+            top = level[order[np.isfinite(best[order])]]
+            if len(top) == 0:
+                continue
+
+            window &= (np.abs(delays[:, None] - top[None, :]) < step).any(axis=1) # pylint: disable=C0301
+
+        delays = delays[window]
+        return delays, self._grid(delays)
+
+    def __init__(
+        self,
+        formula: Scorefn,
+        time_score: float,
+        cap_score: float,
+        low_demand_score: float,
+        zero_demand_score: float,
+        start_time: datetime.datetime,
+        time_max: datetime.timedelta,
+        interval: datetime.timedelta,
+        units: list[Vehicle],
+        stops: list[Stop],
+        start_point: str|int,
+        batch_formula: BatchScorefn|None = None,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None,
+        stats: SolverStats|None = None,
+        hook: StatsHook|None = None,
+        levels: list[tuple[int,BatchScorefn]]|None = None,
+        keep: int = 2,
+        ) -> None:
+        """
+        Args:
+            levels: La granularidad en minutos y la fórmula de cada nivel
+                grueso, del más grueso al más fino (ver
+                `gererate_pyramid_formulas`). Si no se indica, se califica la
+                grilla completa igual que `GridSolver`.
+            keep: La cantidad de ventanas que se conservan en cada nivel.
+
+        Los demás argumentos son los de `GridSolver`.
+
+        Raises:
+            ValueError: Si `keep` es menor a 1.
+        """
+        if keep < 1:
+            raise ValueError("Se debe conservar al menos una ventana")
+
+        super().__init__(
+            formula,
+            time_score,
+            cap_score,
+            low_demand_score,
+            zero_demand_score,
+            start_time,
+            time_max,
+            interval,
+            units,
+            stops,
+            start_point,
+            batch_formula,
+            positions,
+            offsets,
+            stats,
+            hook
+        )
+        self._levels = levels or []
+        self._keep = keep
@@ -4,9 +4,12 @@ utilizados por los algoritmos"""
 import abc
 from dataclasses import dataclass
 import datetime
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 
 from typing import TypeAlias, Callable
+from msopti.algorithm.stats import SolverStats
 from msopti.params import Stop, Vehicle
 
 Scorefn: TypeAlias = Callable[[datetime.datetime,datetime.timedelta,int],float] # pylint: disable=C0301
@@ -25,6 +28,21 @@ Returns:
     Un valor float, el cual es la puntuación de los parámetros.
 """
 
+BatchScorefn: TypeAlias = Callable[[datetime.datetime,npt.ArrayLike,npt.ArrayLike],np.ndarray] # pylint: disable=C0301
+"""Función de calificación por lotes.
+
+Califica varios candidatos en una sola llamada, los tiempos de espera y las
+capacidades se combinan siguiendo las reglas de _broadcasting_ de NumPy.
+
+Args:
+    start_time: datetime.datetime, punto de inicio para realizar el cálculo.
+    time: npt.ArrayLike, tiempos de espera en minutos.
+    cap: npt.ArrayLike, capacidades de los vehículos.
+
+Returns:
+    Un `numpy.ndarray` con la puntuación de cada candidato.
+"""
+
 @dataclass
 class SolverParams():
     """Conjunto de parámetros necesarios para los algoritmos.
@@ -49,6 +67,10 @@ class SolverParams():
         units: Lista de unidades que están asignados a una ruta en específico.
         stops: Lista de paradas asignadas a una ruta.
         start_point: id de la parada (string o int) en donde incia el recorrido.
+        positions: La posición de cada parada en `stops`, por id (ver
+            `msopti.runtime.RouteView.positions`), o `None` si no se conoce.
+        offsets: Los minutos acumulados de recorrido de `stops` (ver
+            `msopti.runtime.RouteView.offsets`), o `None` si no se conocen.
     """
 
     formula: Scorefn
@@ -62,6 +84,8 @@ class SolverParams():
     units: list[Vehicle]
     stops: list[Stop]
     start_point: str|int
+    positions: dict[str|int,int]|None = None
+    offsets: np.ndarray|None = None
 
 
 @dataclass
@@ -94,11 +118,17 @@ class Solution:
             la unidad.
         delay: El tiempo que se esperó antes de realizar el despacho. Es la
             solución del algoritmo.
+        stats: Las estadísticas de la resolución, si la instrumentación del
+            solucionador está activa (ver `msopti.algorithm.stats`).
+        stop: El criterio que terminó la búsqueda, si el solucionador lo
+            reporta (ver `msopti.algorithm.annealing.EarlyStop`).
     """
 
     unit: Vehicle
     planification: list[StopTime]
     delay: int
+    stats: SolverStats|None = None
+    stop: str|None = None
 
     def to_dataframe(self) -> pd.DataFrame:
         """Retorna la representación de la planficiación en `pandas.DataFrame`.
@@ -128,6 +158,10 @@ class Solution:
 class ISolver(metaclass=abc.ABCMeta):
     """Interfaz de los solucionadores.
     Define el método `solve()` y `solve_multi()`
+
+    Los solucionadores pueden recibir un `SolverStats` y un `StatsHook` (ver
+    `msopti.algorithm.stats`) para medir cada resolución; las estadísticas
+    acumuladas se obtienen con `ISolver.stats()`.
     """
 
     @classmethod
@@ -160,4 +194,11 @@ class ISolver(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def stats(self) -> SolverStats|None:
+        """Obtiene las estadísticas acumuladas por el solucionador.
 
+        Returns:
+            Un `SolverStats`, o `None` si la instrumentación está
+            desactivada.
+        """
+        return getattr(self, "_stats", None)
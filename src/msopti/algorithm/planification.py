@@ -0,0 +1,147 @@
+"""Utilidades para construir la planificación de un despacho.
+
+Los tiempos de recorrido se manejan como minutos enteros (`numpy.int32`):
+los desplazamientos acumulados de una ruta se calculan una vez y la llegada a
+cada parada, para cualquier hora de salida, es una suma vectorizada. Los
+objetos `datetime.time` sólo se construyen al generar los `StopTime`.
+"""
+
+import datetime
+import numpy as np
+
+from msopti.algorithm.demand import MINUTES_PER_DAY
+from msopti.algorithm.interfaces import StopTime
+from msopti.params import Stop
+
+_MINUTE = datetime.timedelta(minutes=1)
+
+
+def travel_minutes(stops: list[Stop]) -> np.ndarray:
+    """Obtiene los minutos de recorrido hacia cada parada.
+
+    Es el tiempo de recorrido desde la parada anterior más el retraso por
+    eventos, los segundos se descartan.
+
+    Args:
+        stops: Lista ordenada de paradas.
+
+    Returns:
+        Un arreglo de `numpy.int32` con los minutos de cada parada.
+    """
+    return np.array(
+        [ i.time // _MINUTE + i.event_delay // _MINUTE for i in stops ],
+        dtype=np.int32
+    )
+
+
+def cumulative_offsets(stops: list[Stop]) -> np.ndarray:
+    """Obtiene los minutos acumulados de recorrido hasta cada parada.
+
+    Args:
+        stops: Lista ordenada de paradas.
+
+    Returns:
+        Un arreglo de `numpy.int32`, en donde el elemento `i` son los minutos
+        desde la salida hasta la llegada a la parada `i`, incluyendo el
+        tiempo de recorrido de la primera parada.
+    """
+    return np.cumsum(travel_minutes(stops), dtype=np.int32)
+
+
+def arrival_minutes(
+        offsets: np.ndarray,
+        start: int,
+        delay: int
+    ) -> np.ndarray:
+    """Obtiene la hora de llegada a cada parada en minutos desde las
+    00:00:00.
+
+    Args:
+        offsets: Los minutos acumulados de recorrido, ver
+            `cumulative_offsets`.
+        start: La hora de inicio en minutos desde las 00:00:00.
+        delay: Los minutos que se esperan antes de despachar.
+
+    Returns:
+        Un arreglo de `numpy.int32` con la hora de llegada a cada parada, en
+        el rango `[0, 1440)`.
+    """
+    return (np.int32(start + delay) + offsets) % MINUTES_PER_DAY
+
+
+def planification_minutes(
+        stops: list[Stop],
+        start_point: str|int,
+        start_time: datetime.datetime,
+        delay: int,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None
+    ) -> tuple[int,np.ndarray]:
+    """Obtiene la hora de llegada a cada parada de una unidad despachada,
+    sin construir los `StopTime`.
+
+    Los argumentos son los de `build_planification`.
+
+    Returns:
+        Una tupla con la posición del punto de inicio en `stops` y un
+        arreglo con la hora de llegada, en minutos desde las 00:00:00, a
+        cada parada desde esa posición hasta el final de la ruta.
+    """
+    if positions is None:
+        stopi = [i.id for i in stops].index(start_point)
+    else:
+        stopi = positions[start_point]
+
+    if offsets is None:
+        offsets = cumulative_offsets(stops[stopi:])
+    elif stopi > 0:
+        offsets = offsets[stopi:] - offsets[stopi - 1]
+
+    start = start_time.hour * 60 + start_time.minute
+    return stopi, arrival_minutes(offsets, start, int(delay))
+
+
+def build_planification(
+        stops: list[Stop],
+        start_point: str|int,
+        start_time: datetime.datetime,
+        delay: int,
+        positions: dict[str|int,int]|None = None,
+        offsets: np.ndarray|None = None
+    ) -> list[StopTime]:
+    """Construye la planificación de una unidad despachada.
+
+    Recorre las paradas desde el punto de inicio hasta el final de la ruta,
+    acumulando el tiempo de recorrido y el retraso por eventos de cada
+    parada.
+
+    Args:
+        stops: Lista ordenada de paradas de la ruta.
+        start_point: id de la parada (string o int) en donde incia el
+            recorrido.
+        start_time: El tiempo a partir del cual se espera para despachar.
+        delay: Los minutos que se esperan antes de despachar.
+        positions: La posición de cada parada en `stops`, por id (ver
+            `msopti.runtime.RouteView.positions`). Si no se indica, se
+            busca el punto de inicio en la lista.
+        offsets: Los minutos acumulados de recorrido de `stops` (ver
+            `msopti.runtime.RouteView.offsets`). Si no se indica, se
+            calculan desde el punto de inicio.
+
+    Returns:
+        Una lista de `StopTime` con la hora en la que se visitará cada
+        parada.
+    """
+    stopi, minutes = planification_minutes(
+        stops,
+        start_point,
+        start_time,
+        delay,
+        positions,
+        offsets
+    )
+
+    return [
+        StopTime(i, datetime.time(hour=m // 60, minute=m % 60))
+        for i, m in zip(stops[stopi:], minutes.tolist())
+    ]
@@ -0,0 +1,159 @@
+"""Caché de los parámetros de enfriamiento del recocido simulado.
+
+`simanneal.Annealer.auto()` explora el problema durante un tiempo fijo para
+calcular la temperatura máxima, la mínima y la cantidad de pasos. Para
+problemas de la misma ruta, horario y tamaño, el resultado es prácticamente
+el mismo, por lo que este módulo permite guardarlo y reutilizarlo.
+"""
+
+import datetime
+import json
+import os
+from typing import TypeAlias
+
+ScheduleKey: TypeAlias = tuple[str|int|None,int,int,int,tuple[float,...]]
+"""Llave de la caché.
+
+Es una tupla con el id de la ruta, la hora del día en la que inicia el
+despacho, la cantidad de unidades, la cantidad de intervalos hasta el tiempo
+máximo y las penalizaciones usadas por la fórmula.
+"""
+
+
+def schedule_key(
+        route: str|int|None,
+        start_time: datetime.datetime,
+        units: int,
+        slots: int,
+        penalties: tuple[float,...]
+    ) -> ScheduleKey:
+    """Genera la llave de la caché para un problema.
+
+    Args:
+        route: El id de la ruta (string o int), o `None` si no se conoce.
+        start_time: El tiempo a partir del cual se espera para despachar,
+            sólo se toma en cuenta su hora.
+        units: La cantidad de unidades candidatas.
+        slots: La cantidad de intervalos hasta el tiempo máximo.
+        penalties: Las penalizaciones de la fórmula, en el orden de
+            `Scores`.
+
+    Returns:
+        Una `ScheduleKey`.
+    """
+    return (route, start_time.hour, units, slots, tuple(penalties))
+
+
+class ScheduleCache:
+    """Caché de los parámetros de enfriamiento (`tmax`, `tmin`, `steps` y
+    `updates`) calculados por `simanneal.Annealer.auto()`.
+
+    La caché vive en memoria y se puede persistir en un archivo JSON. Como
+    las penalizaciones forman parte de la llave, un cambio en `Scores` hace
+    que no se encuentren los parámetros calculados previamente; además,
+    `ScheduleCache.invalidate()` elimina las entradas de otras
+    penalizaciones.
+
+    Attributes:
+        file: La ubicación del archivo JSON en donde se persiste la caché, o
+            `None` si sólo vive en memoria.
+    """
+
+    file: str|None
+    _entries: dict[ScheduleKey,dict]
+
+    def __init__(self, file: str|None = None) -> None:
+        """Crea una caché, cargando el archivo si es que existe.
+
+        Args:
+            file: La ubicación del archivo JSON en donde se persiste la
+                caché.
+
+        Raises:
+            ValueError: Si el archivo tiene un formato incorrecto.
+            IOError: Si existió un error al leer el archivo.
+        """
+        self.file = file
+        self._entries = {}
+
+        if file is not None and os.path.exists(file):
+            with open(file, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    key = (
+                        entry["route"],
+                        entry["hour"],
+                        entry["units"],
+                        entry["slots"],
+                        tuple(entry["penalties"]),
+                    )
+                    self._entries[key] = entry["schedule"]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: ScheduleKey) -> dict|None:
+        """Obtiene los parámetros de enfriamiento de un problema.
+
+        Args:
+            key: La llave del problema, ver `schedule_key`.
+
+        Returns:
+            Un diccionario aceptado por `simanneal.Annealer.set_schedule()`,
+            o `None` si no existe en la caché.
+        """
+        return self._entries.get(key)
+
+    def put(self, key: ScheduleKey, schedule: dict):
+        """Guarda los parámetros de enfriamiento de un problema.
+
+        Args:
+            key: La llave del problema, ver `schedule_key`.
+            schedule: El diccionario retornado por
+                `simanneal.Annealer.auto()`.
+        """
+        self._entries[key] = dict(schedule)
+
+    def invalidate(self, penalties: tuple[float,...]|None = None):
+        """Elimina entradas de la caché.
+
+        Args:
+            penalties: Si se indica, se eliminan sólo las entradas calculadas
+                con penalizaciones distintas; de lo contrario se eliminan
+                todas.
+        """
+        if penalties is None:
+            self._entries.clear()
+            return
+
+        penalties = tuple(penalties)
+        self._entries = {
+            k: v for k, v in self._entries.items() if k[4] == penalties
+        }
+
+    def save(self, file: str|None = None):
+        """Persiste la caché en un archivo JSON.
+
+        Args:
+            file: La ubicación del archivo, por defecto `ScheduleCache.file`.
+
+        Raises:
+            ValueError: Si no se indicó un archivo.
+            IOError: Si existió un error al escribir el archivo.
+        """
+        file = file or self.file
+        if file is None:
+            raise ValueError("No se indicó un archivo para la caché")
+
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump([
+                {
+                    "route": route,
+                    "hour": hour,
+                    "units": units,
+                    "slots": slots,
+                    "penalties": list(penalties),
+                    "schedule": schedule,
+                }
+                for (route, hour, units, slots, penalties), schedule
+                in self._entries.items()
+            ], f)
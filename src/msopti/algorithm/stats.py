@@ -0,0 +1,156 @@
+"""Instrumentación de los solucionadores y de la fórmula.
+
+La instrumentación está desactivada por defecto. Para activarla, se crea un
+`SolverStats` y se provee a los solucionadores (y opcionalmente a
+`gererate_formula`/`gererate_batch_formula`), o se provee un `StatsHook`. Sin
+ellos, los solucionadores y la fórmula no miden nada, por lo que el costo de
+la instrumentación desactivada es una comparación con `None`.
+"""
+
+import contextlib
+import copy
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, TypeAlias
+
+
+@dataclass
+class SolverStats:
+    """Estadísticas de la resolución de un problema.
+
+    Los tiempos se acumulan en segundos. Las fases de los solucionadores
+    son, por ejemplo, `calibration` (el cálculo de los parámetros de
+    enfriamiento), `anneal`, `scores` y `planification`. Los términos de la
+    fórmula son `arrivals` (la llegada a cada parada), `passengers` (p(t)),
+    `peak` (q(t)) y `score` (la combinación de los términos).
+
+    Attributes:
+        evaluations: La cantidad de candidatos calificados.
+        formula_calls: La cantidad de llamadas a la fórmula.
+        phases: El tiempo de cada fase del solucionador.
+        formula: El tiempo de cada término de la fórmula.
+        counters: Contadores adicionales, por ejemplo los aciertos y fallos
+            de la caché de los parámetros de enfriamiento
+            (`schedule_cache_hit`, `schedule_cache_miss`).
+        energy: La puntuación de la solución, si se conoce.
+    """
+
+    evaluations: int = 0
+    formula_calls: int = 0
+    phases: dict[str,float] = field(default_factory=dict)
+    formula: dict[str,float] = field(default_factory=dict)
+    counters: dict[str,int] = field(default_factory=dict)
+    energy: float|None = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Mide el tiempo de una fase del solucionador.
+
+        Args:
+            name: El nombre de la fase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start # pylint: disable=C0301
+
+    def add_formula(self, name: str, seconds: float):
+        """Acumula el tiempo de un término de la fórmula."""
+        self.formula[name] = self.formula.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1):
+        """Incrementa un contador adicional."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        """Reinicia todas las estadísticas."""
+        self.evaluations = 0
+        self.formula_calls = 0
+        self.phases.clear()
+        self.formula.clear()
+        self.counters.clear()
+        self.energy = None
+
+    def snapshot(self) -> "SolverStats":
+        """Obtiene una copia de las estadísticas actuales."""
+        return copy.deepcopy(self)
+
+    def to_dict(self) -> dict:
+        """Obtiene la representación de las estadísticas en un diccionario,
+        por ejemplo para exportarlas a un sistema de métricas."""
+        return {
+            "evaluations": self.evaluations,
+            "formula_calls": self.formula_calls,
+            "phases": dict(self.phases),
+            "formula": dict(self.formula),
+            "counters": dict(self.counters),
+            "energy": self.energy,
+        }
+
+
+StatsHook: TypeAlias = Callable[[SolverStats],None]
+"""Función que recibe las estadísticas al terminar cada resolución.
+
+Args:
+    stats: SolverStats, las estadísticas de la resolución.
+"""
+
+
+def begin(
+        stats: SolverStats|None,
+        hook: StatsHook|None
+    ) -> SolverStats|None:
+    """Obtiene las estadísticas que usará un solucionador.
+
+    Args:
+        stats: Las estadísticas provistas al solucionador.
+        hook: La función provista al solucionador.
+
+    Returns:
+        `stats` si se proveyó; unas estadísticas nuevas si sólo se proveyó
+        `hook`; o `None` si la instrumentación está desactivada.
+    """
+    if stats is None and hook is not None:
+        return SolverStats()
+    return stats
+
+
+def finish(
+        solutions: list,
+        stats: SolverStats|None,
+        hook: StatsHook|None
+    ):
+    """Adjunta las estadísticas a las soluciones y llama a `hook`.
+
+    Las soluciones reciben una copia de las estadísticas, ya que el mismo
+    `SolverStats` puede seguir acumulando en otras resoluciones.
+
+    Args:
+        solutions: Las `Solution` obtenidas.
+        stats: Las estadísticas, o `None` si la instrumentación está
+            desactivada.
+        hook: La función que recibe las estadísticas, opcional.
+    """
+    if stats is None:
+        return
+
+    snapshot = stats.snapshot()
+    for solution in solutions:
+        solution.stats = snapshot
+    if hook is not None:
+        hook(snapshot)
+
+
+def phase(stats: SolverStats|None, name: str) -> contextlib.AbstractContextManager: # pylint: disable=C0301
+    """Mide el tiempo de una fase si la instrumentación está activa.
+
+    Args:
+        stats: Las estadísticas, o `None` si la instrumentación está
+            desactivada.
+        name: El nombre de la fase.
+
+    Returns:
+        Un _context manager_.
+    """
+    return contextlib.nullcontext() if stats is None else stats.phase(name)
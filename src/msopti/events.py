@@ -0,0 +1,416 @@
+"""Ingesta de eventos de las unidades.
+
+Las unidades reportan, por cada parada que visitan, la hora de la visita y
+el retraso que registran hasta esa parada. Este módulo lee esos eventos de
+un archivo o de una tubería, en JSONL o CSV, y los aplica al estado de las
+paradas (`Stop.last_visit` y `Stop.event_delay`) por lotes.
+
+Cada evento tiene los campos:
+
+- `unit`: El número de la unidad.
+- `stop_id`: El id de la parada.
+- `time`: La hora de la visita, en ISO 8601.
+- `delay`: Opcional, los minutos de retraso por eventos de la parada.
+
+Por ejemplo, en JSONL:
+
+    {"unit": 8, "stop_id": 3, "time": "2024-03-23T07:05:00", "delay": 2}
+
+o en CSV, con encabezado:
+
+    unit,stop_id,time,delay
+    8,3,2024-03-23T07:05:00,2
+
+Los eventos de un lote se combinan por parada antes de aplicarse: se
+conserva la visita más reciente y el retraso del evento más reciente que lo
+indique, y los tiempos de recorrido de cada ruta afectada se recalculan una
+sola vez por lote (ver `RuntimeParams.set_event_delays`).
+"""
+
+import contextlib
+import csv
+import dataclasses
+import datetime
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import ContextManager, TextIO
+
+from msopti.runtime import RuntimeParams
+
+FORMATS = ("jsonl", "csv")
+"""Los formatos de eventos soportados."""
+
+
+@dataclasses.dataclass
+class VehicleEvent:
+    """La visita de una unidad a una parada.
+
+    Attributes:
+        unit: El número de la unidad.
+        stop_id: El id de la parada (string o int).
+        time: La hora de la visita.
+        delay: El retraso por eventos de la parada, `None` si el evento no
+            lo indica.
+    """
+
+    unit: int
+    stop_id: str|int
+    time: datetime.datetime
+    delay: datetime.timedelta|None = None
+
+
+@dataclasses.dataclass
+class IngestStats:
+    """Contadores de la ingesta de eventos.
+
+    Cada evento leído se cuenta en uno solo de `received`, `malformed` o
+    `rejected`.
+
+    Attributes:
+        received: Los eventos aceptados, con formato correcto y de paradas
+            que existen.
+        malformed: Los eventos con formato incorrecto.
+        rejected: Los eventos de paradas que no existen.
+        coalesced: Los eventos aceptados que se combinaron con otro de la
+            misma parada en el mismo lote.
+        applied: Las paradas actualizadas, una por parada y lote.
+        batches: Los lotes aplicados.
+        waits: Las veces que el lector esperó porque el _buffer_ estaba
+            lleno.
+        elapsed: Los segundos transcurridos en la ingesta.
+        apply_time: Los segundos dedicados a aplicar los lotes.
+    """
+
+    received: int = 0
+    malformed: int = 0
+    rejected: int = 0
+    coalesced: int = 0
+    applied: int = 0
+    batches: int = 0
+    waits: int = 0
+    elapsed: float = 0.0
+    apply_time: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Los eventos aceptados por segundo."""
+        return self.received / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        """Obtiene los contadores como un diccionario serializable a
+        JSON."""
+        return dataclasses.asdict(self) | { "rate": self.rate }
+
+
+def _event(row: dict) -> VehicleEvent:
+    """Convierte una fila de JSONL o CSV en un evento.
+
+    Raises:
+        KeyError: Si falta algún campo obligatorio.
+        TypeError: Si algún campo tiene un tipo incorrecto.
+        ValueError: Si algún campo tiene un valor incorrecto.
+    """
+    delay = row.get("delay")
+    return VehicleEvent(
+        int(row["unit"]),
+        row["stop_id"],
+        datetime.datetime.fromisoformat(row["time"]),
+        None if delay in (None, "") else datetime.timedelta(minutes=float(delay)) # pylint: disable=C0301
+    )
+
+
+def _rows(stream: TextIO, fmt: str) -> Iterator[dict]:
+    """Lee las filas de un flujo de eventos, una a la vez."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_events(
+        source: str|TextIO,
+        fmt: str|None = None,
+        stats: IngestStats|None = None
+    ) -> Iterator[VehicleEvent]:
+    """Lee un flujo de eventos.
+
+    El flujo se lee línea por línea, por lo que puede ser una tubería que
+    nunca termina.
+
+    Args:
+        source: La ubicación de un archivo, `-` para la entrada estándar, o
+            un archivo de texto abierto.
+        fmt: `jsonl` o `csv`. Si no se indica, se deduce de la extensión
+            del archivo (`.csv`), por defecto `jsonl`.
+        stats: Si se indica, los eventos con formato incorrecto se omiten y
+            se cuentan en `IngestStats.malformed`; de lo contrario, se lanza
+            una excepción. Los eventos leídos no se cuentan, ya que se
+            aceptan al aplicarse (ver `EventIngestor.apply`).
+
+    Yields:
+        Los eventos, en el orden del flujo.
+
+    Raises:
+        ValueError: Si el formato no es válido, o si un evento tiene un
+            formato incorrecto y no se indicó `stats`.
+        IOError: Si existió un error al leer el archivo.
+    """
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    if fmt is None:
+        fmt = "csv" if str(name).lower().endswith(".csv") else "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de eventos inválido: {fmt}")
+
+    if source == "-":
+        stream, close = sys.stdin, False
+    elif isinstance(source, str):
+        stream, close = open(source, "r", encoding="utf-8", newline=""), True # pylint: disable=R1732
+    else:
+        stream, close = source, False
+
+    try:
+        for row in _rows(stream, fmt):
+            try:
+                event = _event(row)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                if stats is None:
+                    raise ValueError(f"Evento incorrecto: {row}") from e
+                stats.malformed += 1
+                continue
+
+            yield event
+    finally:
+        if close:
+            stream.close()
+
+
+_END = object()
+
+
+class EventIngestor:
+    """Aplica eventos de las unidades al estado de las paradas por lotes.
+
+    `run()` lee el flujo en un hilo y deja los eventos en un _buffer_
+    acotado a `capacity` eventos; cuando éste se llena, el lector espera
+    (_backpressure_), por lo que la memoria no crece si los eventos llegan
+    más rápido de lo que se aplican. El hilo que llama a `run()` toma del
+    _buffer_ lotes de hasta `batch_size` eventos y los aplica con
+    `apply()`; mientras más se acumulan, más eventos se combinan por
+    parada.
+
+    Los lotes modifican las instancias de `Stop` de `runtime` y sus
+    `RouteView.offsets`, que son las mismas que leen las fórmulas y los
+    solucionadores. Si otros hilos las leen (por ejemplo, un
+    `msopti.service.DispatchService`), `lock` protege cada lote.
+
+    Attributes:
+        runtime: La vista compilada de los parámetros a actualizar.
+        capacity: La cantidad máxima de eventos en espera.
+        batch_size: La cantidad máxima de eventos por lote.
+        stats: Los contadores de la ingesta.
+        units: La última parada y hora reportadas por cada unidad.
+        lock: Si se indica, recibe los ids de las paradas de un lote y
+            retorna el _context manager_ dentro del cual se modifican.
+    """
+
+    runtime: RuntimeParams
+    capacity: int
+    batch_size: int
+    stats: IngestStats
+    units: dict[int,tuple[str|int,datetime.datetime]]
+    lock: Callable[[Iterable[str|int]],ContextManager]|None
+    _delays: dict[str|int,datetime.datetime]
+
+    def __init__(
+            self,
+            runtime: RuntimeParams,
+            capacity: int = 8192,
+            batch_size: int = 1024,
+            lock: Callable[[Iterable[str|int]],ContextManager]|None = None
+        ) -> None:
+        """Crea el ingestor.
+
+        Args:
+            runtime: La vista compilada de los parámetros a actualizar.
+            capacity: La cantidad máxima de eventos en espera.
+            batch_size: La cantidad máxima de eventos por lote.
+            lock: Si se indica, cada lote modifica las paradas dentro de
+                `lock(ids)`, por ejemplo `DispatchService.lock_stops`.
+
+        Raises:
+            ValueError: Si `capacity` o `batch_size` son menores a 1.
+        """
+        if capacity < 1 or batch_size < 1:
+            raise ValueError("La capacidad y el tamaño de lote deben ser mayores a 0") # pylint: disable=C0301
+
+        self.runtime = runtime
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.stats = IngestStats()
+        self.units = {}
+        self.lock = lock
+        self._delays = {}
+
+    def _stop_id(self, value: str|int) -> str|int|None:
+        """Obtiene el id de una parada; en CSV los ids siempre son
+        strings."""
+        if value in self.runtime.stops:
+            return value
+        if isinstance(value, str):
+            try:
+                value = int(value)
+            except ValueError:
+                return None
+            if value in self.runtime.stops:
+                return value
+        return None
+
+    def apply(self, events: list[VehicleEvent]) -> int:
+        """Aplica un lote de eventos.
+
+        Los eventos se combinan por parada: `Stop.last_visit` toma la visita
+        más reciente (si es posterior a la registrada) y `Stop.event_delay`
+        el retraso del evento más reciente que lo indique. Como los eventos
+        pueden llegar desordenados, un retraso sólo se aplica si su evento
+        no es anterior al del último retraso aplicado a la parada. Los
+        eventos de paradas que no existen se omiten y se cuentan en
+        `IngestStats.rejected`; los demás en `IngestStats.received`.
+
+        Args:
+            events: Los eventos del lote, en cualquier orden.
+
+        Returns:
+            La cantidad de paradas actualizadas.
+        """
+        tick = time.perf_counter()
+        visits: dict[str|int,datetime.datetime] = {}
+        delays: dict[str|int,tuple[datetime.datetime,datetime.timedelta]] = {}
+        rejected = 0
+
+        for event in events:
+            stop = self._stop_id(event.stop_id)
+            if stop is None:
+                rejected += 1
+                continue
+
+            if stop not in visits or event.time > visits[stop]:
+                visits[stop] = event.time
+            if event.delay is not None:
+                newest = delays[stop][0] if stop in delays else self._delays.get(stop, event.time) # pylint: disable=C0301
+                if event.time >= newest:
+                    delays[stop] = (event.time, event.delay)
+
+            last = self.units.get(event.unit)
+            if last is None or event.time >= last[1]:
+                self.units[event.unit] = (stop, event.time)
+
+        with self.lock(visits) if self.lock is not None else contextlib.nullcontext(): # pylint: disable=C0301
+            self.runtime.set_event_delays({
+                stop: delay
+                for stop, (_, delay) in delays.items()
+                if self.runtime.stop(stop).event_delay != delay
+            })
+            for stop, visit in visits.items():
+                s = self.runtime.stop(stop)
+                if s.last_visit is None or visit > s.last_visit:
+                    s.last_visit = visit
+        self._delays.update((stop, t) for stop, (t, _) in delays.items())
+
+        accepted = len(events) - rejected
+        self.stats.received += accepted
+        self.stats.rejected += rejected
+        self.stats.coalesced += accepted - len(visits)
+        self.stats.applied += len(visits)
+        self.stats.batches += 1
+        self.stats.apply_time += time.perf_counter() - tick
+        return len(visits)
+
+    def ingest(self, events: Iterable[VehicleEvent]) -> IngestStats:
+        """Aplica eventos en el hilo actual, en lotes de `batch_size`.
+
+        Args:
+            events: Los eventos.
+
+        Returns:
+            Los contadores de la ingesta.
+        """
+        start = time.perf_counter()
+        it = iter(events)
+        while batch := list(itertools.islice(it, self.batch_size)):
+            self.apply(batch)
+        self.stats.elapsed += time.perf_counter() - start
+
+        return self.stats
+
+    def run(
+            self,
+            source: str|TextIO,
+            fmt: str|None = None
+        ) -> IngestStats:
+        """Lee un flujo de eventos y lo aplica por lotes hasta que termine.
+
+        Args:
+            source: Ver `read_events`.
+            fmt: Ver `read_events`.
+
+        Returns:
+            Los contadores de la ingesta.
+
+        Raises:
+            ValueError: Si el formato no es válido.
+            IOError: Si existió un error al leer el archivo.
+        """
+        buffer: queue.Queue = queue.Queue(self.capacity)
+        errors: list[BaseException] = []
+
+        def produce():
+            try:
+                for event in read_events(source, fmt, self.stats):
+                    try:
+                        buffer.put_nowait(event)
+                    except queue.Full:
+                        self.stats.waits += 1
+                        buffer.put(event)
+            except BaseException as e: # pylint: disable=W0718
+                errors.append(e)
+            finally:
+                buffer.put(_END)
+
+        start = time.perf_counter()
+        reader = threading.Thread(target=produce, name="msopti-events", daemon=True) # pylint: disable=C0301
+        reader.start()
+
+        done = False
+        while not done:
+            batch = []
+            item = buffer.get()
+            while True:
+                if item is _END:
+                    done = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = buffer.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.apply(batch)
+
+        reader.join()
+        self.stats.elapsed += time.perf_counter() - start
+        if errors:
+            raise errors[0]
+
+        return self.stats
+
@@ -0,0 +1,381 @@
+"""Almacenamiento binario de los pronósticos de demanda.
+
+Los pronósticos se reciben en CSV, con una fila por parada y marca de tiempo
+y el nombre de la parada repetido en cada fila. Este módulo los convierte a
+un formato columnar en disco que se carga con `numpy.memmap`, de modo que
+leer un rango de fechas sólo toca las páginas de esos días.
+
+Un almacén es un directorio con dos archivos:
+
+- `counts.npy`: Un arreglo de forma `(días, paradas, intervalos)` con los
+  pasajeros de cada intervalo del día (las filas repetidas se suman), en
+  `int16` o `int32` según el máximo. Los intervalos sin fila en el CSV
+  valen -1.
+- `meta.json`: La tabla de paradas (ids y nombres, una sola vez), el primer
+  día y la granularidad en minutos.
+"""
+
+import datetime
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+
+from msopti.algorithm.demand import DemandIndex, DemandPyramid, MINUTES_PER_DAY, PYRAMID_STEPS # pylint: disable=C0301
+
+COUNTS_FILE = "counts.npy"
+META_FILE = "meta.json"
+
+
+def convert_csv(
+        src: str,
+        dst: str,
+        time_column: str = "timespan",
+        name_column: str = "stop",
+        chunksize: int = 1_000_000
+    ):
+    """Convierte un pronóstico en CSV a un almacén binario.
+
+    El CSV se lee en bloques dos veces: la primera para conocer las paradas,
+    el rango de fechas y la granularidad, y la segunda para escribir los
+    pasajeros directamente en el arreglo mapeado en disco, sin cargar el CSV
+    completo en memoria. Si existen varias filas para una misma parada y
+    marca de tiempo, sus pasajeros se suman, igual que en `DemandIndex`.
+
+    Args:
+        src: La ubicación del CSV, con las columnas `stop_id`, `passengers`,
+            `time_column` y, opcionalmente, `name_column`.
+        dst: La ubicación del directorio del almacén, se crea si no existe.
+        time_column: El nombre de la columna con la fecha y hora.
+        name_column: El nombre de la columna con el nombre de la parada.
+        chunksize: La cantidad de filas de cada bloque.
+
+    Raises:
+        ValueError: Si el CSV no contiene las columnas necesarias, está
+            vacío, o los pasajeros de un intervalo no caben en `int32`.
+        IOError: Si existió un error al leer o escribir los archivos.
+    """
+    columns = pd.read_csv(src, nrows=0).columns
+    if not all(i in columns for i in [time_column, "stop_id", "passengers"]):
+        raise ValueError(f"No se encontró las columnas '{time_column}', 'stop_id' y 'passengers'") # pylint: disable=C0301
+    usecols = [time_column, "stop_id", "passengers"]
+    if name_column in columns:
+        usecols.append(name_column)
+
+    def chunks():
+        return pd.read_csv(src, usecols=usecols, parse_dates=[time_column], chunksize=chunksize) # pylint: disable=C0301
+
+    # primera pasada: paradas, fechas, granularidad y máximo; el máximo
+    # suma las filas repetidas de cada bloque
+    names: dict[str|int,str] = {}
+    first = last = None
+    step = MINUTES_PER_DAY
+    peak = 0
+    for chunk in chunks():
+        times = pd.DatetimeIndex(chunk[time_column])
+        minutes = (times.hour * 60 + times.minute).to_numpy()
+        step = math.gcd(step, int(np.gcd.reduce(minutes, initial=0)))
+        first = times.min() if first is None else min(first, times.min())
+        last = times.max() if last is None else max(last, times.max())
+        peak = max(peak, int(chunk.groupby([time_column, "stop_id"])["passengers"].sum().max())) # pylint: disable=C0301
+        label = name_column if name_column in chunk else "stop_id"
+        stops = chunk.drop_duplicates("stop_id")
+        for stop_id, name in zip(stops["stop_id"].tolist(), stops[label].tolist()): # pylint: disable=C0301
+            names.setdefault(stop_id, str(name))
+
+    if first is None:
+        raise ValueError("El CSV no contiene filas")
+
+    step = step or MINUTES_PER_DAY
+    start = first.normalize()
+    days = (last.normalize() - start).days + 1
+    stop_ids = list(names)
+    positions = { s: i for i, s in enumerate(stop_ids) }
+    shape = (days, len(stop_ids), MINUTES_PER_DAY // step)
+
+    # segunda pasada: pasajeros por día, parada e intervalo
+    def write(dtype) -> bool:
+        counts = np.lib.format.open_memmap(
+            os.path.join(dst, COUNTS_FILE),
+            mode="w+",
+            dtype=dtype,
+            shape=shape
+        )
+        flat = counts.reshape(-1)
+        flat[...] = -1
+        try:
+            for chunk in chunks():
+                times = pd.DatetimeIndex(chunk[time_column])
+                day = (times.normalize() - start).days.to_numpy()
+                slot = ((times.hour * 60 + times.minute) // step).to_numpy()
+                stop = chunk["stop_id"].map(positions).to_numpy()
+                # las filas repetidas se suman, también entre bloques
+                cells, rows = np.unique(np.ravel_multi_index((day, stop, slot), shape), return_inverse=True) # pylint: disable=C0301
+                total = np.maximum(flat[cells], 0).astype(np.int64)
+                np.add.at(total, rows, chunk["passengers"].to_numpy(dtype=np.int64)) # pylint: disable=C0301
+                if total.max(initial=0) > np.iinfo(dtype).max:
+                    return False
+                flat[cells] = total
+            counts.flush()
+            return True
+        finally:
+            del flat, counts
+
+    os.makedirs(dst, exist_ok=True)
+    for dtype in (np.int16, np.int32):
+        if peak <= np.iinfo(dtype).max and write(dtype):
+            break
+    else:
+        raise ValueError("Los pasajeros de un intervalo no caben en int32")
+
+    with open(os.path.join(dst, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "start": start.date().isoformat(),
+            "step": step,
+            "stop_ids": stop_ids,
+            "stop_names": [ names[i] for i in stop_ids ],
+        }, f)
+
+
+class ForecastStore:
+    """Un almacén binario de pronósticos mapeado en memoria.
+
+    Abrir el almacén sólo lee la tabla de paradas y mapea el arreglo de
+    pasajeros; los datos de cada día se leen del disco cuando se consultan.
+
+    Attributes:
+        start: El primer día del almacén, con la hora en 00:00:00.
+        step: La granularidad en minutos.
+        stop_ids: Los ids de las paradas (string o int).
+        stop_names: Los nombres de las paradas, en el orden de `stop_ids`.
+        counts: El arreglo mapeado de forma `(días, paradas, intervalos)`.
+    """
+
+    start: datetime.datetime
+    step: int
+    stop_ids: list[str|int]
+    stop_names: list[str]
+    counts: np.ndarray
+
+    def __init__(self, path: str) -> None:
+        """Abre un almacén creado con `convert_csv`.
+
+        Args:
+            path: La ubicación del directorio del almacén.
+
+        Raises:
+            ValueError: Si el almacén tiene un formato incorrecto.
+            IOError: Si existió un error al leer los archivos.
+        """
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.start = datetime.datetime.fromisoformat(meta["start"])
+        self.step = meta["step"]
+        self.stop_ids = meta["stop_ids"]
+        self.stop_names = meta["stop_names"]
+        self.counts = np.load(os.path.join(path, COUNTS_FILE), mmap_mode="r")
+
+        if self.counts.shape[1:] != (len(self.stop_ids), MINUTES_PER_DAY // self.step): # pylint: disable=C0301
+            raise ValueError("El arreglo de pasajeros no coincide con la tabla de paradas") # pylint: disable=C0301
+
+    @property
+    def days(self) -> int:
+        """La cantidad de días del almacén."""
+        return self.counts.shape[0]
+
+    def _range(
+            self,
+            start: datetime.datetime|None,
+            end: datetime.datetime|None
+        ) -> tuple[int,int]:
+        """Convierte un rango de fechas inclusivo en posiciones de días.
+
+        Por defecto el rango inicia en el primer día del almacén y termina
+        el mismo día en el que inicia.
+        """
+        first = 0 if start is None else (pd.Timestamp(start).normalize() - self.start).days # pylint: disable=C0301
+        last = first if end is None else (pd.Timestamp(end).normalize() - self.start).days # pylint: disable=C0301
+
+        return max(first, 0), min(last, self.days - 1) + 1
+
+    def _grid(
+            self,
+            start: datetime.datetime|None,
+            end: datetime.datetime|None
+        ) -> tuple[list[pd.Timestamp],np.ndarray,np.ndarray]:
+        """Lee los días de un rango que tienen filas en el pronóstico.
+
+        Returns:
+            Una tupla con los días, los pasajeros y los intervalos que tienen
+            filas, ambos arreglos de forma `(paradas, días, intervalos)`.
+        """
+        first, last = self._range(start, end)
+        grid = np.asarray(self.counts[first:last]).transpose(1, 0, 2)
+        present = grid >= 0
+
+        days = [
+            pd.Timestamp(self.start + datetime.timedelta(days=i))
+            for i in range(first, last)
+        ]
+        keep = present.any(axis=(0, 2))
+
+        return (
+            [ d for d, k in zip(days, keep) if k ],
+            np.maximum(grid[:, keep], 0),
+            present[:, keep]
+        )
+
+    def index(
+            self,
+            start: datetime.datetime|None = None,
+            end: datetime.datetime|None = None
+        ) -> DemandIndex:
+        """Construye un `DemandIndex` con los días de un rango.
+
+        Sólo se leen del disco los días del rango, y el índice se construye
+        directamente desde el arreglo con la granularidad del almacén, sin
+        pasar por un `pandas.DataFrame`.
+
+        Args:
+            start: El primer día del rango, por defecto el primero del
+                almacén.
+            end: El último día del rango (inclusivo), por defecto `start`.
+
+        Returns:
+            Un `DemandIndex`.
+        """
+        days, grid, present = self._grid(start, end)
+        return DemandIndex.from_counts(self.stop_ids, days, grid, present, self.step) # pylint: disable=C0301
+
+    def pyramid(
+            self,
+            start: datetime.datetime|None = None,
+            end: datetime.datetime|None = None,
+            steps: tuple[int,...] = PYRAMID_STEPS
+        ) -> DemandPyramid:
+        """Construye la pirámide de agregación con los días de un rango.
+
+        Los niveles se agregan directamente desde el arreglo del almacén, sin
+        expandirlo a minutos.
+
+        Args:
+            start: El primer día del rango, por defecto el primero del
+                almacén.
+            end: El último día del rango (inclusivo), por defecto `start`.
+            steps: Las granularidades de los niveles agregados, ver
+                `DemandPyramid`.
+
+        Returns:
+            Un `DemandPyramid` cuyo primer nivel tiene la granularidad del
+            almacén.
+
+        Raises:
+            ValueError: Si las granularidades no son compatibles.
+        """
+        days, grid, present = self._grid(start, end)
+        return DemandPyramid(self.stop_ids, days, grid, present, self.step, steps) # pylint: disable=C0301
+
+    def read(
+            self,
+            start: datetime.datetime|None = None,
+            end: datetime.datetime|None = None
+        ) -> pd.DataFrame:
+        """Lee los días de un rango como un `pandas.DataFrame`.
+
+        Args:
+            start: El primer día del rango, por defecto el primero del
+                almacén.
+            end: El último día del rango (inclusivo), por defecto `start`.
+
+        Returns:
+            Un `pandas.DataFrame` con `pandas.DatetimeIndex` y las columnas
+            `stop`, `stop_id` y `passengers`, ordenado por parada y fecha,
+            el cual puede usarse con `gererate_formula`.
+        """
+        first, last = self._range(start, end)
+        grid = np.asarray(self.counts[first:last]).transpose(1, 0, 2)
+        stop, day, slot = np.nonzero(grid >= 0)
+
+        times = (
+            np.datetime64(self.start + datetime.timedelta(days=first), "m")
+            + (day * MINUTES_PER_DAY + slot * self.step).astype("timedelta64[m]") # pylint: disable=C0301
+        )
+        stop_ids = np.array(self.stop_ids)
+        stop_names = np.array(self.stop_names, dtype=object)
+
+        return pd.DataFrame(
+            {
+                "stop": stop_names[stop],
+                "stop_id": stop_ids[stop],
+                "passengers": grid[stop, day, slot].astype(np.int64),
+            },
+            index=pd.DatetimeIndex(times, name="timespan"),
+        )
+
+
+def load_forecast(
+        path: str,
+        start: datetime.datetime|None = None,
+        end: datetime.datetime|None = None
+    ) -> DemandIndex:
+    """Carga un pronóstico y lo indexa.
+
+    Sólo se indexan los días del rango; por defecto, un solo día. Para
+    varios días se debe indicar `end`, ver `msopti.planner.plan_days`.
+
+    Args:
+        path: La ubicación de un almacén creado con `convert_csv` o de un
+            CSV con las columnas `timespan`, `stop_id` y `passengers`.
+        start: El primer día a cargar, por defecto el primero del
+            pronóstico.
+        end: El último día a cargar (inclusivo), por defecto `start`.
+
+    Returns:
+        Un `DemandIndex`.
+
+    Raises:
+        ValueError: Si el pronóstico tiene un formato incorrecto.
+        IOError: Si existió un error al leer los archivos.
+    """
+    if os.path.isdir(path):
+        return ForecastStore(path).index(start, end)
+
+    df = pd.read_csv(path, usecols=["timespan", "stop_id", "passengers"], parse_dates=["timespan"]) # pylint: disable=C0301
+    df.index = pd.DatetimeIndex(df.pop("timespan"))
+    days = df.index.normalize()
+    first = days.min() if start is None else pd.Timestamp(start).normalize()
+    last = first if end is None else pd.Timestamp(end).normalize()
+
+    return DemandIndex(df[(days >= first) & (days <= last)])
+
+
+def load_pyramid(
+        path: str,
+        start: datetime.datetime|None = None,
+        end: datetime.datetime|None = None,
+        steps: tuple[int,...] = PYRAMID_STEPS
+    ) -> DemandPyramid:
+    """Carga un pronóstico y construye su pirámide de agregación.
+
+    Args:
+        path: Ver `load_forecast`.
+        start: El primer día a cargar, por defecto el primero del
+            pronóstico.
+        end: El último día a cargar (inclusivo), por defecto `start`.
+        steps: Las granularidades de los niveles agregados, ver
+            `DemandPyramid`.
+
+    Returns:
+        Un `DemandPyramid`.
+
+    Raises:
+        ValueError: Si el pronóstico tiene un formato incorrecto o las
+            granularidades no son compatibles.
+        IOError: Si existió un error al leer los archivos.
+    """
+    if os.path.isdir(path):
+        return ForecastStore(path).pyramid(start, end, steps)
+
+    return DemandPyramid.from_index(load_forecast(path, start, end), steps)
@@ -2,6 +2,10 @@
 
 import json
 import datetime
+import hashlib
+import importlib.metadata
+import os
+import pickle
 from dataclasses import dataclass
 import dataclass_wizard as dw
 
@@ -200,11 +204,91 @@ class Params:
     vehicles: list[Vehicle] = dw.json_field("buses", all=True)  # type: ignore
 
 
-def load_params_from_file(file: str) -> Params:
+CACHE_VERSION = 1
+"""Versión del formato de la caché de `load_params_from_file`, se debe
+incrementar al modificar las clases de este módulo."""
+
+
+def _package_version() -> str|None:
+    """Obtiene la versión instalada del paquete, o `None` si no está
+    instalado."""
+    try:
+        return importlib.metadata.version("ms-opti")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def _cache_key(file: str, raw: bytes) -> dict:
+    """Genera la llave de la caché de un archivo de parámetros."""
+    stat = os.stat(file)
+    return {
+        "version": CACHE_VERSION,
+        "package": _package_version(),
+        "path": os.path.abspath(file),
+        "mtime": stat.st_mtime_ns,
+        "sha256": hashlib.sha256(raw).hexdigest(),
+    }
+
+
+def _load_cache(cache: str, key: dict) -> Params|None:
+    """Lee una instancia de `Params` de la caché, o `None` si la caché no
+    existe, está dañada o no corresponde a la llave.
+
+    Una caché escrita por otra versión del paquete puede hacer referencia a
+    clases que ya no existen o cambiaron de módulo, por lo que cualquier
+    error al leerla se trata como si no existiera.
+    """
+    try:
+        with open(cache, "rb") as f:
+            cached_key, params = pickle.loads(f.read())
+    except Exception: # pylint: disable=W0718
+        return None
+
+    if cached_key != key or not isinstance(params, Params):
+        return None
+
+    return params
+
+
+def _save_cache(cache: str, key: dict, params: Params):
+    """Escribe una instancia de `Params` en la caché.
+
+    Se escribe en un archivo temporal que luego reemplaza a la caché, para
+    que otros procesos nunca lean una caché incompleta. Si la escritura
+    falla, el archivo temporal se elimina.
+    """
+    tmp = f"{cache}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(pickle.dumps((key, params), protocol=pickle.HIGHEST_PROTOCOL)) # pylint: disable=C0301
+        os.replace(tmp, cache)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_params_from_file(file: str, cache: str|None = None) -> Params:
     """Carga una instancia de `Params` dado una ruta o un archivo.
 
+    Convertir el JSON con `dataclass_wizard` es costoso cuando se tienen
+    miles de paradas, por lo que opcionalmente se puede usar una caché: un
+    archivo binario con los parámetros ya convertidos que se carga con una
+    sola lectura. La caché guarda la versión del paquete y la ubicación, la
+    fecha de modificación y el hash SHA-256 del JSON; si alguno no coincide
+    (por ejemplo, después de `save_params_to_file` o de actualizar el
+    paquete), o la caché no se puede leer, se convierte el JSON completo y
+    la caché se vuelve a escribir.
+
+    La caché usa `pickle`, por lo que sólo se debe usar con archivos
+    generados localmente por esta función.
+
     Args:
         file: La ubicación del archivo JSON a importar.
+        cache: La ubicación del archivo de la caché, por defecto no se usa
+            caché.
 
     Returns:
         Una instancia de Params con la información dada
@@ -215,8 +299,24 @@ def load_params_from_file(file: str) -> Params:
         IOError: Si existió un error al leer el archivo.
     """
 
-    with open(file, "r", encoding="utf-8") as f:
-        return dw.fromdict(Params, json.load(f))
+    if cache is None:
+        with open(file, "r", encoding="utf-8") as f:
+            return dw.fromdict(Params, json.load(f))
+
+    with open(file, "rb") as f:
+        raw = f.read()
+
+    key = _cache_key(file, raw)
+    params = _load_cache(cache, key)
+    if params is None:
+        params = dw.fromdict(Params, json.loads(raw.decode("utf-8")))
+        try:
+            _save_cache(cache, key, params)
+        except OSError:
+            # la caché es opcional, los parámetros ya se cargaron
+            pass
+
+    return params
 
 
 def save_params_to_file(file: str, params: Params):
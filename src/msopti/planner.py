@@ -0,0 +1,897 @@
+"""Planificación de la jornada completa de una o varias rutas.
+
+Implementa el ciclo descrito en `doc/INFO.md`: se toma una ruta, se define la
+hora de salida, se obtienen los tiempos óptimos, se despacha, y se repite
+hasta el final de la jornada. El pronóstico se indexa una sola vez y el
+estado de las paradas y de las unidades se actualiza en cada despacho.
+"""
+
+import contextlib
+import dataclasses
+import datetime
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import pandas as pd
+
+from msopti.algorithm.demand import DemandIndex, SharedDemandIndex
+from msopti.algorithm.dp import DPSolver
+from msopti.algorithm.formula import gererate_batch_formula, gererate_formula, scoped_stops # pylint: disable=C0301
+from msopti.algorithm.grid import GridSolver
+from msopti.algorithm.interfaces import BatchScorefn, Scorefn, Solution, StopTime
+from msopti.algorithm.stats import SolverStats, StatsHook
+from msopti.params import Params, Route, Stop, Vehicle
+from msopti.runtime import RouteView, RuntimeParams
+from msopti.table import DispatchTable
+
+
+@dataclass
+class Dispatch:
+    """Un despacho de la tabla de despachos.
+
+    Attributes:
+        route: El id de la ruta (string o int).
+        start_point: El id de la parada (string o int) desde donde sale la
+            unidad.
+        departure: La hora de salida de la unidad.
+        arrival: La hora en la que la unidad llega a la última parada.
+        solution: La `Solution` obtenida para el despacho.
+    """
+
+    route: str|int
+    start_point: str|int
+    departure: datetime.datetime
+    arrival: datetime.datetime
+    solution: Solution
+
+
+@dataclass
+class PlanDiff:
+    """Diferencias en la tabla de despachos después de re-planificar.
+
+    Attributes:
+        added: Los despachos nuevos.
+        removed: Los despachos que ya no forman parte de la tabla.
+        updated: Los despachos que ya salieron y cuyas horas de llegada a
+            las paradas cambiaron.
+    """
+
+    added: list[Dispatch]
+    removed: list[Dispatch]
+    updated: list[Dispatch]
+
+
+@dataclass
+class UnitState:
+    """Estado de una unidad durante la jornada.
+
+    Attributes:
+        unit: El vehículo.
+        available_at: La hora a partir de la cual puede ser despachado.
+        lunched: `True` si ya tuvo su almuerzo.
+    """
+
+    unit: Vehicle
+    available_at: datetime.datetime
+    lunched: bool = False
+
+
+@dataclass
+class _Group:
+    """Unidades de una ruta que salen desde un mismo punto."""
+
+    start_point: str|int
+    route: RouteView
+    formula: Scorefn
+    batch: BatchScorefn
+    units: list[UnitState]
+    time: datetime.datetime
+    first: bool = True
+    states: dict[int,UnitState] = dataclasses.field(default_factory=dict)
+    stats: SolverStats|None = None
+
+    def __post_init__(self):
+        self.states = { i.unit.unit_number: i for i in self.units }
+
+
+def _arrivals(dispatch: Dispatch) -> list[datetime.datetime]:
+    """Obtiene la fecha y hora de llegada a cada parada de un despacho.
+
+    Args:
+        dispatch: El despacho.
+
+    Returns:
+        Una lista con la llegada a cada parada de la planificación.
+    """
+    arrivals = []
+    arrival = dispatch.departure
+    for stop_time in dispatch.solution.planification:
+        current = datetime.datetime.combine(arrival.date(), stop_time.time)
+        if current < arrival:
+            current += datetime.timedelta(days=1)
+        arrival = current
+        arrivals.append(arrival)
+
+    return arrivals
+
+
+@contextlib.contextmanager
+def _cleared_visits(stops: list[Stop]) -> Iterator[None]:
+    """Vacía el `Stop.last_visit` de las paradas y restaura sus valores al
+    terminar.
+
+    Las paradas son las instancias de `Params`, que quien llama (por
+    ejemplo, un `msopti.service.DispatchService` con los mismos parámetros)
+    sigue usando después de planificar.
+    """
+    saved = [ i.last_visit for i in stops ]
+    for stop in stops:
+        stop.last_visit = None
+    try:
+        yield
+    finally:
+        for stop, visit in zip(stops, saved):
+            stop.last_visit = visit
+
+
+def route_stops(params: Params, route: Route) -> list[Stop]:
+    """Obtiene las paradas de una ruta en el orden en que se recorren.
+
+    Args:
+        params: Los parámetros con la información de todas las paradas.
+        route: La ruta.
+
+    Returns:
+        Una lista ordenada de paradas (`Stop`).
+
+    Raises:
+        KeyError: Si la ruta contiene un id de parada desconocido.
+    """
+    stops = { i.id: i for i in params.stops }
+    return [ stops[i] for i in route.stops ]
+
+
+def dispatch_table(dispatches: list[Dispatch]) -> pd.DataFrame:
+    """Genera la _tabla de despachos_.
+
+    Args:
+        dispatches: Los despachos planificados.
+
+    Returns:
+        Un `pandas.DataFrame` con una fila por despacho, ver
+        `Solution.to_dataframe` y `DispatchTable.to_dataframe`.
+    """
+    return DispatchTable.from_solutions([ i.solution for i in dispatches ]).to_dataframe() # pylint: disable=C0301
+
+
+class DayPlanner:
+    """Planificador de la jornada de un día.
+
+    Por cada ruta, las unidades se agrupan según su punto de salida y cada
+    grupo despacha de forma independiente, pero en orden cronológico, ya que
+    todos los grupos actualizan el `Stop.last_visit` de las paradas que
+    comparten. Cada despacho se resuelve con `GridSolver`, usando una fórmula
+    por grupo que se genera una sola vez y que lee el estado de las paradas
+    en cada evaluación.
+
+    Las reglas de la jornada se toman de `Params.schedule`:
+
+    - El primer despacho de cada grupo sale entre `start.min` y `start.max`.
+    - No se despacha después de `end.max`.
+    - Entre despachos del mismo grupo hay al menos un `interval`.
+    - Al llegar a la última parada, la unidad descansa `rest.min`. Si la
+      llegada ocurre entre `lunch.start` y `lunch.end` y la unidad aún no ha
+      almorzado, en su lugar toma `lunch.time`; como las unidades llegan en
+      distintos momentos, los almuerzos quedan escalonados.
+    - Si alguna unidad lleva esperando más de `rest.max`, sólo las unidades
+      en esa situación son candidatas para el siguiente despacho.
+
+    Las unidades permanecen en su punto de salida durante toda la jornada.
+
+    Las paradas de `runtime` son las instancias de `params`; cada ruta se
+    planifica desde paradas sin visitar y, al terminar, se restaura el
+    `Stop.last_visit` que tenían, por lo que planificar no modifica el
+    estado que conserva quien llama.
+
+    Attributes:
+        params: Los parámetros de la jornada.
+        runtime: La vista compilada de `params`.
+        index: El pronóstico indexado.
+        date: El día a planificar, con la hora en 00:00:00.
+        time_max: Tiempo máximo que se puede esperar antes de despachar.
+        hook: Si se indica, recibe las estadísticas de cada despacho
+            resuelto (ver `msopti.algorithm.stats`).
+        per_day: Si es `True`, las fórmulas sólo cuentan los pasajeros de
+            `date` (ver `gererate_batch_formula`).
+    """
+
+    params: Params
+    runtime: RuntimeParams
+    index: DemandIndex
+    date: datetime.datetime
+    time_max: datetime.timedelta
+    hook: StatsHook|None
+    per_day: bool
+
+    def __init__(
+            self,
+            params: Params,
+            forecast: pd.DataFrame|DemandIndex,
+            date: datetime.datetime,
+            time_max: datetime.timedelta|None = None,
+            hook: StatsHook|None = None,
+            per_day: bool = False
+        ) -> None:
+        """Crea un planificador.
+
+        Args:
+            params: Los parámetros de la jornada.
+            forecast: pandas.DataFrame, Un dataset con
+                `pandas.DatetimeIndex`, una columna `passengers` y una
+                columna `stop_id`, o un `DemandIndex` construido previamente.
+            date: El día a planificar, con la hora en 00:00:00.
+            time_max: Tiempo máximo que se puede esperar antes de despachar,
+                por defecto `Schedule.rest.max`.
+            hook: Si se indica, recibe las estadísticas de cada despacho
+                resuelto, incluyendo el tiempo de cada término de la
+                fórmula.
+            per_day: Si es `True`, las fórmulas sólo cuentan los pasajeros
+                de `date`; por defecto suman todos los días del pronóstico.
+
+        Raises:
+            ValueError: cuando el pandas.DataFrame no contiene las llaves
+                `passengers` y `stop_id`, o no tiene `pandas.DatetimeIndex`,
+                o cuando existen paradas, rutas o unidades con ids repetidos.
+            KeyError: Si alguna ruta contiene un id de parada desconocido.
+        """
+        self.params = params
+        self.runtime = RuntimeParams(params)
+        self.index = forecast if isinstance(forecast, DemandIndex) else DemandIndex(forecast) # pylint: disable=C0301
+        self.date = date
+        self.time_max = params.schedule.rest.max if time_max is None else time_max
+        self.hook = hook
+        self.per_day = per_day
+
+    def _limits(self, route_id: str|int) -> list[list[str|int]]:
+        """Obtiene los límites de la fórmula de cada grupo de una ruta: su
+        punto de salida y el del grupo siguiente, en el orden de la ruta."""
+        view = self.runtime.route(route_id)
+        start_points = sorted(
+            { i.start_point for i in self.runtime.route_units(route_id) },
+            key=view.position
+        )
+
+        return [
+            [sp, start_points[(n + 1) % len(start_points)]]
+            for n, sp in enumerate(start_points)
+        ]
+
+    def _groups(self, route: Route) -> list[_Group]:
+        """Agrupa las unidades disponibles de una ruta por punto de salida."""
+        view = self.runtime.route(route.id)
+        units = self.runtime.route_units(route.id)
+        start = self.date + self.params.schedule.start.min
+
+        groups = []
+        for limits in self._limits(route.id):
+            sp = limits[0]
+            stats = SolverStats() if self.hook is not None else None
+            args = (self.index, limits, view.stops, self.params.scores, self.date, view.positions, stats, self.per_day) # pylint: disable=C0301
+            groups.append(_Group(
+                sp,
+                view,
+                gererate_formula(*args),
+                gererate_batch_formula(*args),
+                [ UnitState(i, start) for i in units if i.start_point == sp ],
+                start,
+                stats=stats,
+            ))
+
+        return groups
+
+    def _candidates(self, group: _Group) -> list[UnitState]:
+        """Obtiene las unidades que se pueden despachar en el tiempo actual
+        del grupo."""
+        ready = [ i for i in group.units if i.available_at <= group.time ]
+        overdue = [
+            i for i in ready
+            if group.time - i.available_at >= self.params.schedule.rest.max
+        ]
+
+        return overdue or ready
+
+    def _time_max(self, group: _Group) -> datetime.timedelta:
+        """Obtiene el tiempo máximo de espera para el tiempo actual del
+        grupo."""
+        schedule = self.params.schedule
+        limit = self.date + (schedule.start.max if group.first else schedule.end.max) # pylint: disable=C0301
+
+        return max(min(self.time_max, limit - group.time), datetime.timedelta())
+
+    def _apply(self, group: _Group, dispatch: Dispatch):
+        """Aplica un despacho al estado de las paradas y de las unidades."""
+        schedule = self.params.schedule
+
+        for stop_time, visit in zip(dispatch.solution.planification, _arrivals(dispatch)): # pylint: disable=C0301
+            stop_time.stop.last_visit = visit
+
+        arrival = dispatch.arrival
+        unit = dispatch.solution.unit.unit_number
+        state = group.states[unit]
+        lunch_start = self.date + schedule.lunch.start
+        lunch_end = self.date + schedule.lunch.end
+        if not state.lunched and lunch_start <= arrival <= lunch_end:
+            state.lunched = True
+            state.available_at = arrival + schedule.lunch.time
+        else:
+            state.available_at = arrival + schedule.rest.min
+
+        group.first = False
+        group.time = dispatch.departure + schedule.interval
+
+    def _dispatch(
+            self,
+            route: Route,
+            group: _Group,
+            solution: Solution
+        ) -> Dispatch:
+        """Crea el despacho de una solución y lo aplica."""
+        departure = group.time + datetime.timedelta(minutes=solution.delay)
+        arrival = departure + datetime.timedelta(minutes=group.route.travel(group.start_point)) # pylint: disable=C0301
+        dispatch = Dispatch(route.id, group.start_point, departure, arrival, solution) # pylint: disable=C0301
+        self._apply(group, dispatch)
+
+        return dispatch
+
+    def _step(self, route: Route, group: _Group) -> Dispatch|None:
+        """Intenta despachar una unidad en el tiempo actual del grupo.
+
+        Returns:
+            El despacho realizado, o `None` si no se pudo despachar, en cuyo
+            caso el tiempo del grupo avanza.
+        """
+        schedule = self.params.schedule
+        candidates = self._candidates(group)
+
+        if not candidates:
+            group.time = min(i.available_at for i in group.units)
+            return None
+
+        if group.stats is not None:
+            group.stats.reset()
+
+        solver = GridSolver(
+            group.formula,
+            self.params.scores.minute_price,
+            self.params.scores.cap_cost,
+            self.params.scores.low_demand_cost,
+            self.params.scores.zero_demand_cost,
+            group.time,
+            self._time_max(group),
+            schedule.interval,
+            [ i.unit for i in candidates ],
+            group.route.stops,
+            group.start_point,
+            batch_formula=group.batch,
+            positions=group.route.positions,
+            offsets=group.route.offsets,
+            stats=group.stats,
+            hook=self.hook,
+        )
+
+        try:
+            solution = solver.solve()
+        except ValueError:
+            group.time += schedule.interval
+            return None
+
+        return self._dispatch(route, group, solution)
+
+    def _run(
+            self,
+            route: Route,
+            fixed: list[Dispatch],
+            active: set[str|int]|None,
+            since: datetime.datetime|None
+        ) -> list[Dispatch]:
+        """Ejecuta el ciclo de planificación de una ruta.
+
+        Args:
+            route: La ruta a planificar.
+            fixed: Despachos ya planificados que se mantienen; se aplican
+                en orden cronológico junto a los nuevos despachos.
+            active: Los puntos de salida de los grupos que se resuelven, por
+                defecto todos.
+            since: El tiempo a partir del cual se resuelven nuevos
+                despachos, por defecto el inicio de la jornada.
+
+        Returns:
+            La lista de despachos ordenada por hora de salida.
+        """
+        with _cleared_visits(self.runtime.route(route.id).stops):
+            return self._loop(route, fixed, active, since)
+
+    def _loop(
+            self,
+            route: Route,
+            fixed: list[Dispatch],
+            active: set[str|int]|None,
+            since: datetime.datetime|None
+        ) -> list[Dispatch]:
+        """El ciclo de `_run`, con las visitas de las paradas vacías."""
+        end = self.date + self.params.schedule.end.max
+        groups = self._groups(route)
+        by_start = { i.start_point: i for i in groups }
+
+        if active is not None:
+            groups = [ i for i in groups if i.start_point in active ]
+        since = since or datetime.datetime.min
+        fixed = sorted(fixed, key=lambda i: i.departure)
+
+        dispatches = []
+        while True:
+            groups = [ i for i in groups if i.time <= end ]
+            group = min(groups, key=lambda i: max(i.time, since), default=None)
+
+            if fixed and (group is None or fixed[0].departure <= max(group.time, since)): # pylint: disable=C0301
+                dispatch = fixed.pop(0)
+                self._apply(by_start[dispatch.start_point], dispatch)
+                dispatches.append(dispatch)
+                continue
+
+            if group is None:
+                break
+
+            group.time = max(group.time, since)
+            dispatch = self._step(route, group)
+            if dispatch is not None:
+                dispatches.append(dispatch)
+
+        return dispatches
+
+    def plan_route(self, route: Route) -> list[Dispatch]:
+        """Planifica la jornada de una ruta.
+
+        Args:
+            route: La ruta a planificar.
+
+        Returns:
+            La lista de despachos ordenada por hora de salida.
+        """
+        return self._run(route, [], None, None)
+
+    def plan_route_exact(
+            self,
+            route: Route,
+            max_states: int|None = None
+        ) -> list[Dispatch]:
+        """Planifica la jornada de una ruta con `DPSolver`.
+
+        Cada grupo obtiene su jornada óptima completa en lugar de resolver
+        un despacho a la vez. Los grupos se resuelven en el orden de la
+        ruta, ya que los despachos de un grupo pasan por las paradas de los
+        grupos siguientes, pero no por las de los anteriores.
+
+        Args:
+            route: La ruta a planificar.
+            max_states: La cantidad máxima de estados por intervalo de cada
+                `DPSolver`, opcional; ver `DPSolver`.
+
+        Returns:
+            La lista de despachos ordenada por hora de salida.
+
+        Raises:
+            ValueError: Si algún grupo no tiene una jornada que cumpla las
+                reglas de `Params.schedule`.
+        """
+        view = self.runtime.route(route.id)
+        with _cleared_visits(view.stops):
+            return self._exact(route, view, max_states)
+
+    def _exact(
+            self,
+            route: Route,
+            view: RouteView,
+            max_states: int|None
+        ) -> list[Dispatch]:
+        """Resuelve los grupos de `plan_route_exact`, con las visitas de las
+        paradas vacías."""
+        dispatches = []
+        for limits, group in zip(self._limits(route.id), self._groups(route)):
+            solver = DPSolver(
+                group.batch,
+                self.date,
+                self.params.schedule,
+                [ i.unit for i in group.units ],
+                view.stops,
+                group.start_point,
+                self.time_max,
+                [ (i.departure, i.start_point) for i in dispatches ],
+                view.positions,
+                view.offsets,
+                stats=group.stats,
+                hook=self.hook,
+                start_points=limits,
+                max_states=max_states,
+            )
+            travel = datetime.timedelta(minutes=view.travel(group.start_point))
+            solutions = solver.solve_multi()
+            for departure, solution in zip(solver.departures(), solutions):
+                dispatches.append(Dispatch(route.id, group.start_point, departure, departure + travel, solution)) # pylint: disable=C0301
+
+        dispatches.sort(key=lambda i: i.departure)
+        return dispatches
+
+    def plan(self, routes: list[Route]|None = None) -> list[Dispatch]:
+        """Planifica la jornada de varias rutas.
+
+        Args:
+            routes: Las rutas a planificar, por defecto `Params.routes`.
+
+        Returns:
+            La lista de despachos de todas las rutas ordenada por hora de
+            salida.
+        """
+        dispatches = []
+        for route in routes if routes is not None else self.params.routes:
+            dispatches.extend(self.plan_route(route))
+
+        dispatches.sort(key=lambda i: i.departure)
+        return dispatches
+
+    def _delayed(
+            self,
+            dispatch: Dispatch,
+            previous: dict[str|int,datetime.timedelta],
+            now: datetime.datetime
+        ) -> Dispatch:
+        """Recalcula las horas de llegada de un despacho que ya salió.
+
+        El retraso nuevo sólo aplica a las paradas que la unidad aún no ha
+        visitado.
+
+        Args:
+            dispatch: El despacho.
+            previous: El `event_delay` anterior de las paradas modificadas.
+            now: La hora actual.
+
+        Returns:
+            Un nuevo `Dispatch` con la planificación actualizada.
+        """
+        shift = datetime.timedelta()
+        planification = []
+        for stop_time, arrival in zip(dispatch.solution.planification, _arrivals(dispatch)): # pylint: disable=C0301
+            stop = stop_time.stop
+            if stop.id in previous and arrival > now:
+                shift += stop.event_delay - previous[stop.id]
+            planification.append(StopTime(stop, (arrival + shift).time()))
+        new = dispatch.arrival + shift
+
+        solution = dataclasses.replace(dispatch.solution, planification=planification) # pylint: disable=C0301
+        return dataclasses.replace(dispatch, arrival=new, solution=solution)
+
+    def replan(
+            self,
+            dispatches: list[Dispatch],
+            updates: dict[str|int,datetime.timedelta],
+            now: datetime.datetime
+        ) -> tuple[list[Dispatch],PlanDiff]:
+        """Re-planifica la jornada después de un cambio en el retraso de
+        algunas paradas.
+
+        Se actualiza el `Stop.event_delay` de las paradas indicadas y se
+        buscan los despachos afectados:
+
+        - Los despachos que salieron antes de `now` no se resuelven de nuevo,
+          pero si aún no visitan una parada modificada, se recalculan sus
+          horas de llegada desde esa parada en adelante.
+        - Los despachos que salen después de `now` de los grupos afectados
+          (ruta y punto de salida) se descartan y se vuelven a resolver a
+          partir de `now`. Un grupo está afectado si su fórmula lee una
+          parada modificada (ver `msopti.algorithm.formula.scoped_stops`),
+          si su recorrido la incluye, o si su fórmula lee alguna parada del
+          recorrido de otro grupo afectado, ya que éste cambia su
+          `Stop.last_visit`.
+
+        Los demás despachos se mantienen y sólo se aplican al estado de las
+        paradas y las unidades, sin resolverse.
+
+        Args:
+            dispatches: La tabla de despachos planificada previamente para
+                `DayPlanner.date`.
+            updates: El nuevo `event_delay` de cada parada, por id.
+            now: La hora actual.
+
+        Returns:
+            Una tupla con la nueva lista de despachos ordenada por hora de
+            salida, y las diferencias con la lista anterior.
+
+        Raises:
+            KeyError: Si alguna parada no existe en los parámetros.
+        """
+        runtime = self.runtime
+        previous = { i: runtime.stop(i).event_delay for i in updates }
+        for i, delay in updates.items():
+            runtime.set_event_delay(i, delay)
+
+        affected = set()
+        for route in self.params.routes:
+            view = runtime.route(route.id)
+            reads = {}
+            writes = {}
+            for limits in self._limits(route.id):
+                sp = limits[0]
+                reads[sp] = { i.id for i in scoped_stops(view.stops, limits, view.positions) } # pylint: disable=C0301
+                writes[sp] = { i.id for i in view.stops[view.position(sp):] }
+
+            # los despachos de un grupo resuelto de nuevo cambian la última
+            # visita de las paradas que recorren, y con ella la fórmula de
+            # los grupos que las leen
+            pending = [
+                sp for sp in reads
+                if not updates.keys().isdisjoint(reads[sp] | writes[sp])
+            ]
+            while pending:
+                sp = pending.pop()
+                if (route.id, sp) in affected:
+                    continue
+                affected.add((route.id, sp))
+                pending.extend(i for i in reads if not writes[sp].isdisjoint(reads[i])) # pylint: disable=C0301
+
+        kept = {}
+        updated = []
+        for dispatch in dispatches:
+            if dispatch.departure > now:
+                if (dispatch.route, dispatch.start_point) not in affected:
+                    kept.setdefault(dispatch.route, []).append(dispatch)
+                continue
+
+            delayed = self._delayed(dispatch, previous, now)
+            if delayed.solution.planification != dispatch.solution.planification: # pylint: disable=C0301
+                updated.append(delayed)
+            kept.setdefault(dispatch.route, []).append(delayed)
+
+        result = []
+        for route in dict.fromkeys(i.route for i in dispatches):
+            active = { sp for r, sp in affected if r == route }
+            if active:
+                result.extend(self._run(runtime.route(route).route, kept.get(route, []), active, now)) # pylint: disable=C0301
+            else:
+                result.extend(kept.get(route, []))
+
+        result.sort(key=lambda i: i.departure)
+
+        def key(dispatch: Dispatch):
+            return (
+                dispatch.route,
+                dispatch.start_point,
+                dispatch.solution.unit.unit_number,
+                dispatch.departure,
+            )
+
+        old = { key(i) for i in dispatches }
+        new = { key(i) for i in result }
+        diff = PlanDiff(
+            [ i for i in result if key(i) not in old ],
+            [ i for i in dispatches if key(i) not in new ],
+            updated,
+        )
+
+        return result, diff
+
+
+_worker: DayPlanner|None = None
+"""El planificador de cada proceso de `plan_parallel`."""
+
+
+def _init_worker(
+        params: Params,
+        shared: SharedDemandIndex,
+        date: datetime.datetime,
+        time_max: datetime.timedelta|None
+    ):
+    """Inicializa un proceso de `plan_parallel`."""
+    global _worker # pylint: disable=W0603
+    _worker = DayPlanner(params, shared.attach(), date, time_max)
+
+
+def _plan_route(route: Route) -> list[Dispatch]:
+    """Planifica una ruta en un proceso de `plan_parallel`."""
+    assert _worker is not None
+    return _worker.plan_route(route)
+
+
+def plan_parallel(
+        params: Params,
+        forecast: pd.DataFrame|DemandIndex,
+        date: datetime.datetime,
+        routes: list[Route]|None = None,
+        processes: int|None = None,
+        time_max: datetime.timedelta|None = None
+    ) -> list[Dispatch]:
+    """Planifica la jornada de varias rutas en paralelo.
+
+    Las unidades de una ruta son independientes de las demás, por lo que
+    las rutas se reparten entre un grupo de procesos. El pronóstico indexado
+    se copia una sola vez a memoria compartida (ver `SharedDemandIndex`) y
+    cada proceso lo usa sin copiarlo ni serializarlo, por lo que la memoria
+    de cada proceso adicional no depende del tamaño del pronóstico. Si se
+    recibe un `pandas.DataFrame`, el índice construido sólo se conserva en
+    memoria compartida.
+
+    Cada proceso trabaja con su propia copia de `params`, por lo que el
+    `Stop.last_visit` de las paradas de `params` no se modifica.
+
+    Args:
+        params: Los parámetros de la jornada.
+        forecast: pandas.DataFrame, Un dataset con `pandas.DatetimeIndex`,
+            una columna `passengers` y una columna `stop_id`, o un
+            `DemandIndex` construido previamente.
+        date: El día a planificar, con la hora en 00:00:00.
+        routes: Las rutas a planificar, por defecto `Params.routes`.
+        processes: La cantidad de procesos, por defecto la cantidad de CPUs.
+        time_max: Tiempo máximo que se puede esperar antes de despachar,
+            por defecto `Schedule.rest.max`.
+
+    Returns:
+        La lista de despachos de todas las rutas ordenada por hora de
+        salida.
+
+    Raises:
+        ValueError: cuando el pandas.DataFrame no contiene las llaves
+            `passengers` y `stop_id`, o no tiene `pandas.DatetimeIndex`
+    """
+    index = forecast if isinstance(forecast, DemandIndex) else DemandIndex(forecast) # pylint: disable=C0301
+    routes = routes if routes is not None else params.routes
+    # si el índice se construyó aquí, sólo se mantiene la copia compartida
+    shared = index.share()
+    del index
+
+    dispatches = []
+    with shared, ProcessPoolExecutor(
+            processes,
+            initializer=_init_worker,
+            initargs=(params, shared, date, time_max)
+        ) as pool:
+        for result in pool.map(_plan_route, routes):
+            dispatches.extend(result)
+
+    dispatches.sort(key=lambda i: i.departure)
+    return dispatches
+
+
+_horizon: tuple[Params,DemandIndex,datetime.timedelta|None,bool]|None = None
+"""Los parámetros y el pronóstico de cada proceso de `plan_days`."""
+
+
+def _init_horizon(
+        params: Params,
+        shared: SharedDemandIndex,
+        time_max: datetime.timedelta|None,
+        per_day: bool
+    ):
+    """Inicializa un proceso de `plan_days`."""
+    global _horizon # pylint: disable=W0603
+    _horizon = (params, shared.attach(), time_max, per_day)
+
+
+def _plan_day(task: tuple[datetime.datetime,list[Route]|None]) -> list[Dispatch]: # pylint: disable=C0301
+    """Planifica un día en un proceso de `plan_days`."""
+    assert _horizon is not None
+    params, index, time_max, per_day = _horizon
+    date, routes = task
+    return DayPlanner(params, index, date, time_max, per_day=per_day).plan(routes) # pylint: disable=C0301
+
+
+def plan_days(
+        params: Params,
+        forecast: pd.DataFrame|DemandIndex,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        routes: list[Route]|None = None,
+        processes: int|None = 1,
+        time_max: datetime.timedelta|None = None,
+        per_day: bool = False
+    ) -> dict[datetime.datetime,list[Dispatch]]:
+    """Planifica la jornada de cada día de un rango de fechas.
+
+    El pronóstico se indexa una sola vez para todo el rango; cada día usa
+    el mismo `DemandIndex` y sólo genera sus fórmulas. Los días son
+    independientes entre sí, por lo que con `processes` distinto de 1 se
+    reparten entre un grupo de procesos, copiando el índice una sola vez a
+    memoria compartida como en `plan_parallel`.
+
+    Los días sin pronóstico se omiten. Por defecto p(t) suma los pasajeros
+    de todos los días del pronóstico, como en `gererate_formula`, por lo que
+    el plan de un día depende de los demás días cargados; con `per_day`
+    cada día se califica sólo con su pronóstico y obtiene el mismo plan que
+    un `DayPlanner` con el pronóstico de ese día únicamente.
+
+    Args:
+        params: Los parámetros de la jornada.
+        forecast: pandas.DataFrame, Un dataset con `pandas.DatetimeIndex`,
+            una columna `passengers` y una columna `stop_id`, o un
+            `DemandIndex` construido previamente.
+        start: El primer día a planificar, con la hora en 00:00:00.
+        end: El último día a planificar (incluido), con la hora en 00:00:00.
+        routes: Las rutas a planificar, por defecto `Params.routes`.
+        processes: La cantidad de procesos, 1 para planificar en este
+            proceso, o `None` para usar la cantidad de CPUs.
+        time_max: Tiempo máximo que se puede esperar antes de despachar,
+            por defecto `Schedule.rest.max`.
+        per_day: Si es `True`, las fórmulas de cada día sólo cuentan los
+            pasajeros de ese día.
+
+    Returns:
+        Un diccionario con la lista de despachos de cada día planificado,
+        ordenada por hora de salida.
+
+    Raises:
+        ValueError: cuando el pandas.DataFrame no contiene las llaves
+            `passengers` y `stop_id`, o no tiene `pandas.DatetimeIndex`
+    """
+    index = forecast if isinstance(forecast, DemandIndex) else DemandIndex(forecast) # pylint: disable=C0301
+    available = set(index.days)
+    dates = [
+        date
+        for date in (start + datetime.timedelta(days=i) for i in range((end - start).days + 1)) # pylint: disable=C0301
+        if pd.Timestamp(date) in available
+    ]
+
+    if processes == 1 or len(dates) <= 1:
+        return {
+            date: DayPlanner(params, index, date, time_max, per_day=per_day).plan(routes) # pylint: disable=C0301
+            for date in dates
+        }
+
+    shared = index.share()
+    del index
+    with shared, ProcessPoolExecutor(
+            processes,
+            initializer=_init_horizon,
+            initargs=(params, shared, time_max, per_day)
+        ) as pool:
+        results = pool.map(_plan_day, [ (date, routes) for date in dates ])
+        return dict(zip(dates, results))
+
+
+def horizon_table(plans: dict[datetime.datetime,list[Dispatch]]) -> pd.DataFrame: # pylint: disable=C0301
+    """Genera la _tabla de despachos_ de varios días.
+
+    Args:
+        plans: Los despachos de cada día, ver `plan_days`.
+
+    Returns:
+        Un `pandas.DataFrame` como el de `dispatch_table`, con un índice de
+        dos niveles: `date` (el día) y `unit` (el número de la unidad).
+    """
+    tables = {
+        pd.Timestamp(date): dispatch_table(dispatches)
+        for date, dispatches in plans.items()
+        if dispatches
+    }
+    if not tables:
+        return pd.DataFrame()
+
+    return pd.concat(tables, names=["date", "unit"])
+
+
+def plan_horizon(
+        params: Params,
+        forecast: pd.DataFrame|DemandIndex,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        routes: list[Route]|None = None,
+        processes: int|None = 1,
+        time_max: datetime.timedelta|None = None,
+        per_day: bool = False
+    ) -> pd.DataFrame:
+    """Planifica un rango de fechas y genera su _tabla de despachos_.
+
+    Es el equivalente de `plan_days` seguido de `horizon_table`, ver ambas
+    funciones.
+
+    Returns:
+        Un `pandas.DataFrame` indexado por día y número de unidad.
+    """
+    return horizon_table(plan_days(params, forecast, start, end, routes, processes, time_max, per_day)) # pylint: disable=C0301
@@ -0,0 +1,375 @@
+"""Vista compilada de los parámetros para su uso en tiempo de ejecución.
+
+Las clases de `msopti.params` representan el JSON de configuración, y sus ids
+pueden ser strings o ints. Los algoritmos, en cambio, consultan paradas y
+unidades por id en cada evaluación. Este módulo asigna a cada id un entero
+consecutivo (su _código_) y agrupa los datos en arreglos, de modo que las
+consultas por id sean de tiempo constante.
+
+La vista no copia las paradas: `RouteView.stops` contiene las mismas
+instancias de `Stop` que `Params.stops`, por lo que los cambios en
+`Stop.event_delay` y `Stop.last_visit` se reflejan en ambos. Si se agregan o
+quitan paradas, rutas o unidades, se debe compilar la vista de nuevo.
+
+Los tiempos de recorrido de cada ruta se guardan como minutos acumulados
+(ver `msopti.algorithm.planification.cumulative_offsets`). Como dependen de
+`Stop.event_delay`, se deben recalcular cuando éste cambia, lo cual hace
+`RuntimeParams.set_event_delay()`.
+"""
+
+from collections.abc import Hashable, Iterable
+import datetime
+import numpy as np
+
+from msopti.algorithm.planification import cumulative_offsets
+from msopti.params import Params, Route, Stop, Vehicle
+
+
+class IdTable:
+    """Asigna enteros consecutivos a un conjunto de ids.
+
+    El primer id recibe el código 0, el segundo el 1, y así sucesivamente.
+
+    Attributes:
+        ids: Los ids, en el orden de sus códigos.
+    """
+
+    __slots__ = ("ids", "_codes")
+
+    ids: list[Hashable]
+    _codes: dict[Hashable,int]
+
+    def __init__(self, ids: Iterable[Hashable] = ()) -> None:
+        """Crea una tabla.
+
+        Args:
+            ids: Los ids iniciales, los repetidos se asignan una sola vez.
+        """
+        self.ids = []
+        self._codes = {}
+        for i in ids:
+            self.intern(i)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id_: Hashable) -> bool:
+        return id_ in self._codes
+
+    def __getitem__(self, code: int) -> Hashable:
+        return self.ids[code]
+
+    def intern(self, id_: Hashable) -> int:
+        """Obtiene el código de un id, asignándole uno si no lo tiene.
+
+        Args:
+            id_: El id.
+
+        Returns:
+            El código del id.
+        """
+        code = self._codes.get(id_)
+        if code is None:
+            code = self._codes[id_] = len(self.ids)
+            self.ids.append(id_)
+
+        return code
+
+    def code(self, id_: Hashable) -> int:
+        """Obtiene el código de un id.
+
+        Args:
+            id_: El id.
+
+        Returns:
+            El código del id.
+
+        Raises:
+            KeyError: Si el id no existe en la tabla.
+        """
+        return self._codes[id_]
+
+    def get(self, id_: Hashable, default: int = -1) -> int:
+        """Obtiene el código de un id, o `default` si no existe."""
+        return self._codes.get(id_, default)
+
+    def codes(self, ids: Iterable[Hashable]) -> np.ndarray:
+        """Obtiene los códigos de varios ids.
+
+        Args:
+            ids: Los ids.
+
+        Returns:
+            Un arreglo de enteros, -1 para los ids que no existen en la
+            tabla.
+        """
+        return np.array([ self._codes.get(i, -1) for i in ids ], dtype=np.int32) # pylint: disable=C0301
+
+
+class RouteView:
+    """Las paradas de una ruta en el orden en que se recorren.
+
+    Attributes:
+        id: El id de la ruta (string o int).
+        route: La ruta.
+        stops: Las paradas (`Stop`) de la ruta.
+        stop_codes: El código de cada parada en `RuntimeParams.stops`.
+        positions: La posición de cada parada en `stops`, por id.
+        offsets: Los minutos acumulados de recorrido hasta cada parada de
+            `stops`, incluyendo el `Stop.event_delay`.
+    """
+
+    __slots__ = ("id", "route", "stops", "stop_codes", "positions", "offsets") # pylint: disable=C0301
+
+    id: str|int
+    route: Route
+    stops: list[Stop]
+    stop_codes: np.ndarray
+    positions: dict[str|int,int]
+    offsets: np.ndarray
+
+    def __init__(self, route: Route, stops: list[Stop], stop_codes: np.ndarray) -> None: # pylint: disable=C0301
+        self.id = route.id
+        self.route = route
+        self.stops = stops
+        self.stop_codes = stop_codes
+        self.positions = { s.id: i for i, s in enumerate(stops) }
+        self.offsets = cumulative_offsets(stops)
+
+    def __len__(self) -> int:
+        return len(self.stops)
+
+    def position(self, stop_id: str|int) -> int:
+        """Obtiene la posición de una parada en la ruta.
+
+        Raises:
+            KeyError: Si la parada no forma parte de la ruta.
+        """
+        return self.positions[stop_id]
+
+    def refresh(self):
+        """Recalcula `RouteView.offsets` desde el estado de las paradas."""
+        self.offsets = cumulative_offsets(self.stops)
+
+    def travel(self, start_point: str|int) -> int:
+        """Obtiene los minutos de recorrido desde la salida en una parada
+        hasta la llegada a la última parada de la ruta.
+
+        Raises:
+            KeyError: Si la parada no forma parte de la ruta.
+        """
+        i = self.positions[start_point]
+        base = self.offsets[i - 1] if i > 0 else 0
+
+        return int(self.offsets[-1] - base)
+
+
+class UnitTable:
+    """Los datos de un conjunto de unidades, organizados en arreglos.
+
+    La posición de cada unidad en los arreglos es su código en `numbers`.
+
+    Attributes:
+        units: Los vehículos (`Vehicle`).
+        numbers: Los números de las unidades.
+        min: La capacidad mínima de cada unidad.
+        max: La capacidad máxima de cada unidad.
+        available: La disponibilidad de cada unidad.
+        route: El código de la ruta de cada unidad, -1 si no se conoce.
+        start_point: El código de la parada de salida de cada unidad, -1 si
+            no se conoce.
+    """
+
+    __slots__ = ("units", "numbers", "min", "max", "available", "route", "start_point") # pylint: disable=C0301
+
+    units: list[Vehicle]
+    numbers: IdTable
+    min: np.ndarray
+    max: np.ndarray
+    available: np.ndarray
+    route: np.ndarray
+    start_point: np.ndarray
+
+    def __init__(
+            self,
+            units: list[Vehicle],
+            routes: IdTable|None = None,
+            stops: IdTable|None = None
+        ) -> None:
+        """Crea una tabla.
+
+        Args:
+            units: Los vehículos.
+            routes: La tabla de ids de las rutas, si se indica se llena
+                `UnitTable.route`.
+            stops: La tabla de ids de las paradas, si se indica se llena
+                `UnitTable.start_point`.
+
+        Raises:
+            ValueError: Si dos unidades tienen el mismo número.
+        """
+        self.units = list(units)
+        self.numbers = IdTable(i.unit_number for i in self.units)
+        if len(self.numbers) != len(self.units):
+            raise ValueError("Existen unidades con el mismo número")
+
+        self.min = np.array([ i.min for i in self.units ], dtype=np.int32)
+        self.max = np.array([ i.max for i in self.units ], dtype=np.int32)
+        self.available = np.array([ i.available for i in self.units ], dtype=bool) # pylint: disable=C0301
+
+        none = np.full(len(self.units), -1, dtype=np.int32)
+        self.route = none if routes is None else routes.codes(i.route for i in self.units) # pylint: disable=C0301
+        self.start_point = none.copy() if stops is None else stops.codes(i.start_point for i in self.units) # pylint: disable=C0301
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def index(self, unit_number: int) -> int:
+        """Obtiene la posición de una unidad.
+
+        Raises:
+            KeyError: Si la unidad no existe en la tabla.
+        """
+        return self.numbers.code(unit_number)
+
+    def unit(self, unit_number: int) -> Vehicle:
+        """Obtiene el vehículo de un número de unidad.
+
+        Raises:
+            KeyError: Si la unidad no existe en la tabla.
+        """
+        return self.units[self.numbers.code(unit_number)]
+
+    def capacity(self, unit_number: int) -> int:
+        """Obtiene la capacidad máxima de una unidad.
+
+        Raises:
+            KeyError: Si la unidad no existe en la tabla.
+        """
+        return int(self.max[self.numbers.code(unit_number)])
+
+
+class RuntimeParams:
+    """Vista compilada de un `Params`.
+
+    Attributes:
+        params: Los parámetros compilados.
+        stops: La tabla de ids de las paradas.
+        routes: La tabla de ids de las rutas.
+        units: Las unidades de todas las rutas.
+    """
+
+    __slots__ = ("params", "stops", "routes", "units", "_stops", "_routes", "_stop_routes") # pylint: disable=C0301
+
+    params: Params
+    stops: IdTable
+    routes: IdTable
+    units: UnitTable
+    _stops: list[Stop]
+    _routes: list[RouteView]
+    _stop_routes: dict[int,list[RouteView]]
+
+    def __init__(self, params: Params) -> None:
+        """Compila los parámetros.
+
+        Args:
+            params: Los parámetros.
+
+        Raises:
+            ValueError: Si existen paradas, rutas o unidades con ids
+                repetidos.
+            KeyError: Si alguna ruta contiene un id de parada desconocido.
+        """
+        self.params = params
+        self.stops = IdTable(i.id for i in params.stops)
+        self.routes = IdTable(i.id for i in params.routes)
+        if len(self.stops) != len(params.stops):
+            raise ValueError("Existen paradas con el mismo id")
+        if len(self.routes) != len(params.routes):
+            raise ValueError("Existen rutas con el mismo id")
+
+        self._stops = list(params.stops)
+        self._routes = []
+        self._stop_routes = {}
+        for route in params.routes:
+            codes = np.array([ self.stops.code(i) for i in route.stops ], dtype=np.int32) # pylint: disable=C0301
+            stops = [ self._stops[i] for i in codes ]
+            view = RouteView(route, stops, codes)
+            self._routes.append(view)
+            for i in codes.tolist():
+                self._stop_routes.setdefault(i, []).append(view)
+
+        self.units = UnitTable(params.vehicles, self.routes, self.stops)
+
+    def stop(self, stop_id: str|int) -> Stop:
+        """Obtiene una parada por id.
+
+        Raises:
+            KeyError: Si la parada no existe.
+        """
+        return self._stops[self.stops.code(stop_id)]
+
+    def stop_routes(self, stop_id: str|int) -> list[RouteView]:
+        """Obtiene las rutas que pasan por una parada, vacío si la parada no
+        existe."""
+        return list(self._stop_routes.get(self.stops.get(stop_id), []))
+
+    def set_event_delay(self, stop_id: str|int, delay: datetime.timedelta):
+        """Modifica el `Stop.event_delay` de una parada y recalcula los
+        tiempos de recorrido de las rutas que la contienen.
+
+        Raises:
+            KeyError: Si la parada no existe.
+        """
+        self.set_event_delays({ stop_id: delay })
+
+    def set_event_delays(self, delays: dict[str|int,datetime.timedelta]):
+        """Modifica el `Stop.event_delay` de varias paradas.
+
+        Los tiempos de recorrido de cada ruta afectada se recalculan una sola
+        vez, sin importar cuántas de sus paradas cambiaron.
+
+        Raises:
+            KeyError: Si alguna parada no existe, en cuyo caso no se modifica
+                ninguna.
+        """
+        codes = [ self.stops.code(i) for i in delays ]
+        views: dict[int,RouteView] = {}
+        for code, delay in zip(codes, delays.values()):
+            self._stops[code].event_delay = delay
+            for view in self._stop_routes.get(code, []):
+                views[id(view)] = view
+
+        for view in views.values():
+            view.refresh()
+
+    def route(self, route_id: str|int) -> RouteView:
+        """Obtiene una ruta por id.
+
+        Raises:
+            KeyError: Si la ruta no existe.
+        """
+        return self._routes[self.routes.code(route_id)]
+
+    def route_units(
+            self,
+            route_id: str|int,
+            start_point: str|int|None = None
+        ) -> list[Vehicle]:
+        """Obtiene las unidades disponibles de una ruta.
+
+        Args:
+            route_id: El id de la ruta.
+            start_point: Si se indica, sólo las unidades que salen desde
+                esa parada.
+
+        Returns:
+            Una lista de vehículos, en el orden de `Params.vehicles`.
+        """
+        route = self.routes.get(route_id)
+        mask = self.units.available & (self.units.route == route) & (route >= 0) # pylint: disable=C0301
+        if start_point is not None:
+            stop = self.stops.get(start_point)
+            mask &= (self.units.start_point == stop) & (stop >= 0)
+
+        return [ self.units.units[i] for i in np.flatnonzero(mask) ]
@@ -0,0 +1,533 @@
+"""Servicio de despachos de larga duración.
+
+Carga los parámetros y el pronóstico una sola vez y atiende solicitudes por
+HTTP, en un puerto local o en un _socket_ Unix. El índice del pronóstico, la
+vista compilada de los parámetros y las fórmulas de cada ruta, punto de
+salida y día se mantienen en memoria entre solicitudes. El índice sólo
+contiene los días que se cargaron (ver `msopti.forecast.load_forecast`); las
+solicitudes de otros días se rechazan.
+
+Las resoluciones se ejecutan en un `concurrent.futures.Executor`, por lo que
+el ciclo de eventos sigue atendiendo solicitudes (por ejemplo, eventos de
+retraso) mientras se resuelve un despacho. Cada ruta tiene un candado: un
+despacho bloquea las rutas que comparten paradas con la suya desde que se
+resuelve hasta que se registran sus visitas, y los cambios de retrasos y
+los eventos bloquean las rutas de las paradas que modifican (ver
+`DispatchService.lock_stops`). Así, dos despachos de la misma ruta no se
+resuelven con el mismo estado de las paradas.
+
+Endpoints, todos reciben y retornan JSON:
+
+- `GET /health`: El estado del servicio.
+- `POST /dispatch`: El siguiente despacho de una ruta. Recibe `route`,
+  `time` (ISO 8601) y opcionalmente `start_point`, `units` (números de las
+  unidades disponibles), `time_max` (minutos, no negativo; con 0 se
+  despacha sin esperar) y `commit` (si es `true`, se
+  registra la visita de las paradas, ver `Stop.last_visit`).
+- `POST /delays`: Modifica el retraso por eventos de las paradas. Recibe un
+  objeto `delays` con los minutos de retraso de cada parada, por id.
+
+Los ids numéricos de rutas y paradas se aceptan también como strings.
+
+Los eventos de las unidades también pueden leerse de un archivo o una
+tubería con un `msopti.events.EventIngestor`, creado con
+`lock=DispatchService.lock_stops`; si se asigna a `DispatchService.events`,
+sus contadores se incluyen en `GET /health`.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import json
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+import pandas as pd
+
+from msopti.algorithm.demand import DemandIndex
+from msopti.algorithm.formula import gererate_batch_formula, gererate_formula
+from msopti.algorithm.grid import GridSolver
+from msopti.algorithm.interfaces import BatchScorefn, Scorefn, Solution
+from msopti.algorithm.stats import SolverStats
+from msopti.events import EventIngestor
+from msopti.params import Params
+from msopti.runtime import IdTable, RouteView, RuntimeParams
+
+MAX_BODY = 1 << 20
+"""El tamaño máximo del cuerpo de una solicitud, en bytes."""
+
+
+class RequestError(ValueError):
+    """Error en una solicitud, se responde con `status`."""
+
+    status: HTTPStatus
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class _Formula:
+    """Las fórmulas de un punto de salida de una ruta en un día."""
+
+    formula: Scorefn
+    batch: BatchScorefn
+
+
+class DispatchService:
+    """Estado y operaciones del servicio de despachos.
+
+    Attributes:
+        params: Los parámetros.
+        runtime: La vista compilada de `params`.
+        index: El pronóstico indexado.
+        executor: El `Executor` en donde se resuelven los despachos.
+        events: El ingestor de eventos que actualiza `runtime`, si existe.
+    """
+
+    params: Params
+    runtime: RuntimeParams
+    index: DemandIndex
+    executor: Executor
+    events: EventIngestor|None
+    _formulas: dict[tuple[str|int,str|int,datetime.datetime],_Formula]
+    _formulas_lock: threading.Lock
+    _locks: list[threading.Lock]
+
+    def __init__(
+            self,
+            params: Params,
+            index: DemandIndex,
+            executor: Executor|None = None
+        ) -> None:
+        """Crea el servicio.
+
+        Args:
+            params: Los parámetros.
+            index: El pronóstico indexado.
+            executor: El `Executor` en donde se resuelven los despachos, por
+                defecto un `ThreadPoolExecutor`.
+        """
+        self.params = params
+        self.runtime = RuntimeParams(params)
+        self.index = index
+        self.executor = executor or ThreadPoolExecutor()
+        self.events = None
+        self._formulas = {}
+        self._formulas_lock = threading.Lock()
+        self._locks = [ threading.Lock() for _ in params.routes ]
+
+    @contextlib.contextmanager
+    def lock_stops(self, stop_ids: Iterable[str|int]) -> Iterator[None]:
+        """Bloquea las rutas que pasan por unas paradas.
+
+        Quien lee o modifica el estado de las paradas (`Stop.last_visit`,
+        `Stop.event_delay` y los `RouteView.offsets`) desde otro hilo debe
+        hacerlo dentro de este bloque. Los candados se toman siempre en el
+        orden de las rutas, por lo que no se bloquean entre sí.
+
+        Args:
+            stop_ids: Los ids de las paradas; los que no existen se omiten.
+        """
+        codes = sorted({
+            self.runtime.routes.code(view.id)
+            for stop in stop_ids
+            for view in self.runtime.stop_routes(stop)
+        })
+        with contextlib.ExitStack() as stack:
+            for code in codes:
+                stack.enter_context(self._locks[code])
+            yield
+
+    def _start_points(self, view: RouteView) -> list[str|int]:
+        """Obtiene los puntos de salida de una ruta en orden de recorrido."""
+        return sorted(
+            { i.start_point for i in self.runtime.route_units(view.id) },
+            key=view.position
+        )
+
+    def _formula(
+            self,
+            view: RouteView,
+            start_point: str|int,
+            date: datetime.datetime
+        ) -> _Formula:
+        """Obtiene las fórmulas de un punto de salida, generándolas sólo la
+        primera vez.
+
+        Se llama desde los hilos de `executor`, por lo que el caché se
+        protege con un candado; dos solicitudes simultáneas de la misma
+        ruta no generan las fórmulas dos veces.
+        """
+        key = (view.id, start_point, date)
+        with self._formulas_lock:
+            formula = self._formulas.get(key)
+            if formula is None:
+                start_points = self._start_points(view)
+                n = start_points.index(start_point)
+                limits = [start_point, start_points[(n + 1) % len(start_points)]] # pylint: disable=C0301
+                args = (self.index, limits, view.stops, self.params.scores, date, view.positions) # pylint: disable=C0301
+                formula = self._formulas[key] = _Formula(
+                    gererate_formula(*args),
+                    gererate_batch_formula(*args),
+                )
+
+        return formula
+
+    def _solve(
+            self,
+            route: str|int,
+            start: datetime.datetime,
+            start_point: str|int|None,
+            units: list[int]|None,
+            time_max: datetime.timedelta|None
+        ) -> tuple[Solution,str|int]:
+        """Resuelve el siguiente despacho de una ruta.
+
+        Si no se indica el punto de salida, se resuelve cada punto de salida
+        y se elige la mejor puntuación.
+
+        Raises:
+            RequestError: Si el punto de salida, las unidades o el
+                pronóstico del día no existen, o no se pudo calificar ningún
+                candidato.
+            KeyError: Si la ruta no existe.
+        """
+        view = self.runtime.route(route)
+        candidates = self.runtime.route_units(route, start_point)
+        if units is not None:
+            allowed = set(units)
+            candidates = [ i for i in candidates if i.unit_number in allowed ]
+        if not candidates:
+            raise RequestError(HTTPStatus.NOT_FOUND, "No existen unidades disponibles") # pylint: disable=C0301
+
+        date = datetime.datetime.combine(start.date(), datetime.time())
+        if pd.Timestamp(date) not in self.index.days:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No existe pronóstico para {date.date()}") # pylint: disable=C0301
+
+        scores = self.params.scores
+        schedule = self.params.schedule
+        best = None
+        for sp in dict.fromkeys(i.start_point for i in candidates):
+            formula = self._formula(view, sp, date)
+            stats = SolverStats()
+            solver = GridSolver(
+                formula.formula,
+                scores.minute_price,
+                scores.cap_cost,
+                scores.low_demand_cost,
+                scores.zero_demand_cost,
+                start,
+                schedule.rest.max if time_max is None else time_max,
+                schedule.interval,
+                [ i for i in candidates if i.start_point == sp ],
+                view.stops,
+                sp,
+                batch_formula=formula.batch,
+                positions=view.positions,
+                offsets=view.offsets,
+                stats=stats,
+            )
+            try:
+                solution = solver.solve()
+            except ValueError:
+                continue
+            if best is None or stats.energy < best[0].stats.energy:
+                best = (solution, sp)
+
+        if best is None:
+            raise RequestError(HTTPStatus.UNPROCESSABLE_ENTITY, "Ningún candidato pudo ser calificado") # pylint: disable=C0301
+
+        return best
+
+    def _dispatch(
+            self,
+            route: str|int,
+            start: datetime.datetime,
+            start_point: str|int|None,
+            units: list[int]|None,
+            time_max: datetime.timedelta|None,
+            commit: bool
+        ) -> tuple[Solution,str|int,datetime.datetime]:
+        """Resuelve el siguiente despacho de una ruta y, si `commit`, registra
+        sus visitas, con las rutas que comparten sus paradas bloqueadas.
+
+        Returns:
+            La solución, su punto de salida y la hora de salida.
+
+        Raises:
+            RequestError: Si la ruta no existe, ver `_solve`.
+        """
+        try:
+            view = self.runtime.route(route)
+        except KeyError as e:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No existe la ruta {route}") from e # pylint: disable=C0301
+
+        with self.lock_stops([ i.id for i in view.stops ]):
+            solution, start_point = self._solve(route, start, start_point, units, time_max) # pylint: disable=C0301
+            departure = datetime.datetime.combine(start.date(), datetime.time(start.hour, start.minute)) + datetime.timedelta(minutes=solution.delay) # pylint: disable=C0301
+            if commit:
+                self._commit(route, start_point, departure)
+
+        return solution, start_point, departure
+
+    def _commit(
+            self,
+            route: str|int,
+            start_point: str|int,
+            departure: datetime.datetime
+        ):
+        """Registra la visita de las paradas de un despacho."""
+        view = self.runtime.route(route)
+        i = view.position(start_point)
+        base = int(view.offsets[i - 1]) if i > 0 else 0
+        for stop, offset in zip(view.stops[i:], view.offsets[i:].tolist()):
+            stop.last_visit = departure + datetime.timedelta(minutes=offset - base) # pylint: disable=C0301
+
+    async def dispatch(
+            self,
+            route: str|int,
+            start: datetime.datetime,
+            start_point: str|int|None = None,
+            units: list[int]|None = None,
+            time_max: datetime.timedelta|None = None,
+            commit: bool = False
+        ) -> dict:
+        """Obtiene el siguiente despacho de una ruta.
+
+        Args:
+            route: El id de la ruta.
+            start: El tiempo a partir del cual se espera para despachar.
+            start_point: El punto de salida, por defecto el mejor de todos.
+            units: Los números de las unidades disponibles, por defecto
+                todas las unidades disponibles de la ruta.
+            time_max: Tiempo máximo que se puede esperar antes de despachar,
+                por defecto `Schedule.rest.max`.
+            commit: Si es `True`, se registra la visita de las paradas.
+
+        Returns:
+            Un diccionario con el despacho.
+
+        Raises:
+            RequestError: Si no se pudo resolver el despacho.
+        """
+        loop = asyncio.get_running_loop()
+        solution, start_point, departure = await loop.run_in_executor(
+            self.executor,
+            self._dispatch,
+            route,
+            start,
+            start_point,
+            units,
+            time_max,
+            commit
+        )
+
+        assert solution.stats is not None
+        return {
+            "route": route,
+            "start_point": start_point,
+            "unit": solution.unit.unit_number,
+            "delay": solution.delay,
+            "departure": departure.isoformat(),
+            "score": solution.stats.energy,
+            "planification": [
+                { "stop": i.stop.id, "time": i.time.isoformat() }
+                for i in solution.planification
+            ],
+        }
+
+    async def set_delays(self, delays: dict[str|int,datetime.timedelta]):
+        """Modifica el retraso por eventos de varias paradas.
+
+        Los cambios se aplican en `executor` con las rutas de las paradas
+        bloqueadas, por lo que esperan a los despachos en curso.
+
+        Raises:
+            RequestError: Si alguna parada no existe.
+        """
+        missing = [ i for i in delays if i not in self.runtime.stops ]
+        if missing:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No existen las paradas {missing}") # pylint: disable=C0301
+
+        def apply():
+            with self.lock_stops(delays):
+                self.runtime.set_event_delays(delays)
+
+        await asyncio.get_running_loop().run_in_executor(self.executor, apply)
+
+    def health(self) -> dict:
+        """Obtiene el estado del servicio."""
+        return {
+            "status": "ok",
+            "stops": len(self.runtime.stops),
+            "routes": len(self.runtime.routes),
+            "units": len(self.runtime.units),
+            "days": [ i.date().isoformat() for i in self.index.days ],
+            "formulas": len(self._formulas),
+            "events": None if self.events is None else self.events.stats.as_dict(), # pylint: disable=C0301
+        }
+
+
+def _id(ids: IdTable, value: str|int) -> str|int:
+    """Obtiene el id de una parada o ruta; las llaves de JSON siempre son
+    strings, y los clientes pueden enviar como string un id numérico."""
+    if value not in ids and isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return value
+
+
+async def _route(service: DispatchService, method: str, path: str, body: dict) -> dict: # pylint: disable=C0301
+    """Atiende una solicitud ya decodificada."""
+    if path == "/health" and method == "GET":
+        return service.health()
+
+    if path == "/dispatch" and method == "POST":
+        try:
+            route = _id(service.runtime.routes, body["route"])
+            start = datetime.datetime.fromisoformat(body["time"])
+            start_point = body.get("start_point")
+            if start_point is not None:
+                start_point = _id(service.runtime.stops, start_point)
+            time_max = body.get("time_max")
+            if time_max is not None:
+                time_max = datetime.timedelta(minutes=time_max)
+                if time_max < datetime.timedelta(0):
+                    raise ValueError(f"time_max negativo: {body['time_max']}") # pylint: disable=C0301
+            units = body.get("units")
+            if units is not None:
+                if not isinstance(units, list):
+                    raise TypeError(f"units debe ser una lista: {units!r}")
+                units = [ int(i) for i in units ]
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Solicitud incorrecta: {e}") from e # pylint: disable=C0301
+
+        return await service.dispatch(
+            route,
+            start,
+            start_point,
+            units,
+            time_max,
+            bool(body.get("commit", False)),
+        )
+
+    if path == "/delays" and method == "POST":
+        try:
+            delays = {
+                _id(service.runtime.stops, k): datetime.timedelta(minutes=v)
+                for k, v in body["delays"].items()
+            }
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError) as e: # pylint: disable=C0301
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Solicitud incorrecta: {e}") from e # pylint: disable=C0301
+
+        await service.set_delays(delays)
+        return { "updated": len(delays) }
+
+    raise RequestError(HTTPStatus.NOT_FOUND, f"No existe {method} {path}")
+
+
+async def _respond(
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        payload: dict,
+        keep_alive: bool
+    ):
+    """Escribe una respuesta HTTP con cuerpo JSON."""
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("ascii") + body)
+    await writer.drain()
+
+
+async def _handle(
+        service: DispatchService,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ):
+    """Atiende una conexión HTTP/1.1, con varias solicitudes si el cliente
+    mantiene la conexión abierta."""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            try:
+                method, target, version = line.decode("latin-1").split()
+            except ValueError:
+                await _respond(writer, HTTPStatus.BAD_REQUEST, { "error": "Solicitud incorrecta" }, False) # pylint: disable=C0301
+                break
+
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = (
+                headers.get("connection", "").lower() != "close"
+                and version == "HTTP/1.1"
+            )
+
+            try:
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Solicitud muy grande") # pylint: disable=C0301
+                raw = await reader.readexactly(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except json.JSONDecodeError as e:
+                    raise RequestError(HTTPStatus.BAD_REQUEST, "JSON inválido") from e # pylint: disable=C0301
+
+                path = target.split("?", 1)[0]
+                status, payload = HTTPStatus.OK, await _route(service, method, path, body) # pylint: disable=C0301
+            except RequestError as e:
+                status, payload = e.status, { "error": str(e) }
+            except Exception as e: # pylint: disable=W0718
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, { "error": repr(e) } # pylint: disable=C0301
+
+            await _respond(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(
+        service: DispatchService,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        path: str|None = None
+    ):
+    """Atiende solicitudes hasta que la tarea sea cancelada.
+
+    Args:
+        service: El servicio.
+        host: La dirección en la que se escucha.
+        port: El puerto en el que se escucha.
+        path: Si se indica, se escucha en un _socket_ Unix en esa ubicación
+            en lugar de `host` y `port`.
+    """
+    def handler(reader, writer):
+        return _handle(service, reader, writer)
+
+    if path is not None:
+        server = await asyncio.start_unix_server(handler, path=path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+
+    async with server:
+        await server.serve_forever()
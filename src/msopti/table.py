@@ -0,0 +1,313 @@
+"""Acumulador columnar de la _tabla de despachos_.
+
+`Solution.to_dataframe` genera un `pandas.DataFrame` de una fila por cada
+despacho, y la tabla se obtiene concatenándolos. Con cientos de despachos
+por día y ruta, eso significa un `DataFrame` por fila y una concatenación
+costosa. `DispatchTable` guarda los despachos en arreglos de NumPy que
+crecen por bloques, con una fila por parada visitada:
+
+- Por despacho: el número de la unidad y los minutos de espera.
+- Por parada: el despacho, el código de la parada y la hora de llegada en
+  minutos desde las 00:00:00.
+
+El `pandas.DataFrame` se construye una sola vez, al exportar la tabla.
+"""
+
+import datetime
+import json
+import numpy as np
+import pandas as pd
+
+from msopti.algorithm.demand import MINUTES_PER_DAY
+from msopti.algorithm.interfaces import Solution
+from msopti.params import Stop
+from msopti.runtime import IdTable
+
+_TIMES = np.array(
+    [ datetime.time(hour=m // 60, minute=m % 60) for m in range(MINUTES_PER_DAY) ], # pylint: disable=C0301
+    dtype=object
+)
+"""Los `datetime.time` de cada minuto del día."""
+_LABELS = np.array([ f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY) ]) # pylint: disable=C0301
+"""La hora en formato `HH:MM` de cada minuto del día."""
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Obtiene un arreglo con capacidad para al menos `size` elementos,
+    duplicando la capacidad de `array` si es necesario."""
+    if size <= len(array):
+        return array
+
+    grown = np.empty(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class DispatchTable:
+    """La _tabla de despachos_ en formato columnar.
+
+    Los arreglos se reservan con una capacidad inicial y se duplican cuando
+    se llenan, por lo que agregar un despacho cuesta, en promedio, lo mismo
+    que copiar sus paradas.
+
+    Attributes:
+        stops: La tabla de ids de las paradas; la columna `stop` guarda los
+            códigos de esta tabla.
+        names: El nombre de cada parada, en el orden de `stops`.
+    """
+
+    stops: IdTable
+    names: list[str]
+    _size: int
+    _rows: int
+    _unit: np.ndarray
+    _delay: np.ndarray
+    _dispatch: np.ndarray
+    _stop: np.ndarray
+    _minute: np.ndarray
+
+    def __init__(self, capacity: int = 256, stops_per_dispatch: int = 32) -> None: # pylint: disable=C0301
+        """Crea una tabla vacía.
+
+        Args:
+            capacity: La cantidad de despachos para la que se reserva
+                memoria.
+            stops_per_dispatch: La cantidad estimada de paradas por despacho.
+        """
+        capacity = max(capacity, 1)
+        self.stops = IdTable()
+        self.names = []
+        self._size = 0
+        self._rows = 0
+        self._unit = np.empty(capacity, dtype=np.int64)
+        self._delay = np.empty(capacity, dtype=np.int32)
+        self._dispatch = np.empty(capacity * stops_per_dispatch, dtype=np.int32) # pylint: disable=C0301
+        self._stop = np.empty(capacity * stops_per_dispatch, dtype=np.int32)
+        self._minute = np.empty(capacity * stops_per_dispatch, dtype=np.int16) # pylint: disable=C0301
+
+    @classmethod
+    def from_solutions(cls, solutions: list[Solution]) -> "DispatchTable":
+        """Crea una tabla con varias soluciones.
+
+        Args:
+            solutions: Las soluciones, en el orden de la tabla.
+
+        Returns:
+            Un `DispatchTable`.
+        """
+        table = cls(len(solutions), max((len(i.planification) for i in solutions), default=1)) # pylint: disable=C0301
+        for solution in solutions:
+            table.append(solution)
+        return table
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def rows(self) -> int:
+        """La cantidad de paradas visitadas en todos los despachos."""
+        return self._rows
+
+    def _codes(self, stops: list[Stop]) -> np.ndarray:
+        """Obtiene los códigos de las paradas, registrando las nuevas."""
+        codes = np.empty(len(stops), dtype=np.int32)
+        for i, stop in enumerate(stops):
+            code = self.stops.get(stop.id)
+            if code < 0:
+                code = self.stops.intern(stop.id)
+                self.names.append(stop.name)
+            codes[i] = code
+        return codes
+
+    def append_minutes(
+            self,
+            unit_number: int,
+            delay: int,
+            stops: list[Stop],
+            minutes: np.ndarray
+        ):
+        """Agrega un despacho a partir de la hora de llegada a cada parada.
+
+        Es el camino rápido para quien calcula la llegada con
+        `msopti.algorithm.planification.planification_minutes`, sin construir
+        los `StopTime`.
+
+        Args:
+            unit_number: El número de la unidad.
+            delay: Los minutos que se esperaron antes de despachar.
+            stops: Las paradas visitadas, en orden.
+            minutes: La hora de llegada a cada parada de `stops`, en minutos
+                desde las 00:00:00.
+
+        Raises:
+            ValueError: Si `stops` y `minutes` tienen distinta longitud.
+        """
+        if len(stops) != len(minutes):
+            raise ValueError("Las paradas y los minutos tienen distinta longitud") # pylint: disable=C0301
+
+        n = self._size
+        self._unit = _grow(self._unit, n + 1)
+        self._delay = _grow(self._delay, n + 1)
+        self._unit[n] = unit_number
+        self._delay[n] = delay
+
+        a, b = self._rows, self._rows + len(stops)
+        self._dispatch = _grow(self._dispatch, b)
+        self._stop = _grow(self._stop, b)
+        self._minute = _grow(self._minute, b)
+        self._dispatch[a:b] = n
+        self._stop[a:b] = self._codes(stops)
+        self._minute[a:b] = minutes
+
+        self._size = n + 1
+        self._rows = b
+
+    def append(self, solution: Solution):
+        """Agrega el despacho de una solución.
+
+        Args:
+            solution: La solución.
+        """
+        self.append_minutes(
+            solution.unit.unit_number,
+            solution.delay,
+            [ i.stop for i in solution.planification ],
+            np.fromiter(
+                (i.time.hour * 60 + i.time.minute for i in solution.planification), # pylint: disable=C0301
+                dtype=np.int16,
+                count=len(solution.planification)
+            )
+        )
+
+    def extend(self, solutions: list[Solution]):
+        """Agrega los despachos de varias soluciones."""
+        for solution in solutions:
+            self.append(solution)
+
+    def columns(self) -> dict[str,np.ndarray]:
+        """Obtiene las columnas de la tabla, sin copiarlas.
+
+        Returns:
+            Un diccionario con las columnas por despacho (`unit` y `delay`) y
+            por parada visitada (`dispatch`, `stop` y `minute`).
+        """
+        return {
+            "unit": self._unit[:self._size],
+            "delay": self._delay[:self._size],
+            "dispatch": self._dispatch[:self._rows],
+            "stop": self._stop[:self._rows],
+            "minute": self._minute[:self._rows],
+        }
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Genera la _tabla de despachos_ en el formato de
+        `Solution.to_dataframe`.
+
+        El resultado es el mismo que concatenar el `to_dataframe()` de cada
+        solución: una fila por despacho con el número de la unidad como
+        índice, una columna por nombre de parada y la hora de llegada como
+        `datetime.time`, o `NaN` si el despacho no visita la parada.
+
+        Returns:
+            Un `pandas.DataFrame`.
+        """
+        if self._size == 0:
+            return pd.DataFrame()
+
+        c = self.columns()
+        names = pd.Index(self.names)
+        # las columnas siguen el orden en que aparecen los nombres, igual
+        # que en `pandas.concat`
+        labels, uniques = pd.factorize(names[c["stop"]])
+        grid = np.full((self._size, len(uniques)), np.nan, dtype=object)
+        grid[c["dispatch"], labels] = _TIMES[c["minute"]]
+
+        return pd.DataFrame(
+            grid,
+            index=pd.Index(c["unit"]),
+            columns=uniques,
+        )
+
+    def to_records(self) -> pd.DataFrame:
+        """Genera la tabla con una fila por parada visitada.
+
+        Returns:
+            Un `pandas.DataFrame` con las columnas `dispatch` (la posición
+            del despacho), `unit`, `delay`, `stop_id`, `stop` (el nombre de
+            la parada) y `time` (la hora de llegada en formato `HH:MM`).
+        """
+        c = self.columns()
+        stop_ids = np.array(self.stops.ids, dtype=object)
+        names = np.array(self.names, dtype=object)
+
+        return pd.DataFrame({
+            "dispatch": c["dispatch"],
+            "unit": c["unit"][c["dispatch"]],
+            "delay": c["delay"][c["dispatch"]],
+            "stop_id": stop_ids[c["stop"]],
+            "stop": names[c["stop"]],
+            "time": _LABELS[c["minute"]],
+        })
+
+    def to_csv(self, path: str):
+        """Escribe la tabla en un CSV, con una fila por parada visitada (ver
+        `DispatchTable.to_records`).
+
+        Args:
+            path: La ubicación del archivo.
+
+        Raises:
+            IOError: Si existió un error al escribir el archivo.
+        """
+        self.to_records().to_csv(path, index=False)
+
+    def save(self, path: str):
+        """Escribe la tabla en un archivo binario de NumPy (`.npz`).
+
+        El archivo contiene las columnas de `DispatchTable.columns` y la
+        tabla de paradas, y se carga con `DispatchTable.load`.
+
+        Args:
+            path: La ubicación del archivo.
+
+        Raises:
+            IOError: Si existió un error al escribir el archivo.
+        """
+        np.savez_compressed(
+            path,
+            stops=np.array(json.dumps({ "ids": self.stops.ids, "names": self.names })), # pylint: disable=C0301
+            **self.columns()
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "DispatchTable":
+        """Carga una tabla escrita con `DispatchTable.save`.
+
+        Args:
+            path: La ubicación del archivo.
+
+        Returns:
+            Un `DispatchTable`.
+
+        Raises:
+            ValueError: Si el archivo tiene un formato incorrecto.
+            IOError: Si existió un error al leer el archivo.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            try:
+                stops = json.loads(str(data["stops"]))
+                columns = { i: data[i] for i in ("unit", "delay", "dispatch", "stop", "minute") } # pylint: disable=C0301
+            except KeyError as e:
+                raise ValueError(f"El archivo no contiene la columna {e}") from e # pylint: disable=C0301
+
+        table = cls(1, 1)
+        table.stops = IdTable(stops["ids"])
+        table.names = stops["names"]
+        table._size = len(columns["unit"])
+        table._rows = len(columns["dispatch"])
+        table._unit = columns["unit"].astype(np.int64)
+        table._delay = columns["delay"].astype(np.int32)
+        table._dispatch = columns["dispatch"].astype(np.int32)
+        table._stop = columns["stop"].astype(np.int32)
+        table._minute = columns["minute"].astype(np.int16)
+        return table
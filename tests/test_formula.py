@@ -0,0 +1,157 @@
+"""Compara la fórmula indexada con la implementación original.
+
+`baseline_formula` es el `gererate_formula` original, que filtra el
+`pandas.DataFrame` del pronóstico con `between_time` en cada evaluación; la
+fórmula indexada debe dar las mismas puntuaciones, también con pronósticos
+de varios días.
+"""
+
+import datetime
+import pathlib
+import random
+import typing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from msopti.algorithm.formula import _limit_stops, gererate_batch_formula, gererate_formula # pylint: disable=C0301
+from msopti.params import Params, Stop, load_params_from_file
+from msopti.planner import route_stops
+
+DATA = pathlib.Path(__file__).parents[1] / "data"
+FORECAST = DATA / "test_buses.csv"
+PARAMS = DATA / "params.json"
+DAYS = (datetime.datetime(2024, 3, 23), datetime.datetime(2024, 3, 24))
+CASES = 150
+
+
+def baseline_formula(forecast: pd.DataFrame, start_points, stops, scores, curr_date): # pylint: disable=C0301
+    """El `gererate_formula` original, sin cambios salvo el formato."""
+    scoped_stops = _limit_stops(stops,start_points[0],start_points[-1])
+
+    a = scores.minute_price
+    b = scores.cap_cost
+    c = scores.low_demand_cost
+    d = scores.zero_demand_cost
+    cdate = pd.Timestamp(curr_date)
+
+    def formula(start, t, x):
+        st = start
+        df = pd.DataFrame()
+        for stop in scoped_stops:
+            st = stop.last_visit or st
+            st += (stop.time + stop.event_delay)
+            end = st + t
+            sf = forecast[forecast["stop_id"] == stop.id]
+
+            if stop.last_visit is None:
+                s = sf.between_time(start.time(),end.time())
+            else:
+                s = sf.between_time(st.time(),end.time())
+
+            df = pd.concat([df,s])
+
+        pt = df["passengers"].sum()
+
+        g = df.groupby(typing.cast(pd.DatetimeIndex,df.index).floor("d"))
+        df = typing.cast(pd.DataFrame,g.get_group(cdate))
+        qt = df[df["passengers"] == df["passengers"].max()].iloc[-1].name - start # pylint: disable=C0301
+
+        dt = ((c * (1 / pt)) if pt != 0 else d)
+
+        return (a * ( qt.seconds // 60 )) + (b * abs( x - pt )) + dt
+
+    return formula
+
+
+@pytest.fixture(scope="module")
+def forecast() -> pd.DataFrame:
+    df = pd.read_csv(FORECAST, usecols=["timespan", "stop_id", "passengers"], parse_dates=["timespan"]) # pylint: disable=C0301
+    df.index = pd.DatetimeIndex(df.pop("timespan"))
+    return df
+
+
+@pytest.fixture
+def params() -> Params:
+    return load_params_from_file(str(PARAMS))
+
+
+def _days(forecast: pd.DataFrame, *days: datetime.datetime) -> pd.DataFrame:
+    """Filtra el pronóstico a algunos días."""
+    return forecast[forecast.index.normalize().isin([ pd.Timestamp(i) for i in days ])] # pylint: disable=C0301
+
+
+def _cases(stops: list[Stop], date: datetime.datetime, seed: int):
+    """Genera candidatos al azar; antes de cada uno asigna el estado de las
+    paradas (última visita y retraso por eventos)."""
+    rng = random.Random(seed)
+    for _ in range(CASES):
+        start = date + datetime.timedelta(minutes=rng.randrange(5 * 60 + 30, 21 * 60)) # pylint: disable=C0301
+        for stop in stops:
+            stop.event_delay = datetime.timedelta(minutes=rng.choice([0, 0, 1, 3])) # pylint: disable=C0301
+            stop.last_visit = start - datetime.timedelta(minutes=rng.randrange(1, 60)) if rng.random() < 0.3 else None # pylint: disable=C0301
+        yield start, datetime.timedelta(minutes=rng.randrange(0, 40)), rng.randrange(0, 80) # pylint: disable=C0301
+
+
+def _compare(expected_fn, actual_fn, stops, date, seed) -> int:
+    """Cuenta los candidatos en los que las fórmulas difieren."""
+    mismatches = 0
+    for start, t, x in _cases(stops, date, seed):
+        try:
+            expected = expected_fn(start, t, x)
+        except KeyError:
+            expected = None
+        try:
+            actual = actual_fn(start, t, x)
+        except KeyError:
+            actual = None
+
+        if expected is None or actual is None:
+            mismatches += expected is not actual
+        elif not np.isclose(expected, actual):
+            mismatches += 1
+
+    return mismatches
+
+
+@pytest.mark.parametrize("days", [DAYS[:1], DAYS])
+@pytest.mark.parametrize("start_points", [[0, 5], [5, 0]])
+def test_formula_matches_baseline(forecast, params, days, start_points):
+    df = _days(forecast, *days)
+    stops = route_stops(params, params.routes[0])
+    date = days[-1]
+
+    expected = baseline_formula(df, start_points, stops, params.scores, date)
+    actual = gererate_formula(df, start_points, stops, params.scores, date)
+    assert _compare(expected, actual, stops, date, len(days)) == 0
+
+
+def test_per_day_matches_single_day_baseline(forecast, params):
+    stops = route_stops(params, params.routes[0])
+    date = DAYS[1]
+
+    expected = baseline_formula(_days(forecast, date), [0, 5], stops, params.scores, date) # pylint: disable=C0301
+    actual = gererate_formula(_days(forecast, *DAYS), [0, 5], stops, params.scores, date, per_day=True) # pylint: disable=C0301
+    assert _compare(expected, actual, stops, date, 3) == 0
+
+
+def test_batch_matches_formula(forecast, params):
+    df = _days(forecast, *DAYS)
+    stops = route_stops(params, params.routes[0])
+    date = DAYS[0]
+    single = gererate_formula(df, [5, 0], stops, params.scores, date)
+    batch = gererate_batch_formula(df, [5, 0], stops, params.scores, date)
+
+    caps = np.array([ 20, 40, 60 ])
+    for start, t, _ in _cases(stops, date, 4):
+        minutes = np.arange(0, t // datetime.timedelta(minutes=1) + 1)
+        scores = batch(start, minutes[:, None], caps[None, :])
+        for i, m in enumerate(minutes.tolist()):
+            for j, x in enumerate(caps.tolist()):
+                try:
+                    expected = single(start, datetime.timedelta(minutes=m), x)
+                except KeyError:
+                    assert np.isnan(scores[i, j])
+                else:
+                    assert scores[i, j] == pytest.approx(expected)